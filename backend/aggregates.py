@@ -0,0 +1,195 @@
+from storage import USERS, FEEDBACK, AGGREGATES, Increment
+from datetime import datetime
+import logging
+
+# Recounts of one user before rebuild gives up because counters keep changing under it
+MAX_REBUILD_ATTEMPTS = 5
+
+def _add_counts(target, counts):
+    """Add nested counters into target in place"""
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            _add_counts(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+    return target
+
+def _as_increments(counts):
+    """Turn nested counters into storage Increment values"""
+    return {
+        key: _as_increments(value) if isinstance(value, dict) else Increment(value)
+        for key, value in counts.items()
+    }
+
+def coverage_key(category, difficulty):
+    """Key of a (category, difficulty) counter in the per-career coverage"""
+    return f"{category}|{difficulty}"
+
+def _response_counts(career_path, category, difficulty):
+    """Counters touched by one response, including the per-career coverage used for question selection.
+    
+    Coverage counts answers per (category, difficulty), so its size is bounded
+    by the shape of the bank rather than by the questions a user has seen.
+    """
+    return {
+        'responses_total': 1,
+        'responses_by_career': {career_path: 1},
+        'responses_by_category': {category: 1},
+        'responses_by_difficulty': {difficulty: 1},
+        'coverage': {career_path: {coverage_key(category, difficulty): 1}}
+    }
+
+class AggregateService:
+    """Per-user statistics maintained incrementally as sessions, responses and feedback arrive"""
+    def __init__(self, storage, write_queue=None):
+        self.storage = storage
+        # Counter updates are not needed by the response; write them in the background
+        self.write_queue = write_queue
+    
+    def record_session_started(self, uid, career_path):
+        self._increment(uid, {
+            'sessions_started': 1,
+            'sessions_started_by_career': {career_path: 1}
+        })
+    
+    def record_responses(self, uid, career_path, responses):
+        """Several (category, difficulty) responses as one counter write"""
+        counts = {}
+        for category, difficulty in responses:
+            _add_counts(counts, _response_counts(career_path, category, difficulty))
+        if counts:
+            self._increment(uid, counts)
+    
+    def record_session_completed(self, uid, career_path):
+        self._increment(uid, {
+            'sessions_completed': 1,
+            'sessions_completed_by_career': {career_path: 1}
+        })
+    
+    def record_feedback(self, uid, rating):
+        self._increment(uid, {
+            'feedback_count': 1,
+            'feedback_rating_sum': rating
+        })
+    
+    def record_xp(self, uid, amount, source):
+        self._increment(uid, {
+            'xp_total': amount,
+            'xp_by_source': {source: amount}
+        })
+    
+    def get(self, uid):
+        """Get a user's aggregates with derived rates; one document read"""
+        try:
+            data = self.storage.get(AGGREGATES, uid)
+            if data is None:
+                return None
+            
+            sessions_started = data.get('sessions_started', 0)
+            feedback_count = data.get('feedback_count', 0)
+            data['completion_rate'] = (data.get('sessions_completed', 0) / sessions_started * 100) if sessions_started > 0 else 0
+            data['average_feedback_rating'] = (data.get('feedback_rating_sum', 0) / feedback_count) if feedback_count > 0 else 0
+            return data
+        except Exception as e:
+            logging.error(f"Error getting aggregates for user {uid}: {e}")
+            return None
+    
+    def rebuild(self, interview_service, uid=None):
+        """Recompute aggregates from stored sessions and feedback (all users when uid is None).
+        
+        XP by source is reconstructed only for interview completions and feedback
+        bonuses; manual awards are not recorded anywhere else. Returns the number
+        of users rebuilt. Storage errors propagate, so a failed query never
+        overwrites a user's aggregates with empty counts. Every counter write
+        bumps 'revision'; the recount is only written if it did not move while
+        the sessions were scanned, so no concurrent increment is overwritten.
+        """
+        user_ids = [uid] if uid else self._all_user_ids()
+        for user_id in user_ids:
+            for _ in range(MAX_REBUILD_ATTEMPTS):
+                revision = (self.storage.get(AGGREGATES, user_id, fields=['revision']) or {}).get('revision', 0)
+                counts = self._recount(user_id, interview_service)
+                if self.storage.run_transaction(
+                    lambda transaction: self._replace_if_unchanged(transaction, user_id, counts, revision)
+                ):
+                    break
+                logging.info(f"Aggregates of user {user_id} changed during rebuild; recounting")
+            else:
+                raise RuntimeError(f"Aggregates of user {user_id} kept changing; rebuild gave up after {MAX_REBUILD_ATTEMPTS} attempts")
+            logging.info(f"Aggregates rebuilt for user {user_id}")
+        return len(user_ids)
+    
+    def _recount(self, user_id, interview_service):
+        """Counters of one user computed from scratch"""
+        counts = {}
+        for session_data in self._user_sessions(user_id, interview_service):
+            career_path = session_data.get('career_path', 'Unknown')
+            _add_counts(counts, {'sessions_started': 1, 'sessions_started_by_career': {career_path: 1}})
+            for response in session_data.get('responses', []):
+                _add_counts(counts, _response_counts(
+                    career_path,
+                    response.get('category', 'General'),
+                    response.get('difficulty', 'intermediate')
+                ))
+            if session_data.get('status') == 'completed':
+                xp_earned = session_data.get('xp_earned', 0)
+                _add_counts(counts, {
+                    'sessions_completed': 1,
+                    'sessions_completed_by_career': {career_path: 1},
+                    'xp_total': xp_earned,
+                    'xp_by_source': {'Interview Completion': xp_earned}
+                })
+        for feedback_data in self._user_feedback(user_id):
+            _add_counts(counts, {
+                'feedback_count': 1,
+                'feedback_rating_sum': feedback_data.get('rating', 0),
+                'xp_total': 25,
+                'xp_by_source': {'Feedback Provided': 25}
+            })
+        return counts
+    
+    def _replace_if_unchanged(self, transaction, uid, counts, revision):
+        """Overwrite the aggregates with a recount unless a counter write landed since revision was read"""
+        current = transaction.get(AGGREGATES, uid) or {}
+        if current.get('revision', 0) != revision:
+            return False
+        transaction.set(AGGREGATES, uid, dict(counts, revision=revision + 1, updated_at=datetime.now().isoformat()))
+        return True
+    
+    def _increment(self, uid, counts):
+        """Apply nested counter increments to a user's aggregates document"""
+        if not uid or uid == 'guest':
+            return
+        if self.write_queue:
+            self.write_queue.submit(self._write_increments, uid, counts)
+            return
+        try:
+            self._write_increments(uid, counts)
+        except Exception as e:
+            logging.error(f"Error updating aggregates for user {uid}: {e}")
+    
+    def _write_increments(self, uid, counts):
+        data = _as_increments(counts)
+        # Lets rebuild() detect writes that land while it recounts
+        data['revision'] = Increment(1)
+        data['updated_at'] = datetime.now().isoformat()
+        self.storage.set(AGGREGATES, uid, data, merge=True)
+    
+    def _all_user_ids(self):
+        return self.storage.ids(USERS)
+    
+    def _user_sessions(self, uid, interview_service):
+        """Full sessions (with responses) of one user; raises rather than skip what it cannot read"""
+        cursor = None
+        while True:
+            sessions, cursor = interview_service.query_sessions(uid, 50, cursor)
+            for session_summary in sessions:
+                session_data = interview_service.get_session(session_summary['session_id'])
+                if not session_data:
+                    raise RuntimeError(f"Could not read session {session_summary['session_id']} of user {uid}")
+                yield session_data
+            if not cursor:
+                break
+    
+    def _user_feedback(self, uid):
+        return self.storage.query(FEEDBACK, filters=[('user_id', '==', uid)])
@@ -1,25 +1,64 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from flask_socketio import SocketIO
+from config import get_config
+from serialization import APIRequest, JSONProvider
 from routes import create_routes
+from aggregates import AggregateService
+from firebase_config import initialize_firebase
+from services import LOCAL_STORAGE_PATH, InterviewService
+from storage import create_storage_backend
+from metrics import Metrics, RequestProfiler, init_metrics
+from compression import ResponseCompressor, init_compression
+import click
 import logging
 import os
 
-def create_app():
+def create_app(config_name=None, storage=None):
+    """Application factory used by the dev server and WSGI servers (see wsgi.py).
+    
+    storage overrides the configured storage backend (benchmarks pass a MemoryBackend).
+    """
     # Initialize Flask app
     app = Flask(__name__)
+    app.config.from_object(get_config(config_name))
+    # JSON by default; MessagePack bodies and Accept: application/msgpack are understood too
+    app.request_class = APIRequest
+    app.json = JSONProvider(app)
+    
+    # Enable CORS for all routes; browsers may reuse a preflight for CORS_MAX_AGE seconds
+    CORS(app, origins=['*'], supports_credentials=True, max_age=app.config['CORS_MAX_AGE'])
     
-    # Enable CORS for all routes
-    CORS(app, origins=['*'], supports_credentials=True)
+    # gzip/brotli for JSON responses above COMPRESSION_MIN_SIZE bytes
+    if app.config['COMPRESSION_ENABLED']:
+        init_compression(app, ResponseCompressor(min_size=app.config['COMPRESSION_MIN_SIZE']))
+    
+    # Socket.IO for live interview sessions (see realtime.py); each open
+    # socket holds one server thread, so size GUNICORN_THREADS accordingly
+    socketio = None
+    if app.config['SOCKETIO_ENABLED']:
+        socketio = SocketIO(app, cors_allowed_origins='*', async_mode='threading')
     
     # Configure logging
     logging.basicConfig(
-        level=logging.INFO,
+        level=app.config['LOG_LEVEL'],
         format='%(asctime)s %(levelname)s %(name)s %(message)s'
     )
     
+    # Per-endpoint latency, storage calls and sampled profiles of slow requests
+    metrics = None
+    if app.config['METRICS_ENABLED']:
+        profiler = RequestProfiler(
+            app.config['PROFILE_DIR'],
+            sample_rate=app.config['PROFILE_SAMPLE_RATE'],
+            threshold=app.config['PROFILE_SLOW_MS'] / 1000
+        )
+        metrics = init_metrics(app, Metrics(), profiler)
+    
     try:
-        # Create and register blueprints
-        auth_bp, interview_bp, user_bp, feedback_bp, profile_bp = create_routes()
+        # Create and register blueprints; Firebase is initialized here, so
+        # under a prefork server this must run in each worker after fork
+        auth_bp, interview_bp, user_bp, feedback_bp, profile_bp = create_routes(app.config, storage, metrics, socketio)
         
         app.register_blueprint(auth_bp, url_prefix='/api/auth')
         app.register_blueprint(interview_bp, url_prefix='/api/interview')
@@ -31,6 +70,23 @@ def create_app():
         app.logger.error(f"Failed to initialize routes: {e}")
         return None
     
+    @app.cli.command('rebuild-aggregates')
+    @click.argument('user_id', required=False)
+    def rebuild_aggregates(user_id):
+        """Backfill user aggregates from stored sessions and feedback."""
+        db, _ = initialize_firebase()
+        storage = create_storage_backend(app.config, db)
+        rebuilt = AggregateService(storage).rebuild(InterviewService(storage), user_id)
+        click.echo(f"Rebuilt aggregates for {rebuilt} user(s)")
+    
+    @app.cli.command('import-local-storage')
+    @click.argument('directory', required=False, default=LOCAL_STORAGE_PATH)
+    def import_local_storage(directory):
+        """Copy legacy per-document JSON files into the SQLite store."""
+        storage = create_storage_backend(dict(app.config, STORAGE_BACKEND='sqlite'))
+        imported = storage.import_json_directory(directory)
+        click.echo(f"Imported {imported} document(s) into {storage.path}")
+    
     # Health check endpoint
     @app.route('/')
     def health_check():
@@ -68,14 +124,26 @@ def create_app():
     return app
 
 if __name__ == '__main__':
+    # Development server only; production runs `gunicorn -c gunicorn.conf.py wsgi:app`
     app = create_app()
     
     if app:
         port = int(os.environ.get('PORT', 5000))
-        app.run(
-            debug=True,
-            host='0.0.0.0',
-            port=port
-        )
+        socketio = app.extensions.get('socketio')
+        if socketio:
+            # Werkzeug's server is fine here; it also serves the websocket transport
+            socketio.run(
+                app,
+                debug=app.config['DEBUG'],
+                host='0.0.0.0',
+                port=port,
+                allow_unsafe_werkzeug=True
+            )
+        else:
+            app.run(
+                debug=app.config['DEBUG'],
+                host='0.0.0.0',
+                port=port
+            )
     else:
-        print("Failed to create application")
\ No newline at end of file
+        print("Failed to create application")
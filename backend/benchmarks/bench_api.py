@@ -0,0 +1,156 @@
+"""Drive the API through the Flask test client against the in-memory storage backend.
+
+Reports per-endpoint latency and storage round trips, then request throughput
+at a few concurrency levels. No Firebase project is needed. Run from the
+backend directory:
+
+    python -m benchmarks.bench_api [--latency-ms 5] [--users 20] [--threads 1,4,16]
+"""
+import argparse
+import logging
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+
+import writebehind
+from app import create_app
+from storage import MemoryBackend
+
+CAREER_PATH = 'SoftwareDev'
+RESPONSES_PER_SESSION = 5
+
+
+def interview_flow(user_index):
+    """One user's journey; yields (endpoint, method, path, json) before each call"""
+    email = f"bench{user_index}-{threading.get_ident()}-{time.perf_counter_ns()}@example.com"
+    response = yield 'register', 'POST', '/api/auth/register', {'email': email, 'password': 'benchmark'}
+    user_id = response['user_id']
+    
+    response = yield 'start', 'POST', '/api/interview/start', {'user_id': user_id, 'career_path': CAREER_PATH}
+    session_id = response['session_id']
+    for question_id in range(1, RESPONSES_PER_SESSION + 1):
+        yield 'response', 'POST', '/api/interview/response', {
+            'session_id': session_id,
+            'question_id': question_id,
+            'question_text': f"Question {question_id}",
+            'response': 'A reasonably detailed answer ' * 20
+        }
+    yield 'end', 'POST', '/api/interview/end', {'session_id': session_id}
+    yield 'feedback', 'POST', '/api/feedback/submit', {'user_id': user_id, 'session_id': session_id, 'rating': 4}
+    yield 'add-xp', 'POST', '/api/profile/add-xp', {'user_id': user_id, 'xp_amount': 10}
+    yield 'profile', 'GET', f'/api/user/profile/{user_id}', None
+    yield 'questions', 'GET', f'/api/interview/questions/{CAREER_PATH}', None
+
+
+def run_flow(client, user_index, on_request=None):
+    flow = interview_flow(user_index)
+    response_json = None
+    while True:
+        try:
+            endpoint, method, path, body = flow.send(response_json)
+        except StopIteration:
+            return
+        if on_request:
+            on_request(endpoint, 'before')
+        start = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} -> {response.status_code}: {response.get_data(as_text=True)}")
+        if on_request:
+            on_request(endpoint, elapsed)
+        response_json = response.get_json()
+
+
+def profile_endpoints(app, storage, users):
+    """Sequential run: latency and round trips per endpoint.
+    
+    The write-behind queue is drained between requests and what it wrote after
+    a response is reported separately (writes it finishes while the request is
+    still in flight are charged to that request).
+    """
+    timings = defaultdict(list)
+    round_trips = defaultdict(Counter)
+    background = Counter()
+    
+    def on_request(endpoint, elapsed):
+        if elapsed == 'before':
+            writebehind.flush_all()
+            background.update(storage.reset_stats())
+            return
+        timings[endpoint].append(elapsed)
+        round_trips[endpoint].update(storage.reset_stats())
+    
+    client = app.test_client()
+    for user_index in range(users):
+        run_flow(client, user_index, on_request)
+    writebehind.flush_all()
+    background.update(storage.reset_stats())
+    
+    print(f"{'endpoint':<10} {'calls':>6} {'mean ms':>9} {'p95 ms':>9} {'trips/req':>10}  breakdown")
+    for endpoint, samples in timings.items():
+        samples.sort()
+        trips = round_trips[endpoint]
+        breakdown = ', '.join(f"{op}={count / len(samples):.1f}" for op, count in sorted(trips.items()))
+        print(
+            f"{endpoint:<10} {len(samples):>6} {statistics.mean(samples) * 1000:>9.2f} "
+            f"{samples[int(len(samples) * 0.95) - 1] * 1000:>9.2f} {sum(trips.values()) / len(samples):>10.1f}  {breakdown}"
+        )
+    breakdown = ', '.join(f"{op}={count / users:.1f}" for op, count in sorted(background.items()))
+    print(f"{'background':<10} {'':>6} {'':>9} {'':>9} {sum(background.values()) / users:>10.1f}  {breakdown} (per user flow)")
+
+
+def measure_throughput(app, users, threads):
+    """Concurrent run: total requests per second across worker threads"""
+    counts = Counter()
+    errors = []
+    
+    def worker(worker_index):
+        client = app.test_client()
+        requests_made = 0
+        
+        def on_request(endpoint, elapsed):
+            nonlocal requests_made
+            if elapsed != 'before':
+                requests_made += 1
+        try:
+            for user_index in range(worker_index, users, threads):
+                run_flow(client, user_index, on_request)
+        except Exception as e:
+            errors.append(e)
+        counts[worker_index] = requests_made
+    
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    total = sum(counts.values())
+    print(f"{threads:>3} threads: {total:>6} requests in {elapsed:6.2f} s  {total / elapsed:8.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=2.0, help="simulated latency per storage round trip")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--threads', default='1,4,16', help="comma-separated concurrency levels")
+    args = parser.parse_args()
+    
+    storage = MemoryBackend(latency=args.latency_ms / 1000)
+    app = create_app(storage=storage)
+    logging.getLogger().setLevel(logging.WARNING)
+    
+    print(f"in-memory storage, {args.latency_ms} ms per round trip, {args.users} users\n")
+    profile_endpoints(app, storage, args.users)
+    print()
+    for threads in (int(value) for value in args.threads.split(',')):
+        measure_throughput(app, args.users, threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare the closed-form level engine against the original while-loop.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_levels
+"""
+import random
+import time
+
+from models import level_for_xp, level_progress, levels_for_xp
+
+MAX_XP = 10 ** 7
+
+
+def loop_level_progress(xp_points):
+    """The level/progress walk User.calculate_level and get_xp_progress used to do"""
+    level = 1
+    xp_needed = 100
+    total_xp_for_level = 0
+    
+    while xp_points >= total_xp_for_level + xp_needed:
+        total_xp_for_level += xp_needed
+        level += 1
+        xp_needed = level * 100
+    
+    return level, xp_points - total_xp_for_level
+
+
+def timed(label, fn, values):
+    start = time.perf_counter()
+    fn(values)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1000:10.2f} ms  {elapsed / len(values) * 1e9:10.0f} ns/op")
+    return elapsed
+
+
+def main():
+    rng = random.Random(42)
+    
+    # Exhaustive check around every threshold up to MAX_XP, plus random samples
+    edges = []
+    level = 1
+    while level * (level - 1) * 50 <= MAX_XP:
+        threshold = level * (level - 1) * 50
+        edges.extend([threshold - 1, threshold, threshold + 1])
+        level += 1
+    samples = [xp for xp in edges if xp >= 0] + [rng.randint(0, MAX_XP) for _ in range(20000)]
+    for xp in samples:
+        expected_level, expected_in_level = loop_level_progress(xp)
+        progress = level_progress(xp)
+        assert level_for_xp(xp) == expected_level, xp
+        assert progress['current_level_xp'] == expected_in_level, xp
+    print(f"verified {len(samples)} XP values against the loop (max level {level_for_xp(MAX_XP)})")
+    
+    for magnitude in (10 ** 3, 10 ** 5, 10 ** 7):
+        values = [rng.randint(0, magnitude) for _ in range(20000)]
+        print(f"\nXP uniformly in [0, {magnitude:,}], {len(values):,} users")
+        loop = timed("while-loop", lambda vs: [loop_level_progress(v) for v in vs], values)
+        single = timed("level_for_xp", lambda vs: [level_for_xp(v) for v in vs], values)
+        timed("level_progress", lambda vs: [level_progress(v) for v in vs], values)
+        batch = timed("levels_for_xp (batch)", levels_for_xp, values)
+        print(f"speedup vs loop: single {loop / single:.1f}x, batch {loop / batch:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
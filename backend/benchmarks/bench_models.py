@@ -0,0 +1,81 @@
+"""Serialize/deserialize throughput and memory of the slotted models.
+
+Compares the previous path (a fresh dict per save, json.dumps(default=str))
+with Model.to_dict() + serialization.dumps() and the way back through
+serialization.loads() + Model.from_dict(). Run from the backend directory:
+
+    python -m benchmarks.bench_models
+"""
+import json
+import time
+import tracemalloc
+
+import serialization
+from models import Feedback, SimpleInterviewSession, User
+
+COUNT = 20000
+
+
+def make_user(i):
+    user = User(f"user{i}", f"user{i}@example.com", "Ada", "Lovelace")
+    user.add_xp(i % 5000, "Benchmark")
+    user.career_paths_practiced = {'SoftwareDev': i % 7, 'DataAnalyst': i % 3}
+    return user
+
+
+def make_session(i):
+    session = SimpleInterviewSession(f"user{i}", 'SoftwareDev')
+    session.total_questions = 10
+    for question_id in range(1, 6):
+        session.add_response(question_id, f"Question {question_id}", "An answer " * 30, "Algorithms", "intermediate")
+    return session
+
+
+def make_feedback(i):
+    return Feedback(f"user{i}", f"session{i}", i % 5 + 1, "Helpful questions")
+
+
+def legacy_dumps(obj):
+    """What saving used to cost: a fresh dict with raw datetimes through json.dumps(default=str)"""
+    return json.dumps({field: getattr(obj, field) for field in obj.FIELDS}, default=str)
+
+
+def timed(label, fn, values):
+    start = time.perf_counter()
+    result = [fn(value) for value in values]
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<40} {len(values) / elapsed:>12,.0f} ops/s  {elapsed / len(values) * 1e6:8.2f} us/op")
+    return result
+
+
+def instance_memory(factory):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory(i) for i in range(2000)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del objects
+    return size / 2000
+
+
+def main():
+    print(f"serializer: {'orjson' if serialization.orjson else 'json (orjson not installed)'}, {COUNT:,} objects per model")
+    for name, factory in (('User', make_user), ('SimpleInterviewSession', make_session), ('Feedback', make_feedback)):
+        model = factory(0).__class__
+        objects = [factory(i) for i in range(COUNT)]
+        print(f"\n{name} ({len(model.FIELDS)} fields, ~{instance_memory(factory):,.0f} bytes per object incl. contents)")
+        
+        timed("legacy dict + json.dumps(default=str)", legacy_dumps, objects)
+        encoded = timed("to_dict + serialization.dumps", lambda obj: serialization.dumps(obj.to_dict()), objects)
+        legacy_encoded = [legacy_dumps(obj) for obj in objects[:1000]]
+        timed("json.loads (legacy)", json.loads, legacy_encoded * (COUNT // 1000))
+        decoded = timed("serialization.loads + from_dict", lambda data: model.from_dict(serialization.loads(data)), encoded)
+        
+        # Round trip must be lossless
+        for original, restored in zip(objects[:100], decoded[:100]):
+            assert original.to_dict() == restored.to_dict(), name
+
+
+if __name__ == '__main__':
+    main()
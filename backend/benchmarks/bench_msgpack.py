@@ -0,0 +1,76 @@
+"""JSON vs MessagePack for the /start, /end and profile payloads.
+
+Captures the three bodies from a real flow through the Flask test client
+(in-memory storage, no Firebase project needed), then compares encode and
+decode cost and payload size, raw and gzipped, of serialization.dumps/loads
+against serialization.packb/unpackb. Run from the backend directory:
+
+    python -m benchmarks.bench_msgpack [--count 5000]
+"""
+import argparse
+import gzip
+import logging
+import time
+
+import msgpack
+
+import serialization
+import writebehind
+from app import create_app
+from storage import MemoryBackend
+
+CAREER_PATH = 'SoftwareDev'
+RESPONSES_PER_SESSION = 10
+
+
+def capture_payloads():
+    """{name: decoded JSON body} of one interview flow"""
+    app = create_app(storage=MemoryBackend())
+    logging.getLogger().setLevel(logging.WARNING)
+    client = app.test_client()
+    
+    user_id = client.post('/api/auth/register', json={'email': 'bench@example.com', 'password': 'benchmark'}).get_json()['user_id']
+    start = client.post('/api/interview/start', json={'user_id': user_id, 'career_path': CAREER_PATH}).get_json()
+    for question_id in range(1, RESPONSES_PER_SESSION + 1):
+        client.post('/api/interview/response', json={
+            'session_id': start['session_id'],
+            'question_id': question_id,
+            'question_text': f"Question {question_id}",
+            'response': 'A reasonably detailed answer ' * 20
+        })
+    writebehind.flush_all()
+    end = client.post('/api/interview/end', json={'session_id': start['session_id']}).get_json()
+    profile = client.get(f'/api/user/profile/{user_id}').get_json()
+    return {'start': start, 'end': end, 'profile': profile}
+
+
+def timed(fn, value, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        fn(value)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=5000, help="encodes/decodes per payload and format")
+    args = parser.parse_args()
+    
+    print(f"json: {'orjson' if serialization.orjson else 'json'}, msgpack {msgpack.version}, {args.count:,} iterations")
+    print(f"\n{'payload':<10} {'format':<8} {'bytes':>8} {'gzip':>8} {'encode us':>10} {'decode us':>10}")
+    for name, payload in capture_payloads().items():
+        formats = (
+            ('json', serialization.dumps, serialization.loads),
+            ('msgpack', serialization.packb, serialization.unpackb)
+        )
+        for label, encode, decode in formats:
+            body = encode(payload)
+            # Timestamps come back as the same ISO strings either way
+            assert decode(body) == payload, (name, label)
+            encode_us = timed(encode, payload, args.count)
+            decode_us = timed(decode, body, args.count)
+            print(f"{name:<10} {label:<8} {len(body):>8,} {len(gzip.compress(body, mtime=0)):>8,} {encode_us:>10.2f} {decode_us:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+from models import INTERVIEW_QUESTIONS_DB
+import hashlib
+import msgpack
+import serialization
+
+def _dumps(value):
+    """Compact JSON with sorted keys, matching what jsonify produces"""
+    return serialization.dumps(value, sort_keys=True).decode('utf-8')
+
+class CataloguePayload:
+    """Pre-serialized question list of one career path"""
+    def __init__(self, career_path, questions, version):
+        self.career_path = career_path
+        self.total = len(questions)
+        self.questions_json = _dumps(questions).encode('utf-8')
+        self.body = _dumps({
+            'career_path': career_path,
+            'catalogue_version': version,
+            'questions': questions,
+            'total': len(questions)
+        }).encode('utf-8') + b'\n'
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.questions_msgpack = serialization.packb(questions)
+        self.msgpack_body = serialization.packb({
+            'career_path': career_path,
+            'catalogue_version': version,
+            'questions': questions,
+            'total': len(questions)
+        })
+        # A different representation of the same resource needs its own tag
+        self.msgpack_etag = hashlib.sha256(self.msgpack_body).hexdigest()[:32]
+
+class QuestionCatalogue:
+    """Question payloads serialized once, with a version clients can cache against.
+    
+    The version is a hash of the whole question set, so it changes whenever
+    any question does. Each payload carries the version, so its ETag changes too.
+    """
+    def __init__(self, questions_db=None, max_age=3600):
+        self.max_age = max_age
+        self.load(questions_db if questions_db is not None else INTERVIEW_QUESTIONS_DB)
+    
+    def load(self, questions_db):
+        """(Re)build every payload; the swap is a single assignment so readers never see a mix"""
+        version = hashlib.sha256(_dumps(questions_db).encode('utf-8')).hexdigest()[:16]
+        payloads = {
+            career_path: CataloguePayload(career_path, questions, version)
+            for career_path, questions in questions_db.items()
+        }
+        self._state = (version, payloads)
+    
+    @property
+    def version(self):
+        return self._state[0]
+    
+    def get(self, career_path):
+        """Payload for a career path, or None if it is unknown"""
+        return self._state[1].get(career_path)
+    
+    def render_start(self, fields, career_path, include_questions=True):
+        """JSON body for a session start: fields plus the career's questions, spliced in pre-serialized"""
+        version, payloads = self._state
+        payload = payloads.get(career_path)
+        fields = dict(fields, catalogue_version=version)
+        if not include_questions:
+            return _dumps(fields).encode('utf-8') + b'\n'
+        header = _dumps(fields).encode('utf-8')
+        questions_json = payload.questions_json if payload else b'[]'
+        return header[:-1] + b',"questions":' + questions_json + b'}\n'
+    
+    def render_start_msgpack(self, fields, career_path, include_questions=True):
+        """MessagePack twin of render_start: the map is written entry by entry so the questions stay pre-packed"""
+        version, payloads = self._state
+        payload = payloads.get(career_path)
+        fields = dict(fields, catalogue_version=version)
+        if not include_questions:
+            return serialization.packb(fields)
+        packer = msgpack.Packer(datetime=True)
+        parts = [packer.pack_map_header(len(fields) + 1)]
+        for key, value in fields.items():
+            parts.append(packer.pack(key))
+            parts.append(packer.pack(value))
+        parts.append(packer.pack('questions'))
+        parts.append(payload.questions_msgpack if payload else packer.pack([]))
+        return b''.join(parts)
@@ -0,0 +1,118 @@
+from concurrent.futures import Future
+from storage import MAX_BATCH_WRITES, StorageBackend, Write
+import logging
+import queue
+import threading
+import time
+
+class WriteCoalescer:
+    """Groups writes from concurrent requests into shared batch commits.
+    
+    A background thread takes the first pending write, waits up to window
+    seconds (or until max_batch writes are pending) and commits everything it
+    has with one apply_batch() call. Writes that arrive during a commit go
+    into the next one. Every submitted write gets its own Future.
+    """
+    def __init__(self, storage, window=0.002, max_batch=MAX_BATCH_WRITES, name='write-coalescer'):
+        self.storage = storage
+        self.window = window
+        self.max_batch = min(max_batch, MAX_BATCH_WRITES)
+        self.name = name
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._writes = 0
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+    
+    def submit(self, write):
+        """Queue a Write; the returned Future resolves to apply_batch's result for it"""
+        future = Future()
+        self._queue.put((write, future))
+        return future
+    
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'batches': self._batches,
+                'writes': self._writes,
+                'writes_per_batch': round(self._writes / self._batches, 2) if self._batches else 0
+            }
+    
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    pending.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(pending)
+    
+    def _commit(self, pending):
+        writes = [write for write, _ in pending]
+        try:
+            results = self.storage.apply_batch(writes)
+        except Exception as e:
+            if len(pending) == 1:
+                pending[0][1].set_exception(e)
+                return
+            # The batch is all-or-nothing: retry one by one so only the bad write fails
+            logging.warning(f"{self.name}: batch of {len(pending)} failed ({e}); retrying writes individually")
+            for item in pending:
+                self._commit([item])
+            return
+        
+        with self._stats_lock:
+            self._batches += 1
+            self._writes += len(pending)
+        for (_, future), result in zip(pending, results):
+            future.set_result(result)
+
+class CoalescingBackend(StorageBackend):
+    """Storage wrapper whose set/update/add go through a WriteCoalescer.
+    
+    Callers still block until their write is committed, so reads after a
+    write see it; they just share the commit with other requests. Reads,
+    appends and transactions go straight to the wrapped backend.
+    """
+    def __init__(self, backend, window=0.002, max_batch=MAX_BATCH_WRITES):
+        self.backend = backend
+        self.name = backend.name
+        self.coalescer = WriteCoalescer(backend, window, max_batch)
+    
+    def __getattr__(self, attr):
+        # Backend-specific extras (round-trip stats, import_json_directory, ...)
+        return getattr(self.backend, attr)
+    
+    def set(self, collection, doc_id, data, merge=False):
+        self.coalescer.submit(Write('set', collection, doc_id, data, merge)).result()
+    
+    def update(self, collection, doc_id, data):
+        self.coalescer.submit(Write('update', collection, doc_id, data)).result()
+    
+    def add(self, collection, data):
+        return self.coalescer.submit(Write('add', collection, data=data)).result()
+    
+    def get(self, collection, doc_id, fields=None):
+        return self.backend.get(collection, doc_id, fields)
+    
+    def query(self, collection, filters=(), order_by=None, descending=False, limit=None, start_after=None, fields=None, id_field=None):
+        return self.backend.query(collection, filters, order_by, descending, limit, start_after, fields, id_field)
+    
+    def ids(self, collection):
+        return self.backend.ids(collection)
+    
+    def append(self, collection, doc_id, subcollection, items, parent_update=None):
+        self.backend.append(collection, doc_id, subcollection, items, parent_update)
+    
+    def list_appended(self, collection, doc_id, subcollection):
+        return self.backend.list_appended(collection, doc_id, subcollection)
+    
+    def run_transaction(self, fn):
+        return self.backend.run_transaction(fn)
+    
+    def apply_batch(self, writes):
+        return self.backend.apply_batch(writes)
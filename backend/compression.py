@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from flask import request
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - Brotli is in requirements.txt, gzip is the fallback
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/msgpack', 'application/javascript', 'text/plain', 'text/html', 'text/css', 'text/csv'}
+
+def _accepted_encodings(header):
+    """{encoding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+class ResponseCompressor:
+    """Compresses response bodies with brotli or gzip, whichever the client prefers.
+    
+    Brotli wins ties when it is installed. Bodies smaller than min_size,
+    streamed responses and already encoded ones are left alone. Responses
+    with an ETag are the same bytes every time, so their compressed bodies
+    are kept in a small LRU (keyed by ETag and encoding) and each static
+    payload is compressed once.
+    """
+    def __init__(self, min_size=500, gzip_level=5, brotli_quality=4, cache_size=256):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+    
+    def choose_encoding(self, accept_encoding):
+        accepted = _accepted_encodings(accept_encoding or '')
+        candidates = (['br'] if brotli else []) + ['gzip']
+        best, best_q = None, 0.0
+        for encoding in candidates:
+            q = accepted.get(encoding, accepted.get('*', 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+    
+    def compress(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+    
+    def _compress_cached(self, etag, body, encoding):
+        key = (etag, encoding)
+        with self._cache_lock:
+            compressed = self._cache.get(key)
+            if compressed is not None:
+                self._cache.move_to_end(key)
+                return compressed
+        compressed = self.compress(body, encoding)
+        with self._cache_lock:
+            self._cache[key] = compressed
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return compressed
+    
+    def process(self, response):
+        response.vary.add('Accept-Encoding')
+        if (
+            response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+        
+        encoding = self.choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+        
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            compressed = self._compress_cached(etag, body, encoding)
+        else:
+            compressed = self.compress(body, encoding)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            # The compressed bytes differ, so the tag can only be a weak one; If-None-Match compares weakly
+            response.set_etag(etag, weak=True)
+        return response
+
+def init_compression(app, compressor):
+    """Compress every eligible response of the app"""
+    app.after_request(compressor.process)
+    return compressor
@@ -12,7 +12,71 @@ class Config:
     FIREBASE_CLIENT_ID = os.environ.get('FIREBASE_CLIENT_ID')
     FIREBASE_AUTH_URI = os.environ.get('FIREBASE_AUTH_URI')
     FIREBASE_TOKEN_URI = os.environ.get('FIREBASE_TOKEN_URI')
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     
+    # Reject requests without a Firebase ID token on protected routes
+    AUTH_REQUIRED = os.environ.get('AUTH_REQUIRED', 'false').lower() == 'true'
+    
+    # User document cache
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+    
+    # Document storage: 'auto' uses Firestore when Firebase is configured, else SQLite
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'auto')
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join('local_storage', 'skillbuddy.db'))
+    
+    # STORAGE_BACKEND=memory: simulated round-trip latency for load tests
+    STORAGE_LATENCY_MS = float(os.environ.get('STORAGE_LATENCY_MS', 0))
+    
+    # Background queue for stats and bonus XP writes; WRITE_QUEUE_BATCH_SIZE caps the
+    # tasks taken per wake-up and WRITE_QUEUE_RETRIES applies to idempotent tasks only
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+    WRITE_QUEUE_SIZE = int(os.environ.get('WRITE_QUEUE_SIZE', 1000))
+    WRITE_QUEUE_BATCH_SIZE = int(os.environ.get('WRITE_QUEUE_BATCH_SIZE', 50))
+    WRITE_QUEUE_RETRIES = int(os.environ.get('WRITE_QUEUE_RETRIES', 3))
+    
+    # Concurrent writes are committed together in batches of up to WRITE_BATCH_MAX
+    WRITE_COALESCING_ENABLED = os.environ.get('WRITE_COALESCING_ENABLED', 'true').lower() == 'true'
+    WRITE_BATCH_WINDOW_MS = float(os.environ.get('WRITE_BATCH_WINDOW_MS', 2))
+    WRITE_BATCH_MAX = int(os.environ.get('WRITE_BATCH_MAX', 500))
+    
+    # Question bank: 'builtin', 'file' (QUESTION_BANK_FILE) or 'firestore'; sources are re-checked every QUESTION_RELOAD_INTERVAL seconds
+    QUESTION_SOURCE = os.environ.get('QUESTION_SOURCE', 'builtin')
+    QUESTION_BANK_FILE = os.environ.get('QUESTION_BANK_FILE', 'questions.json')
+    QUESTION_BANK_COLLECTION = os.environ.get('QUESTION_BANK_COLLECTION', 'question_bank')
+    QUESTION_RELOAD_INTERVAL = float(os.environ.get('QUESTION_RELOAD_INTERVAL', 5))
+    
+    # Upper bound on responses accepted by POST /api/interview/responses:batch
+    MAX_BATCH_RESPONSES = int(os.environ.get('MAX_BATCH_RESPONSES', 100))
+    
+    # Socket.IO namespace /interview for live sessions
+    SOCKETIO_ENABLED = os.environ.get('SOCKETIO_ENABLED', 'true').lower() == 'true'
+    
+    # Seconds between leaderboard snapshot writes (and reads of other workers' snapshots)
+    LEADERBOARD_SYNC_INTERVAL = float(os.environ.get('LEADERBOARD_SYNC_INTERVAL', 30))
+    # Snapshot documents per board, each holding roughly 1/N of the users. A shard nears Firestore's
+    # 1 MiB limit at about 20k users, so 16 suits up to ~300k users; beyond that use users / 20k
+    LEADERBOARD_SNAPSHOT_SHARDS = int(os.environ.get('LEADERBOARD_SNAPSHOT_SHARDS', 16))
+    
+    # Cache-Control max-age for the static question catalogue
+    QUESTIONS_MAX_AGE = int(os.environ.get('QUESTIONS_MAX_AGE', 3600))
+    
+    # Request metrics on /metrics; PROFILE_SAMPLE_RATE of requests run under cProfile,
+    # and those slower than PROFILE_SLOW_MS are dumped to PROFILE_DIR
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 500))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join('local_storage', 'profiles'))
+    
+    # Response compression and CORS preflight caching (browsers cap max-age at 2 hours or less)
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 500))
+    CORS_MAX_AGE = int(os.environ.get('CORS_MAX_AGE', 7200))
+    
+    # Uploads: resumes are streamed, MAX_CONTENT_LENGTH caps every request body
+    MAX_RESUME_BYTES = int(os.environ.get('MAX_RESUME_BYTES', 10 * 1024 * 1024))
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
@@ -23,4 +87,9 @@ config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
-}
\ No newline at end of file
+}
+
+def get_config(config_name=None):
+    """Select the config class by name, falling back to APP_ENV/FLASK_ENV"""
+    config_name = config_name or os.environ.get('APP_ENV') or os.environ.get('FLASK_ENV') or 'default'
+    return config.get(config_name, config['default'])
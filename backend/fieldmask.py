@@ -0,0 +1,43 @@
+def parse_fields(value):
+    """Parse a fields= mask such as 'user_id,user_data.xp_points' into a tree.
+    
+    Returns None when no mask was given (everything is wanted). In the tree an
+    empty dict means the whole value under that name.
+    """
+    if not value:
+        return None
+    tree = {}
+    for path in value.split(','):
+        parts = [part.strip() for part in path.split('.') if part.strip()]
+        if not parts:
+            continue
+        node = tree
+        for index, part in enumerate(parts):
+            if part in node and not node[part]:
+                # A shorter path already selects the whole value
+                break
+            if index == len(parts) - 1:
+                node[part] = {}
+            else:
+                node = node.setdefault(part, {})
+    return tree
+
+def wants(tree, field):
+    """True if the mask keeps a top-level field, so work for skipped ones can be avoided"""
+    return tree is None or field in tree
+
+def subtree(tree, field):
+    """The mask of a nested value (None for all of it)"""
+    if tree is None:
+        return None
+    return tree.get(field) or None
+
+def apply_mask(value, tree):
+    """Keep the masked fields of dicts; lists are masked element by element"""
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [apply_mask(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: apply_mask(value[key], tree[key]) for key in tree if key in value}
+    return value
@@ -1,23 +1,100 @@
 import firebase_admin
 from firebase_admin import credentials, auth, firestore, storage
+from cachetools import TLRUCache, TTLCache
+from google.auth import jwt as google_jwt
+import io
 import os
+import re
 import json
+import time
+import hashlib
 import logging
+import threading
+import requests
+
+# Public keys Google signs Firebase ID tokens with, and the expected issuer prefix
+ID_TOKEN_CERT_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+ID_TOKEN_ISSUER_PREFIX = 'https://securetoken.google.com/'
+
+# Firebase ID tokens are compact-serialized JWTs: three base64url segments
+ID_TOKEN_PATTERN = re.compile(r'[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+')
+ID_TOKEN_MAX_LENGTH = 4096
+
+# Environment variables the Admin SDK is initialized from without a service account file
+REQUIRED_ENV_VARS = [
+    'FIREBASE_PROJECT_ID',
+    'FIREBASE_PRIVATE_KEY_ID',
+    'FIREBASE_PRIVATE_KEY',
+    'FIREBASE_CLIENT_EMAIL',
+    'FIREBASE_CLIENT_ID'
+]
+
+# Resumable uploads send the file in chunks of this size (a multiple of 256 KiB)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Process-wide registry of Firebase clients, created once and reused so the
+# underlying HTTP connections and gRPC channels are shared by every request
+_clients = {}
+_clients_lock = threading.RLock()
+
+def _get_client(name, factory):
+    """Return the registered client, creating it with factory() on first use"""
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = factory()
+            _clients[name] = client
+        return client
+
+def get_firestore_client():
+    """Cached Firestore client"""
+    return _get_client('firestore', lambda: firestore.client(_get_firebase_app()))
+
+def get_storage_bucket():
+    """Cached default Storage bucket"""
+    return _get_client('storage_bucket', lambda: storage.bucket(app=_get_firebase_app()))
+
+def get_auth_client():
+    """Cached Auth client used for token verification and user management"""
+    return _get_client('auth', lambda: auth.Client(_get_firebase_app()))
 
 def initialize_firebase():
-    """Initialize Firebase Admin SDK with better error handling"""
+    """Initialize Firebase Admin SDK once and return the cached (db, bucket) clients"""
     try:
+        db = get_firestore_client()
+        
+        # Note: Storage bucket might fail if credentials are invalid
+        try:
+            bucket = get_storage_bucket()
+        except Exception as e:
+            logging.warning(f"Storage bucket initialization failed: {e}")
+            bucket = None
+        
+        return db, bucket
+    
+    except Exception as e:
+        print(f"Error initializing Firebase: {e}")
+        logging.error(f"Firebase initialization error: {e}")
+        
+        # Return None for both to indicate failure, but don't crash the app
+        # This allows the app to run without Firebase features
+        return None, None
+
+def firebase_configured():
+    """Whether the Admin SDK is initialized or has credentials to initialize from"""
+    if firebase_admin._apps or os.path.exists('firebase-service-account.json'):
+        return True
+    return all(os.environ.get(var) for var in REQUIRED_ENV_VARS)
+
+def _get_firebase_app():
+    """Get the default Firebase app, initializing the Admin SDK on first use"""
+    with _clients_lock:
         # Check if Firebase is already initialized
         if firebase_admin._apps:
-            app = firebase_admin.get_app()
-            db = firestore.client(app)
-            # Note: Storage bucket might fail if credentials are invalid
-            try:
-                bucket = storage.bucket()
-            except Exception as e:
-                logging.warning(f"Storage bucket initialization failed: {e}")
-                bucket = None
-            return db, bucket
+            return firebase_admin.get_app()
         
         # Try to load from service account file first
         if os.path.exists('firebase-service-account.json'):
@@ -37,15 +114,7 @@ def initialize_firebase():
             print("Loading Firebase credentials from environment variables...")
             
             # Ensure all required environment variables are present
-            required_env_vars = [
-                'FIREBASE_PROJECT_ID',
-                'FIREBASE_PRIVATE_KEY_ID',
-                'FIREBASE_PRIVATE_KEY',
-                'FIREBASE_CLIENT_EMAIL',
-                'FIREBASE_CLIENT_ID'
-            ]
-            
-            missing_vars = [var for var in required_env_vars if not os.environ.get(var)]
+            missing_vars = [var for var in REQUIRED_ENV_VARS if not os.environ.get(var)]
             if missing_vars:
                 raise ValueError(f"Missing environment variables: {missing_vars}")
             
@@ -68,39 +137,149 @@ def initialize_firebase():
             'storageBucket': f"{os.environ.get('FIREBASE_PROJECT_ID', 'login-page-13eae')}.appspot.com"
         })
         
-        db = firestore.client()
-        
-        # Try to initialize storage bucket
-        try:
-            bucket = storage.bucket()
-        except Exception as e:
-            logging.warning(f"Storage bucket initialization failed: {e}")
-            bucket = None
-        
         print("Firebase initialized successfully!")
-        return db, bucket
+        return app
+
+class CertificateCache:
+    """Firebase ID token signing certificates, prefetched and refreshed in the background"""
+    def __init__(self, url=ID_TOKEN_CERT_URL, min_refresh_seconds=60):
+        self.url = url
+        self.min_refresh_seconds = min_refresh_seconds
+        self._certs = {}
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._thread = None
     
-    except Exception as e:
-        print(f"Error initializing Firebase: {e}")
-        logging.error(f"Firebase initialization error: {e}")
-        
-        # Return None for both to indicate failure, but don't crash the app
-        # This allows the app to run without Firebase features
-        return None, None
+    def get(self):
+        """Current certificates by key id, fetched synchronously if stale"""
+        if time.time() >= self._expires_at:
+            self.refresh()
+        return self._certs
+    
+    def refresh(self):
+        """Fetch certificates, honouring the Cache-Control max-age Google sends"""
+        with self._lock:
+            response = requests.get(self.url, timeout=10)
+            response.raise_for_status()
+            match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+            max_age = int(match.group(1)) if match else self.min_refresh_seconds
+            self._certs = response.json()
+            self._expires_at = time.time() + max_age
+    
+    def start(self):
+        """Start the background refresher (once per process)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='firebase-cert-refresh', daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+                # Refresh ahead of expiry so requests never wait on the fetch
+                delay = max((self._expires_at - time.time()) * 0.9, self.min_refresh_seconds)
+            except Exception as e:
+                logging.warning(f"Certificate refresh failed: {e}")
+                delay = self.min_refresh_seconds
+            time.sleep(delay)
+
+_certificates = CertificateCache()
+
+# Verified token claims keyed by token hash, each entry expiring at the token's exp
+_token_cache = TLRUCache(
+    maxsize=int(os.environ.get('TOKEN_CACHE_SIZE', 10000)),
+    ttu=lambda key, claims, now: claims.get('exp', now),
+    timer=time.time
+)
+# Hashes of tokens that just failed verification, so a client retrying a bad
+# token is not re-verified on every request
+_rejected_tokens = TTLCache(
+    maxsize=int(os.environ.get('TOKEN_CACHE_SIZE', 10000)),
+    ttl=int(os.environ.get('REJECTED_TOKEN_TTL', 30)),
+    timer=time.time
+)
+_token_cache_lock = threading.Lock()
+
+def start_token_verification():
+    """Prefetch signing certificates and keep them fresh in the background"""
+    _certificates.start()
+
+def _verify_with_certificates(id_token, project_id):
+    """Verify a Firebase ID token against the prefetched certificates"""
+    header = google_jwt.decode_header(id_token)
+    if header.get('alg') != 'RS256' or not header.get('kid'):
+        raise ValueError("ID token must be RS256-signed with a key id")
+    
+    certs = _certificates.get()
+    if header['kid'] not in certs:
+        # Keys rotated since the last refresh
+        _certificates.refresh()
+        certs = _certificates.get()
+    
+    # Checks signature, exp, iat and aud
+    claims = google_jwt.decode(id_token, certs=certs, audience=project_id)
+    
+    if claims.get('iss') != ID_TOKEN_ISSUER_PREFIX + project_id:
+        raise ValueError("ID token has an incorrect issuer")
+    subject = claims.get('sub')
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise ValueError("ID token has an invalid subject")
+    if claims.get('auth_time', 0) > time.time():
+        raise ValueError("ID token has an auth_time in the future")
+    
+    claims['uid'] = subject
+    return claims
 
 def verify_user_token(id_token):
-    """Verify Firebase ID token"""
+    """Verify Firebase ID token, serving repeat verifications from the token caches"""
+    if not id_token:
+        return None
+    if len(id_token) > ID_TOKEN_MAX_LENGTH or not ID_TOKEN_PATTERN.fullmatch(id_token):
+        logging.warning("Rejected ID token that is not a JWT")
+        return None
+    if not firebase_configured():
+        return None
+    
+    key = hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+    with _token_cache_lock:
+        claims = _token_cache.get(key)
+        rejected = key in _rejected_tokens
+    if claims is not None:
+        return claims
+    if rejected:
+        return None
+    
+    try:
+        project_id = _get_firebase_app().project_id
+    except Exception as e:
+        logging.error(f"Error verifying token: {e}")
+        return None
+    
     try:
-        decoded_token = auth.verify_id_token(id_token)
+        if project_id:
+            decoded_token = _verify_with_certificates(id_token, project_id)
+        else:
+            decoded_token = get_auth_client().verify_id_token(id_token)
+        
+        with _token_cache_lock:
+            _token_cache[key] = decoded_token
         return decoded_token
+    except (ValueError, auth.InvalidIdTokenError) as e:
+        # The token itself is bad; certificate fetch failures are not cached
+        with _token_cache_lock:
+            _rejected_tokens[key] = True
+        logging.warning(f"Error verifying token: {e}")
+        return None
     except Exception as e:
-        print(f"Error verifying token: {e}")
+        logging.error(f"Error verifying token: {e}")
         return None
 
 def create_user_account(email, password):
     """Create a new user in Firebase Auth"""
     try:
-        user = auth.create_user(
+        user = get_auth_client().create_user(
             email=email,
             password=password
         )
@@ -109,10 +288,10 @@ def create_user_account(email, password):
         print(f"Error creating user: {e}")
         return None
 
-def upload_file_to_storage(file_data, file_name, user_id):
-    """Upload file to Firebase Storage"""
+def upload_file_to_storage(file_data, file_name, user_id, bucket=None):
+    """Upload file to Firebase Storage using the given or cached bucket"""
     try:
-        _, bucket = initialize_firebase()
+        bucket = bucket or get_storage_bucket()
         if not bucket:
             logging.error("Firebase Storage not available")
             return None
@@ -130,4 +309,87 @@ def upload_file_to_storage(file_data, file_name, user_id):
         return blob.public_url
     except Exception as e:
         print(f"Error uploading file: {e}")
-        return None
\ No newline at end of file
+        return None
+
+class FileTooLargeError(ValueError):
+    """Raised when an uploaded stream exceeds its size limit"""
+
+class HashingReader:
+    """File-like wrapper that size-limits and checksums a stream while it is read.
+    
+    size and the checksum always cover the bytes from the start of the stream
+    to the current position: seeking forward reads through the skipped bytes,
+    and a rewind (a resumable upload recovering) re-reads from the start,
+    which needs a seekable stream.
+    """
+    def __init__(self, stream, max_bytes=None):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._start = stream.tell() if self.seekable() else 0
+    
+    def read(self, size=-1):
+        if size is not None and size >= 0:
+            return self._read_chunk(size)
+        chunks = []
+        while True:
+            chunk = self._read_chunk(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+    
+    def seekable(self):
+        seekable = getattr(self.stream, 'seekable', None)
+        return bool(seekable and seekable())
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("HashingReader cannot seek relative to the end")
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        if offset < self.size:
+            if not self.seekable():
+                raise io.UnsupportedOperation("Cannot rewind a stream that is not seekable")
+            self.stream.seek(self._start)
+            self.size = 0
+            self._sha256 = hashlib.sha256()
+        while self.size < offset:
+            if not self._read_chunk(min(offset - self.size, UPLOAD_CHUNK_SIZE)):
+                break
+        return self.size
+    
+    def tell(self):
+        return self.size
+    
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+    
+    def _read_chunk(self, size):
+        chunk = self.stream.read(size)
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise FileTooLargeError(f"Upload exceeds {self.max_bytes} bytes")
+        self._sha256.update(chunk)
+        return chunk
+
+def upload_stream_to_storage(stream, file_name, user_id, bucket=None, content_type=None, max_bytes=None):
+    """Stream a file into Firebase Storage as a chunked resumable upload.
+    
+    Returns (public_url, size, sha256) and raises FileTooLargeError past max_bytes.
+    """
+    bucket = bucket or get_storage_bucket()
+    if not bucket:
+        raise RuntimeError("Firebase Storage not available")
+    
+    reader = HashingReader(stream, max_bytes)
+    blob = bucket.blob(f"resumes/{user_id}/{file_name}", chunk_size=UPLOAD_CHUNK_SIZE)
+    blob.metadata = {'uploaded_by': user_id}
+    blob.upload_from_file(reader, content_type=content_type or 'application/octet-stream')
+    
+    # Make the file publicly accessible (optional)
+    blob.make_public()
+    
+    return blob.public_url, reader.size, reader.hexdigest()
@@ -0,0 +1,39 @@
+"""Gunicorn settings for serving wsgi:app; every value can be overridden from the environment."""
+import logging
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Prefork workers, each running a pool of threads (requests mostly wait on Firestore);
+# an open Socket.IO connection keeps one of the threads for as long as it lasts
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Keep mobile client connections open between calls of one interview
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Firebase clients hold gRPC channels that must not cross a fork, so the app
+# is imported (and Firebase initialized) separately in every worker
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def post_fork(server, worker):
+    logging.info(f"Worker {worker.pid} forked; initializing app")
+
+
+def worker_exit(server, worker):
+    # Drain queued stats/XP writes before the worker goes away
+    import writebehind
+    writebehind.shutdown(timeout=graceful_timeout)
@@ -0,0 +1,308 @@
+from bisect import bisect_left, insort
+from datetime import datetime
+from storage import USERS, LEADERBOARDS, MAX_BATCH_WRITES, Increment, Write
+import atexit
+import logging
+import threading
+import time
+import zlib
+
+GLOBAL_BOARD = 'global'
+# Users read per query when rebuilding from the users collection
+SCAN_PAGE_SIZE = 500
+# Users a snapshot shard holds comfortably below Firestore's 1 MiB document limit
+USERS_PER_SHARD = 20000
+# Document counting the writes to every snapshot shard, so a sync only re-reads the changed ones
+SHARD_INDEX = '_index'
+
+def career_board(career_path):
+    return f"career-{career_path}"
+
+def shard_id(board, uid, shards):
+    """Snapshot document holding a user's entry on a board (stable across processes)"""
+    return f"{board}~{zlib.crc32(uid.encode('utf-8')) % shards:03d}"
+
+def board_of(shard):
+    return shard.rpartition('~')[0]
+
+def display_name(user_data):
+    """First name and last initial; never the email"""
+    first_name = (user_data.get('first_name') or '').strip()
+    last_name = (user_data.get('last_name') or '').strip()
+    return f"{first_name} {last_name[:1]}".strip() or 'Anonymous'
+
+class RankIndex:
+    """Scores of one board kept as a sorted array of (-score, uid) keys.
+    
+    rank() and the position of a page are found by bisection, so they cost
+    O(log n); an update is a bisect plus a list shift, which for the sizes a
+    board holds is a memmove rather than a Python-level loop. Users with
+    equal scores share a rank (1, 2, 2, 4).
+    """
+    def __init__(self):
+        self._keys = []
+        self._scores = {}
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def __contains__(self, uid):
+        return uid in self._scores
+    
+    def score(self, uid):
+        return self._scores.get(uid)
+    
+    def set(self, uid, score):
+        """Set a user's score; returns False if it was already that"""
+        old_score = self._scores.get(uid)
+        if old_score == score:
+            return False
+        if old_score is not None:
+            del self._keys[bisect_left(self._keys, (-old_score, uid))]
+        insort(self._keys, (-score, uid))
+        self._scores[uid] = score
+        return True
+    
+    def rank(self, uid):
+        """1-based rank, or None for users not on the board"""
+        score = self._scores.get(uid)
+        if score is None:
+            return None
+        # (-score,) sorts before every (-score, uid), so this counts the strictly higher scores
+        return bisect_left(self._keys, (-score,)) + 1
+    
+    def page(self, offset, limit):
+        """[(rank, uid, score), ...] starting at the offset-th best"""
+        entries = []
+        for key in self._keys[offset:offset + limit]:
+            entries.append((bisect_left(self._keys, (key[0],)) + 1, key[1], -key[0]))
+        return entries
+    
+    def around(self, uid, radius):
+        """Offset of the page of up to 2 * radius + 1 entries centred on a user"""
+        score = self._scores[uid]
+        position = bisect_left(self._keys, (-score, uid))
+        return max(position - radius, 0)
+
+class LeaderboardService:
+    """Global and per-career XP leaderboards kept in memory and fed as XP is awarded.
+    
+    The global board ranks users by xp_points, each career board by the XP
+    earned completing interviews of that career path (xp_by_career). Scores
+    only ever grow, so the boards of every worker converge by taking the
+    highest score seen: every sync_interval seconds the scores changed here
+    are merged into the board's snapshot, and the snapshots are read back to
+    pick up what other workers recorded. A restarted worker loads the
+    snapshots instead of scanning the users collection, which is only done
+    when there is no snapshot yet.
+    
+    A board's snapshot is split over `shards` documents by a hash of the user
+    ID (names live in the global board's shards), so no document nears
+    Firestore's 1 MiB limit up to shards * USERS_PER_SHARD users. The
+    SHARD_INDEX document counts the writes to each shard; a sync reads it and
+    then only the shards whose count moved.
+    The score and name maps are exempt from indexing (firestore.indexes.json).
+    """
+    def __init__(self, storage, write_queue=None, sync_interval=30.0, shards=16):
+        self.storage = storage
+        self.write_queue = write_queue
+        self.sync_interval = sync_interval
+        self.shards = shards
+        # shard -> write count of the version last read
+        self._shard_versions = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._boards = {GLOBAL_BOARD: RankIndex()}
+        self._names = {}
+        # board -> {uid: score} changed since the last snapshot
+        self._dirty = {}
+        self._dirty_names = {}
+        self._synced_at = time.monotonic()
+        # Scores recorded since the last sync would otherwise only reach other workers via a rescan
+        atexit.register(self.flush)
+    
+    def load(self):
+        """Fill the boards from the snapshots, or from the users collection when there are none"""
+        try:
+            loaded = self._load_snapshots()
+            if not loaded:
+                scanned = self._scan_users()
+                logging.info(f"Leaderboards rebuilt from {scanned} users")
+                self.sync()
+            else:
+                logging.info(f"Leaderboards loaded from {loaded} snapshot(s): {len(self._boards[GLOBAL_BOARD])} users")
+            users = len(self._boards[GLOBAL_BOARD])
+            if users > self.shards * USERS_PER_SHARD:
+                logging.warning(f"{users} users over {self.shards} leaderboard shards; raise LEADERBOARD_SNAPSHOT_SHARDS to {-(-users // USERS_PER_SHARD)}")
+        except Exception as e:
+            logging.error(f"Error loading leaderboards: {e}")
+        return self
+    
+    def record(self, uid, user_data):
+        """Update a user's scores from their current user document"""
+        if not uid or uid == 'guest' or user_data is None:
+            return
+        with self._lock:
+            self._set(GLOBAL_BOARD, uid, user_data.get('xp_points', 0))
+            for career_path, xp in (user_data.get('xp_by_career') or {}).items():
+                self._set(career_board(career_path), uid, xp)
+            name = display_name(user_data)
+            if self._names.get(uid) != name:
+                self._names[uid] = self._dirty_names[uid] = name
+        self.maybe_sync()
+    
+    def _set(self, board, uid, score):
+        if self._boards.setdefault(board, RankIndex()).set(uid, score):
+            self._dirty.setdefault(board, {})[uid] = score
+    
+    def top(self, career_path=None, limit=100, offset=0):
+        """One page of a board: {'board', 'total', 'entries': [{'rank', 'user_id', 'name', 'xp'}, ...]}"""
+        self.maybe_sync()
+        board = career_board(career_path) if career_path else GLOBAL_BOARD
+        with self._lock:
+            index = self._boards.get(board) or RankIndex()
+            entries = [
+                {'rank': rank, 'user_id': uid, 'name': self._names.get(uid, 'Anonymous'), 'xp': score}
+                for rank, uid, score in index.page(offset, limit)
+            ]
+            return {'board': board, 'total': len(index), 'offset': offset, 'entries': entries}
+    
+    def rank(self, uid, career_path=None, radius=0):
+        """A user's rank on a board with, when radius > 0, the entries around them; None if not ranked"""
+        self.maybe_sync()
+        board = career_board(career_path) if career_path else GLOBAL_BOARD
+        with self._lock:
+            index = self._boards.get(board)
+            if index is None or uid not in index:
+                return None
+            total = len(index)
+            rank = index.rank(uid)
+            result = {
+                'board': board,
+                'user_id': uid,
+                'rank': rank,
+                'xp': index.score(uid),
+                'total': total,
+                # Share of ranked users this user is ahead of
+                'percentile': round((total - rank) / total * 100, 1)
+            }
+            if radius > 0:
+                result['neighbors'] = [
+                    {'rank': other_rank, 'user_id': other, 'name': self._names.get(other, 'Anonymous'), 'xp': score}
+                    for other_rank, other, score in index.page(index.around(uid, radius), 2 * radius + 1)
+                ]
+            return result
+    
+    def maybe_sync(self):
+        """Snapshot and refresh in the background once sync_interval has passed"""
+        if time.monotonic() - self._synced_at < self.sync_interval:
+            return False
+        if not self._sync_lock.acquire(blocking=False):
+            return False
+        self._synced_at = time.monotonic()
+        if self.write_queue:
+            self.write_queue.submit(self._sync_locked)
+        else:
+            self._sync_locked()
+        return True
+    
+    def sync(self):
+        """Write changed scores to the snapshots and merge in other workers' scores"""
+        with self._sync_lock:
+            self._write_snapshots()
+            self._load_snapshots()
+    
+    def flush(self):
+        """Write changed scores to the snapshots (interpreter exit)"""
+        try:
+            self._write_snapshots()
+        except Exception as e:
+            logging.error(f"Error writing leaderboard snapshots: {e}")
+    
+    def _sync_locked(self):
+        # Entered with _sync_lock held by maybe_sync
+        try:
+            self._write_snapshots()
+            self._load_snapshots()
+        except Exception as e:
+            logging.error(f"Error syncing leaderboards: {e}")
+        finally:
+            self._synced_at = time.monotonic()
+            self._sync_lock.release()
+    
+    def _write_snapshots(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            dirty_names, self._dirty_names = self._dirty_names, {}
+        try:
+            snapshots = {}
+            for board, scores in dirty.items():
+                for uid, score in scores.items():
+                    snapshots.setdefault(shard_id(board, uid, self.shards), {'scores': {}})['scores'][uid] = score
+            for uid, name in dirty_names.items():
+                snapshot = snapshots.setdefault(shard_id(GLOBAL_BOARD, uid, self.shards), {'scores': {}})
+                snapshot.setdefault('names', {})[uid] = name
+            
+            updated_at = datetime.now().isoformat()
+            shards = sorted(snapshots)
+            # Each batch writes its shards and bumps their counts in the index together
+            for start in range(0, len(shards), MAX_BATCH_WRITES - 1):
+                chunk = shards[start:start + MAX_BATCH_WRITES - 1]
+                writes = [Write('set', LEADERBOARDS, shard, dict(snapshots[shard], updated_at=updated_at), merge=True) for shard in chunk]
+                writes.append(Write('set', LEADERBOARDS, SHARD_INDEX, {'shards': {shard: Increment(1) for shard in chunk}}, merge=True))
+                self.storage.apply_batch(writes)
+        except Exception:
+            # Keep the changes for the next sync; a newer score wins the merge
+            with self._lock:
+                for board, scores in dirty.items():
+                    for uid, score in scores.items():
+                        pending = self._dirty.setdefault(board, {})
+                        pending[uid] = max(pending.get(uid, score), score)
+                for uid, name in dirty_names.items():
+                    self._dirty_names.setdefault(uid, name)
+            raise
+    
+    def _load_snapshots(self):
+        """Merge the shards written since the last read into the boards, keeping the higher score.
+        
+        Returns the number of shards that exist (0 when there is no snapshot yet).
+        """
+        index = self.storage.get(LEADERBOARDS, SHARD_INDEX) or {}
+        versions = index.get('shards', {})
+        for shard, version in versions.items():
+            if self._shard_versions.get(shard) == version:
+                continue
+            snapshot = self.storage.get(LEADERBOARDS, shard)
+            self._shard_versions[shard] = version
+            if not snapshot:
+                continue
+            with self._lock:
+                board = self._boards.setdefault(board_of(shard), RankIndex())
+                for uid, score in snapshot.get('scores', {}).items():
+                    current = board.score(uid)
+                    if current is None or score > current:
+                        board.set(uid, score)
+                for uid, name in snapshot.get('names', {}).items():
+                    # A rename recorded here but not yet written wins over the snapshot
+                    if uid not in self._dirty_names:
+                        self._names[uid] = name
+        return len(versions)
+    
+    def _scan_users(self):
+        """Cold start: one pass over the users collection, a page at a time"""
+        scanned, cursor = 0, None
+        while True:
+            users = self.storage.query(
+                USERS,
+                limit=SCAN_PAGE_SIZE,
+                start_after=cursor,
+                fields=['first_name', 'last_name', 'xp_points', 'xp_by_career'],
+                id_field='_id'
+            )
+            for user_data in users:
+                # Users are keyed by uid; the document id is there even when the field is not
+                self.record(user_data['_id'], user_data)
+            scanned += len(users)
+            if len(users) < SCAN_PAGE_SIZE:
+                return scanned
+            cursor = users[-1]['_id']
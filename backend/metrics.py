@@ -0,0 +1,296 @@
+from bisect import bisect_left
+from flask import Response, g, has_request_context, request
+from functools import wraps
+from storage import StorageBackend
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+# Seconds; Prometheus' defaults plus a finer low end for cached/in-memory calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Storage calls made while serving one request
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+INF_LABEL = 'le="+Inf"'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense; not locked, the registry is"""
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+    
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        if index < len(self.bounds):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics:
+    """In-process metric registry rendered in the Prometheus text format.
+    
+    Every gunicorn worker keeps its own registry, so a scrape of /metrics
+    sees one worker; scrape each worker (or aggregate with sum() in PromQL)
+    for the whole picture.
+    """
+    def __init__(self, prefix='skillbuddy'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # name -> (type, help, label names, bounds or None, {label values: Histogram or number})
+        self._families = {}
+        self._define('request_duration_seconds', 'histogram', 'Request latency by endpoint', ('blueprint', 'endpoint', 'method', 'status'), LATENCY_BUCKETS)
+        self._define('request_storage_calls', 'histogram', 'Storage calls made while serving one request', ('endpoint',), CALL_COUNT_BUCKETS)
+        self._define('storage_calls_total', 'counter', 'Storage calls by endpoint; endpoint="background" for queued writes', ('endpoint', 'backend', 'operation', 'collection'))
+        self._define('storage_call_duration_seconds', 'histogram', 'Storage call latency', ('backend', 'operation'), LATENCY_BUCKETS)
+        self._define('service_call_duration_seconds', 'histogram', 'Service method latency', ('service', 'method'), LATENCY_BUCKETS)
+        self._define('profiles_written_total', 'counter', 'cProfile dumps written for slow requests', ('endpoint',))
+    
+    def _define(self, name, kind, help_text, label_names, bounds=None):
+        self._families[name] = (kind, help_text, label_names, bounds, {})
+    
+    def observe(self, name, labels, value):
+        """Add value to the histogram with these label values"""
+        _, _, _, bounds, series = self._families[name]
+        with self._lock:
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(bounds)
+            histogram.observe(value)
+    
+    def inc(self, name, labels, amount=1):
+        series = self._families[name][4]
+        with self._lock:
+            series[labels] = series.get(labels, 0) + amount
+    
+    def render(self):
+        """Every family in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, label_names, bounds, series) in self._families.items():
+                full_name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for labels, value in sorted(series.items()):
+                    if kind == 'counter':
+                        lines.append(f"{full_name}{_labels(label_names, labels)} {_number(value)}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.bounds, value.counts):
+                        cumulative += count
+                        le_label = f'le="{_number(bound)}"'
+                        lines.append(f"{full_name}_bucket{_labels(label_names, labels, le_label)} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_labels(label_names, labels, INF_LABEL)} {value.count}")
+                    lines.append(f"{full_name}_sum{_labels(label_names, labels)} {_number(value.sum)}")
+                    lines.append(f"{full_name}_count{_labels(label_names, labels)} {value.count}")
+        return '\n'.join(lines) + '\n'
+
+def _current_endpoint():
+    if has_request_context():
+        # Socket.IO events run in a request context of their own, without an endpoint
+        return request.endpoint or g.get('socket_event') or 'unmatched'
+    return 'background'
+
+class InstrumentedBackend(StorageBackend):
+    """Storage wrapper that times every call and counts it against the current request.
+    
+    Calls made outside a request (write-behind queue, coalescer thread) are
+    counted under endpoint="background". Wrap the outermost backend so
+    coalesced writes are still attributed to the request that made them.
+    """
+    def __init__(self, backend, metrics):
+        self.backend = backend
+        self.name = backend.name
+        self.metrics = metrics
+    
+    def __getattr__(self, attr):
+        return getattr(self.backend, attr)
+    
+    def _record(self, operation, collection, start):
+        elapsed = time.perf_counter() - start
+        endpoint = _current_endpoint()
+        self.metrics.observe('storage_call_duration_seconds', (self.name, operation), elapsed)
+        self.metrics.inc('storage_calls_total', (endpoint, self.name, operation, collection or ''))
+        if has_request_context():
+            g.storage_calls = g.get('storage_calls', 0) + 1
+    
+    def _call(self, operation, collection, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._record(operation, collection, start)
+    
+    def get(self, collection, doc_id, fields=None):
+        return self._call('get', collection, self.backend.get, collection, doc_id, fields)
+    
+    def set(self, collection, doc_id, data, merge=False):
+        return self._call('set', collection, self.backend.set, collection, doc_id, data, merge)
+    
+    def update(self, collection, doc_id, data):
+        return self._call('update', collection, self.backend.update, collection, doc_id, data)
+    
+    def add(self, collection, data):
+        return self._call('add', collection, self.backend.add, collection, data)
+    
+    def query(self, collection, filters=(), order_by=None, descending=False, limit=None, start_after=None, fields=None, id_field=None):
+        return self._call('query', collection, self.backend.query, collection, filters, order_by, descending, limit, start_after, fields, id_field)
+    
+    def ids(self, collection):
+        return self._call('ids', collection, self.backend.ids, collection)
+    
+    def append(self, collection, doc_id, subcollection, items, parent_update=None):
+        return self._call('append', collection, self.backend.append, collection, doc_id, subcollection, items, parent_update)
+    
+    def list_appended(self, collection, doc_id, subcollection):
+        return self._call('list_appended', collection, self.backend.list_appended, collection, doc_id, subcollection)
+    
+    def run_transaction(self, fn):
+        # Reads inside the transaction are counted as transaction_get, the commit as transaction
+        return self._call('transaction', '', self.backend.run_transaction, lambda transaction: fn(_InstrumentedTransaction(self, transaction)))
+    
+    def apply_batch(self, writes):
+        return self._call('batch', '', self.backend.apply_batch, writes)
+
+class _InstrumentedTransaction:
+    """Counts reads of a transaction; its writes are staged and committed with it"""
+    def __init__(self, backend, transaction):
+        self._backend = backend
+        self._transaction = transaction
+    
+    def get(self, collection, doc_id):
+        return self._backend._call('transaction_get', collection, self._transaction.get, collection, doc_id)
+    
+    def set(self, collection, doc_id, data, merge=False):
+        return self._transaction.set(collection, doc_id, data, merge)
+    
+    def update(self, collection, doc_id, data):
+        return self._transaction.update(collection, doc_id, data)
+
+    def append(self, collection, doc_id, subcollection, items, parent_update=None):
+        return self._transaction.append(collection, doc_id, subcollection, items, parent_update)
+
+def instrument_service(service, metrics, name=None):
+    """Time every public method of a service instance into service_call_duration_seconds"""
+    name = name or type(service).__name__
+    for attr in dir(type(service)):
+        if attr.startswith('_') or not callable(getattr(type(service), attr)):
+            continue
+        setattr(service, attr, _timed(getattr(service, attr), metrics, (name, attr)))
+    return service
+
+def _timed(method, metrics, labels):
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.observe('service_call_duration_seconds', labels, time.perf_counter() - start)
+    return wrapper
+
+class RequestProfiler:
+    """Profiles a sample of requests and keeps the profiles of the slow ones.
+    
+    sample_rate of the requests run under cProfile (one at a time, since the
+    profiler hooks are per interpreter on newer Pythons); those that take
+    threshold seconds or longer are dumped to directory as .prof files for
+    `python -m pstats` or snakeviz.
+    """
+    def __init__(self, directory, sample_rate=0.0, threshold=0.5):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """A running profiler if this request is sampled, else None"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except Exception as e:
+            logging.error(f"Error starting request profiler: {e}")
+            self._lock.release()
+            return None
+        return profiler
+    
+    def finish(self, profiler, endpoint, elapsed):
+        """Stop the profiler; returns the dump path if the request was slow"""
+        try:
+            profiler.disable()
+            if elapsed < self.threshold:
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            file_name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)}-{elapsed * 1000:.0f}ms.prof"
+            path = os.path.join(self.directory, file_name)
+            profiler.dump_stats(path)
+            logging.warning(f"Slow request {endpoint} took {elapsed * 1000:.0f}ms; profile written to {path}")
+            return path
+        except Exception as e:
+            logging.error(f"Error writing request profile: {e}")
+            return None
+        finally:
+            self._lock.release()
+
+def init_metrics(app, metrics, profiler=None):
+    """Record latency and storage calls of every request and serve them on /metrics"""
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.storage_calls = 0
+        g.profiler = profiler.start() if profiler else None
+    
+    @app.after_request
+    def record_request(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        metrics.observe(
+            'request_duration_seconds',
+            (request.blueprint or '', endpoint, request.method, str(response.status_code)),
+            elapsed
+        )
+        metrics.observe('request_storage_calls', (endpoint,), g.get('storage_calls', 0))
+        
+        if g.get('profiler') is not None:
+            if profiler.finish(g.pop('profiler'), endpoint, elapsed):
+                metrics.inc('profiles_written_total', (endpoint,))
+        return response
+    
+    @app.teardown_request
+    def stop_profiler(error=None):
+        # after_request is skipped when a response could not be built
+        if g.get('profiler') is not None:
+            profiler.finish(g.pop('profiler'), request.endpoint or 'unmatched', 0.0)
+    
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+    
+    return metrics
@@ -1,8 +1,92 @@
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional
+import math
+import operator
 import uuid
 
-class User:
+# Level L -> L+1 costs L * LEVEL_XP_STEP XP, so reaching level L takes
+# LEVEL_XP_STEP * L * (L - 1) / 2 XP in total (a triangular series).
+LEVEL_XP_STEP = 100
+
+def xp_for_level(level: int) -> int:
+    """Total XP required to reach a level"""
+    return LEVEL_XP_STEP * level * (level - 1) // 2
+
+def level_for_xp(xp_points) -> int:
+    """Level reached with the given total XP, in O(1)"""
+    xp_points = max(int(xp_points or 0), 0)
+    # Largest L with L * (L - 1) <= 2 * xp / LEVEL_XP_STEP
+    k = (2 * xp_points) // LEVEL_XP_STEP
+    return (1 + math.isqrt(1 + 4 * k)) // 2
+
+def level_progress(xp_points) -> Dict:
+    """Level and progress within the level for the given total XP"""
+    level = level_for_xp(xp_points)
+    xp_needed = level * LEVEL_XP_STEP
+    current_level_xp = max(int(xp_points or 0), 0) - xp_for_level(level)
+    
+    return {
+        'level': level,
+        'current_level_xp': current_level_xp,
+        'xp_to_next_level': xp_needed - current_level_xp,
+        'next_level_requirement': xp_needed,
+        'progress_percentage': (current_level_xp / xp_needed) * 100
+    }
+
+def levels_for_xp(xp_values: Iterable) -> List[int]:
+    """Levels for many XP totals at once (leaderboards, backfills)"""
+    isqrt = math.isqrt
+    step = LEVEL_XP_STEP
+    return [(1 + isqrt(1 + 4 * ((2 * max(int(xp or 0), 0)) // step))) // 2 for xp in xp_values]
+
+class Model:
+    """Slotted model serialized through precomputed field lists.
+    
+    Subclasses list their serialized FIELDS (in document order), the
+    constructor arguments from_dict passes positionally (REQUIRED) and the
+    datetime fields, which are stored as ISO-8601 strings.
+    """
+    __slots__ = ()
+    FIELDS = ()
+    REQUIRED = ()
+    TIMESTAMP_FIELDS = ()
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._get_fields = operator.attrgetter(*cls.FIELDS)
+        cls._optional_fields = tuple(field for field in cls.FIELDS if field not in cls.REQUIRED)
+    
+    def to_dict(self):
+        data = dict(zip(self.FIELDS, self._get_fields(self)))
+        for field in self.TIMESTAMP_FIELDS:
+            value = data[field]
+            if isinstance(value, datetime):
+                data[field] = value.isoformat()
+        return data
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a model from a stored document; missing fields keep their defaults"""
+        obj = cls(*(data.get(field) for field in cls.REQUIRED))
+        for field in cls._optional_fields:
+            if field in data:
+                setattr(obj, field, data[field])
+        for field in cls.TIMESTAMP_FIELDS:
+            value = getattr(obj, field)
+            if isinstance(value, str):
+                setattr(obj, field, datetime.fromisoformat(value))
+        return obj
+
+class User(Model):
+    __slots__ = FIELDS = (
+        'uid', 'email', 'first_name', 'last_name', 'created_at', 'updated_at', 'xp_points', 'level',
+        'github_profile', 'linkedin_profile', 'resume_uploaded', 'resume_file_name', 'resume_url',
+        'total_interviews', 'completed_interviews', 'career_paths_practiced', 'xp_by_career', 'interview_sessions',
+        'achievements', 'preferences', 'temporary_xp'
+    )
+    REQUIRED = ('uid', 'email')
+    TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+    
     def __init__(self, uid: str, email: str, first_name: str = "", last_name: str = "", created_at: datetime = None):
         self.uid = uid
         self.email = email
@@ -20,6 +104,7 @@ class User:
         self.total_interviews = 0
         self.completed_interviews = 0
         self.career_paths_practiced = {}
+        self.xp_by_career = {}  # XP from completed interviews, per career path
         self.interview_sessions = []
         self.achievements = []
         self.preferences = {}
@@ -27,17 +112,8 @@ class User:
     
     def calculate_level(self):
         """Calculate level based on XP points"""
-        level = 1
-        xp_needed = 100
-        total_xp_for_level = 0
-        
-        while self.xp_points >= total_xp_for_level + xp_needed:
-            total_xp_for_level += xp_needed
-            level += 1
-            xp_needed = level * 100
-        
-        self.level = level
-        return level
+        self.level = level_for_xp(self.xp_points)
+        return self.level
     
     def add_xp(self, amount: int, source: str = "Unknown"):
         """Add XP points and recalculate level"""
@@ -50,7 +126,7 @@ class User:
             self.achievements.append({
                 'type': 'level_up',
                 'level': new_level,
-                'timestamp': datetime.now(),
+                'timestamp': datetime.now().isoformat(),
                 'description': f'Reached level {new_level}!'
             })
         
@@ -64,50 +140,18 @@ class User:
     
     def get_xp_progress(self):
         """Get XP progress for current level"""
-        level = 1
-        xp_needed = 100
-        total_xp_for_level = 0
-        
-        while self.xp_points >= total_xp_for_level + xp_needed:
-            total_xp_for_level += xp_needed
-            level += 1
-            xp_needed = level * 100
-        
-        current_level_xp = self.xp_points - total_xp_for_level
-        xp_to_next_level = xp_needed - current_level_xp
-        
-        return {
-            'current_level_xp': current_level_xp,
-            'xp_to_next_level': xp_to_next_level,
-            'next_level_requirement': xp_needed,
-            'progress_percentage': (current_level_xp / xp_needed) * 100 if xp_needed > 0 else 100
-        }
+        progress = level_progress(self.xp_points)
+        del progress['level']
+        return progress
     
-    def to_dict(self):
-        return {
-            'uid': self.uid,
-            'email': self.email,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at,
-            'xp_points': self.xp_points,
-            'level': self.level,
-            'github_profile': self.github_profile,
-            'linkedin_profile': self.linkedin_profile,
-            'resume_uploaded': self.resume_uploaded,
-            'resume_file_name': self.resume_file_name,
-            'resume_url': self.resume_url,
-            'total_interviews': self.total_interviews,
-            'completed_interviews': self.completed_interviews,
-            'career_paths_practiced': self.career_paths_practiced,
-            'interview_sessions': self.interview_sessions,
-            'achievements': self.achievements,
-            'preferences': self.preferences,
-            'temporary_xp': self.temporary_xp
-        }
+class SimpleInterviewSession(Model):
+    __slots__ = FIELDS = (
+        'session_id', 'user_id', 'career_path', 'started_at', 'completed_at', 'status',
+        'questions_answered', 'total_questions', 'responses', 'xp_earned', 'completion_percentage'
+    )
+    REQUIRED = ('user_id', 'career_path', 'session_id')
+    TIMESTAMP_FIELDS = ('started_at', 'completed_at')
 
-class SimpleInterviewSession:
     def __init__(self, user_id: str, career_path: str, session_id: str = None):
         self.session_id = session_id or str(uuid.uuid4())
         self.user_id = user_id
@@ -129,7 +173,7 @@ class SimpleInterviewSession:
             'response': response_text,
             'category': category,
             'difficulty': difficulty,
-            'timestamp': datetime.now()
+            'timestamp': datetime.now().isoformat()
         }
         self.responses.append(response)
         self.questions_answered = len(self.responses)
@@ -148,37 +192,17 @@ class SimpleInterviewSession:
         self.xp_earned = base_xp + completion_bonus + response_quality_bonus
         return self.xp_earned
     
-    def to_dict(self):
-        return {
-            'session_id': self.session_id,
-            'user_id': self.user_id,
-            'career_path': self.career_path,
-            'started_at': self.started_at,
-            'completed_at': self.completed_at,
-            'status': self.status,
-            'questions_answered': self.questions_answered,
-            'total_questions': self.total_questions,
-            'responses': self.responses,
-            'xp_earned': self.xp_earned,
-            'completion_percentage': self.completion_percentage
-        }
+class Feedback(Model):
+    __slots__ = FIELDS = ('user_id', 'session_id', 'rating', 'comments', 'submitted_at')
+    REQUIRED = ('user_id', 'session_id', 'rating', 'comments')
+    TIMESTAMP_FIELDS = ('submitted_at',)
 
-class Feedback:
     def __init__(self, user_id: str, session_id: str, rating: int, comments: str = None):
         self.user_id = user_id
         self.session_id = session_id
         self.rating = rating
         self.comments = comments
         self.submitted_at = datetime.now()
-    
-    def to_dict(self):
-        return {
-            'user_id': self.user_id,
-            'session_id': self.session_id,
-            'rating': self.rating,
-            'comments': self.comments,
-            'submitted_at': self.submitted_at
-        }
 
 # Enhanced Interview Questions Database
 INTERVIEW_QUESTIONS_DB = {
@@ -0,0 +1,288 @@
+from models import INTERVIEW_QUESTIONS_DB
+from itertools import accumulate
+from math import gcd
+import copy
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+QUESTION_BANK_COLLECTION = 'question_bank'
+# Distinct per-seed orderings of a bucket (see QuestionBank.nth)
+MAX_STRIDES = 32
+
+def _normalize(career_path, question):
+    """Fill in the fields the indexes rely on"""
+    question = dict(question)
+    question.setdefault('category', 'General')
+    question.setdefault('difficulty', 'intermediate')
+    question.pop('career_path', None)
+    return question
+
+class BuiltinQuestionSource:
+    """The questions bundled in models.INTERVIEW_QUESTIONS_DB"""
+    name = 'builtin'
+    
+    def version(self):
+        return 'builtin'
+    
+    def load(self):
+        return copy.deepcopy(INTERVIEW_QUESTIONS_DB)
+
+class FileQuestionSource:
+    """A JSON file: either {career_path: [question, ...]} or a list of questions with a career_path field.
+    
+    The file's mtime and size are the version, so edits are picked up on the next reload check.
+    """
+    name = 'file'
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def version(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def load(self):
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return data
+        questions_db = {}
+        for question in data:
+            questions_db.setdefault(question['career_path'], []).append(question)
+        return questions_db
+
+class FirestoreQuestionSource:
+    """Documents of a Firestore collection, each a question with a career_path field.
+    
+    A snapshot listener bumps the version whenever the collection changes.
+    """
+    name = 'firestore'
+    
+    def __init__(self, db, collection=QUESTION_BANK_COLLECTION):
+        self.db = db
+        self.collection = collection
+        self._changes = 0
+        self._watch = db.collection(collection).on_snapshot(self._on_snapshot)
+    
+    def _on_snapshot(self, snapshots, changes, read_time):
+        self._changes += 1
+    
+    def version(self):
+        return self._changes
+    
+    def load(self):
+        questions_db = {}
+        for doc in self.db.collection(self.collection).stream():
+            question = doc.to_dict()
+            questions_db.setdefault(question['career_path'], []).append(question)
+        return questions_db
+
+class _Bucket:
+    """Questions sharing a filter key, with cumulative weights for sampling"""
+    __slots__ = ('questions', 'cum_weights', 'available', 'strides')
+    
+    def __init__(self):
+        self.questions = []
+        self.cum_weights = []
+        self.available = 0
+        self.strides = [1]
+    
+    def add(self, question):
+        weight = float(question.get('weight', 1))
+        total = self.cum_weights[-1] if self.cum_weights else 0.0
+        self.questions.append(question)
+        self.cum_weights.append(total + weight)
+        if weight > 0:
+            self.available += 1
+    
+    def finish(self):
+        # Steps coprime to the size, so (offset + stride * n) % size visits every question once
+        size = len(self.questions)
+        coprime = [step for step in range(1, max(size, 2)) if gcd(step, size) == 1]
+        self.strides = coprime[::max(len(coprime) // MAX_STRIDES, 1)][:MAX_STRIDES]
+
+class _Index:
+    """Immutable lookup tables built from one load of the source"""
+    def __init__(self, questions_db):
+        self.questions_db = {}
+        self.by_id = {}
+        self.buckets = {}
+        for career_path, questions in questions_db.items():
+            normalized = [_normalize(career_path, question) for question in questions]
+            self.questions_db[career_path] = normalized
+            for question in normalized:
+                self.by_id[(career_path, question['id'])] = question
+                # One bucket per combination of filters, so no query scans
+                for key in (
+                    (career_path, None, None),
+                    (career_path, question['category'], None),
+                    (career_path, None, question['difficulty']),
+                    (career_path, question['category'], question['difficulty'])
+                ):
+                    self.buckets.setdefault(key, _Bucket()).add(question)
+        for bucket in self.buckets.values():
+            bucket.finish()
+        self.categories = {
+            career_path: sorted({question['category'] for question in questions})
+            for career_path, questions in self.questions_db.items()
+        }
+        self.combinations = {
+            career_path: sorted({(question['category'], question['difficulty']) for question in questions})
+            for career_path, questions in self.questions_db.items()
+        }
+
+class QuestionBank:
+    """Indexed questions from a pluggable source, reloaded when the source changes.
+    
+    Lookups by (career_path, id) and by career/category/difficulty are dict
+    hits. The source version is checked at most every reload_interval seconds;
+    a reload builds a fresh index and swaps it in, then notifies listeners.
+    """
+    def __init__(self, source=None, reload_interval=5.0):
+        self.source = source or BuiltinQuestionSource()
+        self.reload_interval = reload_interval
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._version = self.source.version()
+        self._index = _Index(self.source.load())
+        self._checked_at = time.monotonic()
+        logging.info(f"Question bank loaded from {self.source.name}: {len(self._index.by_id)} questions")
+    
+    def add_listener(self, fn):
+        """Call fn(questions_db) after every reload"""
+        self._listeners.append(fn)
+    
+    def maybe_reload(self):
+        """Reload if the source changed; cheap enough to call on every request"""
+        if time.monotonic() - self._checked_at < self.reload_interval:
+            return False
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._checked_at = time.monotonic()
+            version = self.source.version()
+            if version == self._version:
+                return False
+            index = _Index(self.source.load())
+            self._index, self._version = index, version
+            logging.info(f"Question bank reloaded from {self.source.name}: {len(index.by_id)} questions")
+        except Exception as e:
+            logging.error(f"Error reloading question bank: {e}")
+            return False
+        finally:
+            self._reload_lock.release()
+        
+        for fn in self._listeners:
+            fn(index.questions_db)
+        return True
+    
+    def as_dict(self):
+        """{career_path: [question, ...]} of the current index"""
+        return self._index.questions_db
+    
+    def career_paths(self):
+        return list(self._index.questions_db)
+    
+    def categories(self, career_path):
+        return self._index.categories.get(career_path, [])
+    
+    def combinations(self, career_path):
+        """(category, difficulty) pairs that have at least one question"""
+        return self._index.combinations.get(career_path, [])
+    
+    def available(self, career_path, category=None, difficulty=None):
+        """Number of questions with a positive weight under a filter"""
+        bucket = self._index.buckets.get((career_path, category, difficulty))
+        return bucket.available if bucket else 0
+    
+    def size(self, career_path, category=None, difficulty=None):
+        """Number of questions under a filter, including those weighted 0"""
+        bucket = self._index.buckets.get((career_path, category, difficulty))
+        return len(bucket.questions) if bucket else 0
+    
+    def nth(self, career_path, category, difficulty, seed, n):
+        """The n-th question of a bucket in a fixed order chosen by seed, in O(1).
+        
+        For one seed, n = 0 .. size - 1 visits every question of the bucket
+        once (an affine permutation of its list); different seeds give
+        different orders. None for an empty bucket.
+        """
+        bucket = self._index.buckets.get((career_path, category, difficulty))
+        if not bucket or not bucket.questions:
+            return None
+        size = len(bucket.questions)
+        stride = bucket.strides[seed % len(bucket.strides)]
+        return bucket.questions[(seed // len(bucket.strides) + stride * n) % size]
+    
+    def get(self, career_path, question_id):
+        """One question by id, or None"""
+        self.maybe_reload()
+        return self._index.by_id.get((career_path, question_id))
+    
+    def questions(self, career_path, category=None, difficulty=None):
+        """Questions of a career path, optionally filtered; an index hit, not a scan"""
+        self.maybe_reload()
+        bucket = self._index.buckets.get((career_path, category, difficulty))
+        return list(bucket.questions) if bucket else []
+    
+    def sample(self, career_path, k, category=None, difficulty=None, weight_fn=None, exclude=(), rng=None):
+        """Up to k distinct questions drawn with probability proportional to weight.
+        
+        Weights come from each question's 'weight' field (default 1), or from
+        weight_fn(question) when given. Question ids in exclude are skipped.
+        """
+        self.maybe_reload()
+        rng = rng or random
+        bucket = self._index.buckets.get((career_path, category, difficulty))
+        if not bucket or k <= 0:
+            return []
+        
+        questions, cum_weights, available = bucket.questions, bucket.cum_weights, bucket.available
+        if weight_fn is not None or exclude:
+            # Custom weights cost one pass over the bucket; the stored ones are free
+            exclude = set(exclude)
+            weights = [
+                0.0 if question['id'] in exclude else float(weight_fn(question) if weight_fn else question.get('weight', 1))
+                for question in questions
+            ]
+            cum_weights = list(accumulate(weights))
+            available = sum(1 for weight in weights if weight > 0)
+        k = min(k, available)
+        if k == 0:
+            return []
+        
+        if k * 4 <= available:
+            # Few picks from many: bisect over cumulative weights, skipping repeats
+            chosen = {}
+            for _ in range(8):
+                for question in rng.choices(questions, cum_weights=cum_weights, k=k - len(chosen)):
+                    chosen.setdefault(question['id'], question)
+                if len(chosen) >= k:
+                    return list(chosen.values())[:k]
+        
+        # Large share of the bucket (or heavily skewed weights): weighted
+        # sampling without replacement by random keys
+        weights = [total - (cum_weights[i - 1] if i else 0.0) for i, total in enumerate(cum_weights)]
+        keyed = (
+            (rng.random() ** (1.0 / weight), i)
+            for i, weight in enumerate(weights) if weight > 0
+        )
+        return [questions[i] for _, i in heapq.nlargest(k, keyed)]
+
+def create_question_source(config, db=None):
+    """QUESTION_SOURCE is 'builtin', 'file' (QUESTION_BANK_FILE) or 'firestore'"""
+    source = config.get('QUESTION_SOURCE') or 'builtin'
+    if source == 'builtin':
+        return BuiltinQuestionSource()
+    if source == 'file':
+        return FileQuestionSource(config['QUESTION_BANK_FILE'])
+    if source == 'firestore':
+        if not db:
+            raise ValueError("QUESTION_SOURCE=firestore requires Firebase to be initialized")
+        return FirestoreQuestionSource(db, config.get('QUESTION_BANK_COLLECTION') or QUESTION_BANK_COLLECTION)
+    raise ValueError(f"Unknown question source: {source}")
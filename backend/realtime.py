@@ -0,0 +1,239 @@
+from flask import g, request
+from flask_socketio import ConnectionRefusedError, Namespace, emit
+from functools import wraps
+from firebase_config import verify_user_token
+import logging
+import threading
+import time
+
+def socket_event(handler):
+    """Run an event handler with the connection's lock held, timed into the metrics like a request.
+    
+    The handler gets the connection state; failures are logged and sent to the
+    client as an 'error' event (and as the acknowledgement).
+    """
+    event = handler.__name__[len('on_'):]
+    
+    @wraps(handler)
+    def wrapper(self, data=None):
+        connection = self._connections.get(request.sid)
+        if connection is None:
+            return {'error': 'Not connected'}
+        
+        g.socket_event = f"{self.namespace.strip('/')}.{event}"
+        g.storage_calls = 0
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            with connection.lock:
+                result = handler(self, connection, data or {})
+            if isinstance(result, dict) and 'error' in result:
+                status = 'rejected'
+                emit('error', dict(result, event=event))
+            return result
+        except Exception as e:
+            status = 'error'
+            logging.error(f"Socket {event} error: {e}")
+            emit('error', {'event': event, 'error': f"Failed to handle {event}"})
+            return {'error': f"Failed to handle {event}"}
+        finally:
+            if self.metrics:
+                self.metrics.observe('request_duration_seconds', ('socketio', g.socket_event, 'EVENT', status), time.perf_counter() - start)
+                self.metrics.observe('request_storage_calls', (g.socket_event,), g.storage_calls)
+    return wrapper
+
+class LiveConnection:
+    """What one socket keeps between events: its user and the session in progress"""
+    __slots__ = ('firebase_user', 'session_data', 'asked_ids', 'coverage', 'lock')
+    
+    def __init__(self, firebase_user=None):
+        self.firebase_user = firebase_user
+        self.session_data = None
+        self.asked_ids = []
+        self.coverage = None
+        self.lock = threading.Lock()
+
+class InterviewNamespace(Namespace):
+    """Live interview sessions over Socket.IO ('/interview').
+    
+    Client events: start {user_id, career_path}, resume {session_id},
+    response {question_id, response, question_text?, category?, difficulty?}
+    and end. The server pushes session_started, question, progress,
+    session_completed, xp, level_up, rank and error events; every client
+    event is also acknowledged with its result.
+    
+    The session header, the ids of the questions asked and the user's
+    coverage counters stay on the connection, so a response costs one append
+    (the same write POST /response makes) and no session read. Under
+    several gunicorn workers clients must connect with the websocket
+    transport only, since long-polling needs sticky sessions.
+    """
+    def __init__(self, namespace, interview_service, user_service, question_bank, question_selector,
+                 leaderboard=None, metrics=None, auth_required=False):
+        super().__init__(namespace)
+        self.interview_service = interview_service
+        self.user_service = user_service
+        self.question_bank = question_bank
+        self.question_selector = question_selector
+        self.leaderboard = leaderboard
+        self.metrics = metrics
+        self.auth_required = auth_required
+        self._connections = {}
+    
+    def on_connect(self, auth=None):
+        # Same rules as token_required: the token comes in the auth payload or the Authorization header
+        auth_header = request.headers.get('Authorization', '')
+        id_token = (auth or {}).get('token') or (auth_header[len('Bearer '):].strip() if auth_header.startswith('Bearer ') else None)
+        
+        # Unverifiable tokens connect as anonymous unless auth is enforced
+        firebase_user = verify_user_token(id_token) if id_token else None
+        if not firebase_user and self.auth_required:
+            if id_token:
+                raise ConnectionRefusedError('Invalid or expired token')
+            raise ConnectionRefusedError('Authorization token is required')
+        
+        self._connections[request.sid] = LiveConnection(firebase_user)
+    
+    def on_disconnect(self, reason=None):
+        # An unfinished session stays in storage and can be resumed from another connection
+        self._connections.pop(request.sid, None)
+    
+    @socket_event
+    def on_start(self, connection, data):
+        user_id = data.get('user_id', 'guest')  # Allow guest users
+        career_path = data.get('career_path')
+        
+        if not career_path:
+            return {'error': 'Career path is required'}
+        self.question_bank.maybe_reload()
+        if career_path not in self.question_bank.career_paths():
+            return {'error': 'Invalid career path'}
+        
+        session = self.interview_service.create_session(user_id, career_path)
+        connection.session_data = session.to_dict()
+        connection.asked_ids = []
+        connection.coverage = self.question_selector.coverage(user_id, career_path)
+        
+        started = {
+            'session_id': session.session_id,
+            'career_path': career_path,
+            'total_questions': session.total_questions,
+            'resumed': False
+        }
+        emit('session_started', started)
+        self._push_next_question(connection)
+        return started
+    
+    @socket_event
+    def on_resume(self, connection, data):
+        session_id = data.get('session_id')
+        if not session_id:
+            return {'error': 'Session ID is required'}
+        
+        session_data = self.interview_service.get_session(session_id)
+        if not session_data:
+            return {'error': 'Session not found'}
+        if session_data.get('status') == 'completed':
+            return {'error': 'Session already completed'}
+        
+        responses = session_data.pop('responses', [])
+        session_data.setdefault('session_id', session_id)
+        connection.session_data = session_data
+        connection.asked_ids = [response.get('question_id') for response in responses]
+        connection.coverage = self.question_selector.coverage(session_data['user_id'], session_data['career_path'])
+        
+        started = {
+            'session_id': session_id,
+            'career_path': session_data['career_path'],
+            'total_questions': session_data.get('total_questions', 0),
+            'questions_answered': session_data.get('questions_answered', 0),
+            'completion_percentage': session_data.get('completion_percentage', 0),
+            'resumed': True
+        }
+        emit('session_started', started)
+        self._push_next_question(connection)
+        return started
+    
+    @socket_event
+    def on_response(self, connection, data):
+        session_data = connection.session_data
+        question_id = data.get('question_id')
+        response = data.get('response')
+        
+        if session_data is None:
+            return {'error': 'No interview in progress; send start or resume first'}
+        if question_id is None or not response:
+            return {'error': 'Question ID and response are required'}
+        # Another client (REST /end, a second socket) may have completed the session since it was loaded
+        if self.interview_service.session_status(session_data['session_id']) == 'completed':
+            connection.session_data = None
+            return {'error': 'Session already completed'}
+        
+        record = self.interview_service.append_response(
+            session_data,
+            question_id,
+            data.get('question_text', ''),
+            response,
+            data.get('category'),
+            data.get('difficulty')
+        )
+        connection.asked_ids.append(question_id)
+        self.question_selector.cover(connection.coverage, {
+            'id': question_id,
+            'category': record['category'],
+            'difficulty': record['difficulty']
+        })
+        
+        progress = {
+            'session_id': session_data['session_id'],
+            'question_id': question_id,
+            'questions_answered': session_data.get('questions_answered', 0),
+            'completion_percentage': session_data.get('completion_percentage', 0)
+        }
+        emit('progress', progress)
+        self._push_next_question(connection)
+        return progress
+    
+    @socket_event
+    def on_end(self, connection, data):
+        if connection.session_data is None:
+            return {'error': 'No interview in progress; send start or resume first'}
+        
+        session_id = connection.session_data['session_id']
+        completed_session, xp_result = self.interview_service.complete_session_with_xp(session_id, self.user_service)
+        if not completed_session:
+            return {'error': 'Session not found'}
+        connection.session_data = None
+        
+        completed = {
+            'session_id': session_id,
+            'xp_earned': completed_session.get('xp_earned', 0),
+            'questions_answered': completed_session.get('questions_answered', 0),
+            'completion_percentage': completed_session.get('completion_percentage', 0)
+        }
+        emit('session_completed', completed)
+        
+        user_id = completed_session.get('user_id')
+        if xp_result:
+            emit('xp', xp_result)
+            if xp_result['level_up']:
+                emit('level_up', {'user_id': user_id, 'level': xp_result['current_level'], 'total_xp': xp_result['total_xp']})
+        if self.leaderboard and user_id and user_id != 'guest':
+            rank = self.leaderboard.rank(user_id)
+            if rank:
+                emit('rank', rank)
+        return completed
+    
+    def _push_next_question(self, connection):
+        session_data = connection.session_data
+        question = self.question_selector.next_question(
+            session_data['user_id'],
+            session_data['career_path'],
+            connection.asked_ids,
+            connection.coverage
+        )
+        emit('question', {
+            'session_id': session_data['session_id'],
+            'question': question,
+            'exhausted': question is None
+        })
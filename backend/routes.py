@@ -1,32 +1,146 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, g, request, jsonify
 from werkzeug.utils import secure_filename
+from functools import wraps
+from datetime import datetime
 import base64
 import os
 from services import UserService, InterviewService, FeedbackService
-from firebase_config import initialize_firebase, upload_file_to_storage
+from aggregates import AggregateService
+from storage import create_storage_backend
+from writebehind import WriteBehindQueue
+from coalescer import CoalescingBackend
+from catalogue import QuestionCatalogue
+from questionbank import QuestionBank, create_question_source
+from selection import QuestionSelector
+from leaderboard import LeaderboardService
+from realtime import InterviewNamespace
+from fieldmask import apply_mask, parse_fields, subtree, wants
+from metrics import InstrumentedBackend, instrument_service
+from serialization import MSGPACK_MIMETYPE, wants_msgpack
+from firebase_config import (
+    FileTooLargeError,
+    initialize_firebase,
+    start_token_verification,
+    upload_file_to_storage,
+    verify_user_token
+)
 import logging
 
-# Create blueprints
-auth_bp = Blueprint('auth', __name__)
-interview_bp = Blueprint('interview', __name__)
-user_bp = Blueprint('user', __name__)
-feedback_bp = Blueprint('feedback', __name__)
-profile_bp = Blueprint('profile', __name__)
+def token_required(view):
+    """Verify the Firebase ID token from the Authorization header before the view runs.
+    
+    Verified claims are cached per token, so repeat calls skip signature checks.
+    The claims are available as g.firebase_user. Requests without a valid token
+    are only rejected when AUTH_REQUIRED is set: until then the app's own session
+    tokens (not Firebase ID tokens) are sent as Bearer tokens too, and those
+    requests are served as anonymous, so existing clients keep working.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        auth_header = request.headers.get('Authorization', '')
+        id_token = auth_header[len('Bearer '):].strip() if auth_header.startswith('Bearer ') else None
+        
+        g.firebase_user = verify_user_token(id_token) if id_token else None
+        if not g.firebase_user and current_app.config.get('AUTH_REQUIRED'):
+            if id_token:
+                return jsonify({'error': 'Invalid or expired token'}), 401
+            return jsonify({'error': 'Authorization token is required'}), 401
+        
+        return view(*args, **kwargs)
+    return wrapper
 
-def create_routes():
+def create_routes(config=None, storage=None, metrics=None, socketio=None):
+    config = config or {}
+    
+    # Create blueprints per app so the factory can be called more than once
+    auth_bp = Blueprint('auth', __name__)
+    interview_bp = Blueprint('interview', __name__)
+    user_bp = Blueprint('user', __name__)
+    feedback_bp = Blueprint('feedback', __name__)
+    profile_bp = Blueprint('profile', __name__)
+    
     # Initialize Firebase with error handling
     db, storage_bucket = initialize_firebase()
     
     # If Firebase fails, create a warning but continue
     if not db:
         logging.warning("Firebase initialization failed. Running in limited mode.")
-        # You could implement a fallback storage mechanism here
-        # For now, we'll return empty blueprints or implement local storage
+    else:
+        # Prefetch ID token signing certificates for token_required
+        start_token_verification()
+    
+    # Firestore when available, otherwise the embedded SQLite store
+    storage = storage or create_storage_backend(config, db)
+    logging.info(f"Using {storage.name} storage backend")
+    
+    # Share batch commits between concurrent requests' writes
+    if config.get('WRITE_COALESCING_ENABLED', True):
+        storage = CoalescingBackend(
+            storage,
+            window=config.get('WRITE_BATCH_WINDOW_MS', 2) / 1000,
+            max_batch=config.get('WRITE_BATCH_MAX', 500)
+        )
+    coalescer = storage.coalescer if isinstance(storage, CoalescingBackend) else None
+    
+    # Count and time storage calls per request for /metrics
+    if metrics:
+        storage = InstrumentedBackend(storage, metrics)
     
-    # Initialize services (they should handle None db gracefully)
-    user_service = UserService(db, storage_bucket)
-    interview_service = InterviewService(db)
-    feedback_service = FeedbackService(db)
+    # Initialize services
+    # Stats and bonus XP are written after the response by a background queue
+    write_queue = None
+    if config.get('WRITE_BEHIND_ENABLED', True):
+        write_queue = WriteBehindQueue(
+            max_size=config.get('WRITE_QUEUE_SIZE', 1000),
+            batch_size=config.get('WRITE_QUEUE_BATCH_SIZE', 50),
+            max_retries=config.get('WRITE_QUEUE_RETRIES', 3)
+        )
+    
+    aggregate_service = AggregateService(storage, write_queue)
+    # Ranks are served from memory; snapshots make a restart a few document reads
+    leaderboard_service = LeaderboardService(
+        storage,
+        write_queue,
+        sync_interval=config.get('LEADERBOARD_SYNC_INTERVAL', 30),
+        shards=config.get('LEADERBOARD_SNAPSHOT_SHARDS', 16)
+    ).load()
+    user_service = UserService(
+        storage,
+        storage_bucket,
+        cache_size=config.get('USER_CACHE_SIZE'),
+        cache_ttl=config.get('USER_CACHE_TTL'),
+        aggregates=aggregate_service,
+        write_queue=write_queue,
+        leaderboard=leaderboard_service
+    )
+    question_bank = QuestionBank(
+        create_question_source(config, db),
+        reload_interval=config.get('QUESTION_RELOAD_INTERVAL', 5)
+    )
+    interview_service = InterviewService(storage, aggregate_service, question_bank)
+    
+    # Re-serialize the catalogue whenever the question bank reloads
+    catalogue = QuestionCatalogue(question_bank.as_dict(), max_age=config.get('QUESTIONS_MAX_AGE', 3600))
+    question_bank.add_listener(catalogue.load)
+    question_selector = QuestionSelector(question_bank, aggregate_service)
+    feedback_service = FeedbackService(storage, aggregate_service)
+    
+    if metrics:
+        for service in (user_service, interview_service, feedback_service, aggregate_service, question_selector, leaderboard_service):
+            instrument_service(service, metrics)
+    
+    # Live interview sessions share the services with the HTTP routes
+    if socketio:
+        socketio.on_namespace(InterviewNamespace(
+            '/interview',
+            interview_service,
+            user_service,
+            question_bank,
+            question_selector,
+            leaderboard=leaderboard_service,
+            metrics=metrics,
+            auth_required=config.get('AUTH_REQUIRED', False)
+        ))
     
     # Authentication Routes
     @auth_bp.route('/register', methods=['POST'])
@@ -80,13 +194,14 @@ def create_routes():
             user_data = user_service.get_user(user_id)
             
             if user_data:
-                return jsonify({
+                # ?fields=user_id,user_data.xp_points,... trims the response to what the client renders
+                return jsonify(apply_mask({
                     'message': 'Login successful',
                     'user_id': user_id,
                     'email': user_data.get('email'),
                     'uid': user_id,
                     'user_data': user_data
-                }), 200
+                }, parse_fields(request.args.get('fields')))), 200
             else:
                 return jsonify({'error': 'User not found. Please register first.'}), 404
                 
@@ -100,6 +215,7 @@ def create_routes():
 
     # Profile Management Routes
     @profile_bp.route('/update-profile', methods=['POST'])
+    @token_required
     def update_profile():
         try:
             data = request.get_json()
@@ -126,7 +242,7 @@ def create_routes():
                     try:
                         file_data = base64.b64decode(resume_data)
                         # Upload to Firebase Storage
-                        resume_url = upload_file_to_storage(file_data, resume_filename, user_id)
+                        resume_url = upload_file_to_storage(file_data, resume_filename, user_id, storage_bucket)
                         
                         if resume_url:
                             profile_data['resume_uploaded'] = True
@@ -161,7 +277,56 @@ def create_routes():
             logging.error(f"Update profile error: {e}")
             return jsonify({'error': 'Failed to update profile'}), 500
 
+    @profile_bp.route('/upload-resume', methods=['POST'])
+    @token_required
+    def upload_resume():
+        # Accepts multipart/form-data with a 'resume' file field, or the raw file
+        # as the request body with user_id and filename in the query string
+        try:
+            max_bytes = config.get('MAX_RESUME_BYTES')
+            
+            if request.mimetype == 'multipart/form-data':
+                user_id = request.form.get('user_id') or request.args.get('user_id')
+                resume_file = request.files.get('resume')
+                if not resume_file:
+                    return jsonify({'error': 'Resume file is required'}), 400
+                stream = resume_file.stream
+                resume_filename = resume_file.filename or 'resume.pdf'
+                content_type = resume_file.mimetype
+            else:
+                user_id = request.args.get('user_id')
+                if max_bytes and request.content_length and request.content_length > max_bytes:
+                    return jsonify({'error': f'Resume must be at most {max_bytes} bytes'}), 413
+                stream = request.stream
+                resume_filename = request.args.get('filename', 'resume.pdf')
+                content_type = request.mimetype
+            
+            if not user_id:
+                return jsonify({'error': 'User ID is required'}), 400
+            # The user ID names the storage directory: only existing users, only plain names
+            if secure_filename(user_id) != user_id or not user_service.get_user(user_id):
+                return jsonify({'error': 'User not found'}), 404
+            
+            resume_filename = secure_filename(resume_filename) or 'resume.pdf'
+            
+            try:
+                profile_data = user_service.store_resume(user_id, stream, resume_filename, content_type, max_bytes)
+            except FileTooLargeError:
+                return jsonify({'error': f'Resume must be at most {max_bytes} bytes'}), 413
+            
+            result = user_service.update_profile_data(user_id, profile_data)
+            
+            return jsonify({
+                'message': 'Resume uploaded successfully',
+                'updated_data': result
+            }), 200
+        
+        except Exception as e:
+            logging.error(f"Upload resume error: {e}")
+            return jsonify({'error': 'Failed to upload resume'}), 500
+
     @profile_bp.route('/add-xp', methods=['POST'])
+    @token_required
     def add_xp():
         try:
             data = request.get_json()
@@ -191,24 +356,55 @@ def create_routes():
 
     # Interview Routes
     @interview_bp.route('/questions/<career_path>', methods=['GET'])
+    @token_required
     def get_questions(career_path):
         try:
-            questions = interview_service.get_questions_by_career(career_path)
+            category = request.args.get('category')
+            difficulty = request.args.get('difficulty')
+            sample_size = request.args.get('sample', type=int)
+            
+            if category or difficulty or sample_size:
+                # Filtered or random subsets come straight from the bank's indexes
+                if career_path not in question_bank.career_paths():
+                    return jsonify({'error': 'Invalid career path'}), 400
+                if sample_size:
+                    questions = question_bank.sample(career_path, sample_size, category, difficulty)
+                else:
+                    questions = question_bank.questions(career_path, category, difficulty)
+                return jsonify({
+                    'career_path': career_path,
+                    'catalogue_version': catalogue.version,
+                    'questions': questions,
+                    'total': len(questions)
+                }), 200
+            
+            question_bank.maybe_reload()
+            payload = catalogue.get(career_path)
             
-            if not questions:
+            if not payload:
                 return jsonify({'error': 'Invalid career path'}), 400
             
-            return jsonify({
-                'career_path': career_path,
-                'questions': questions,
-                'total': len(questions)
-            }), 200
+            # Serialized at startup; If-None-Match gets a bodiless 304
+            if wants_msgpack():
+                response = Response(payload.msgpack_body, mimetype=MSGPACK_MIMETYPE)
+                response.set_etag(payload.msgpack_etag)
+            else:
+                response = Response(payload.body, mimetype='application/json')
+                response.set_etag(payload.etag)
+            response.vary.add('Accept')
+            response.cache_control.max_age = catalogue.max_age
+            if current_app.config.get('AUTH_REQUIRED'):
+                response.cache_control.private = True
+            else:
+                response.cache_control.public = True
+            return response.make_conditional(request)
             
         except Exception as e:
             logging.error(f"Get questions error: {e}")
             return jsonify({'error': 'Failed to fetch questions'}), 500
 
     @interview_bp.route('/start', methods=['POST'])
+    @token_required
     def start_interview():
         try:
             data = request.get_json()
@@ -219,22 +415,31 @@ def create_routes():
                 return jsonify({'error': 'Career path is required'}), 400
             
             # Create interview session
+            question_bank.maybe_reload()
             session = interview_service.create_session(user_id, career_path)
-            questions = interview_service.get_questions_by_career(career_path)
             
-            return jsonify({
+            # Clients holding the current catalogue version already have the questions
+            include_questions = data.get('catalogue_version') != catalogue.version
+            fields = {
                 'message': 'Interview session started',
                 'session_id': session.session_id,
-                'questions': questions,
                 'career_path': career_path,
-                'total_questions': len(questions)
-            }), 201
+                'total_questions': session.total_questions,
+                'questions_included': include_questions
+            }
+            if wants_msgpack():
+                response = Response(catalogue.render_start_msgpack(fields, career_path, include_questions), status=201, mimetype=MSGPACK_MIMETYPE)
+            else:
+                response = Response(catalogue.render_start(fields, career_path, include_questions), status=201, mimetype='application/json')
+            response.vary.add('Accept')
+            return response
             
         except Exception as e:
             logging.error(f"Start interview error: {e}")
             return jsonify({'error': 'Failed to start interview'}), 500
 
     @interview_bp.route('/response', methods=['POST'])
+    @token_required
     def submit_response():
         try:
             data = request.get_json()
@@ -242,8 +447,8 @@ def create_routes():
             question_id = data.get('question_id')
             question_text = data.get('question_text', '')
             response = data.get('response')
-            category = data.get('category', 'General')
-            difficulty = data.get('difficulty', 'intermediate')
+            category = data.get('category')
+            difficulty = data.get('difficulty')
             
             if not session_id or question_id is None or not response:
                 return jsonify({'error': 'Session ID, question ID, and response are required'}), 400
@@ -255,6 +460,8 @@ def create_routes():
             
             if not updated_session:
                 return jsonify({'error': 'Session not found'}), 404
+            if updated_session.get('status') == 'completed':
+                return jsonify({'error': 'Session already completed'}), 409
             
             return jsonify({
                 'message': 'Response submitted successfully',
@@ -266,7 +473,100 @@ def create_routes():
             logging.error(f"Submit response error: {e}")
             return jsonify({'error': 'Failed to submit response'}), 500
 
+    @interview_bp.route('/responses:batch', methods=['POST'])
+    @token_required
+    def submit_responses_batch():
+        # Many answers (e.g. an interview captured offline) in one request and one
+        # storage write; complete=true also ends the session and awards XP
+        try:
+            data = request.get_json()
+            session_id = data.get('session_id')
+            responses = data.get('responses') or []
+            complete = bool(data.get('complete', False))
+            batch_id = data.get('batch_id')
+            max_responses = config.get('MAX_BATCH_RESPONSES', 100)
+            
+            if not session_id:
+                return jsonify({'error': 'Session ID is required'}), 400
+            if not isinstance(responses, list) or (not responses and not complete):
+                return jsonify({'error': 'A list of responses is required'}), 400
+            if len(responses) > max_responses:
+                return jsonify({'error': f'At most {max_responses} responses per batch'}), 400
+            for index, item in enumerate(responses):
+                if not isinstance(item, dict) or item.get('question_id') is None or not item.get('response'):
+                    return jsonify({'error': f'Response {index}: question ID and response are required'}), 400
+                if item.get('timestamp'):
+                    try:
+                        datetime.fromisoformat(item['timestamp'])
+                    except (TypeError, ValueError):
+                        return jsonify({'error': f'Response {index}: timestamp must be ISO 8601'}), 400
+            
+            result = interview_service.submit_batch(session_id, responses, batch_id, complete, user_service)
+            
+            if not result:
+                return jsonify({'error': 'Session not found'}), 404
+            if responses and not result['accepted'] and not result['replayed']:
+                return jsonify({'error': 'Session already completed'}), 409
+            
+            return jsonify(dict(result, message='Responses submitted successfully')), 200
+        
+        except Exception as e:
+            logging.error(f"Submit responses batch error: {e}")
+            return jsonify({'error': 'Failed to submit responses'}), 500
+
+    @interview_bp.route('/next-question', methods=['POST'])
+    @token_required
+    def next_question():
+        try:
+            data = request.get_json()
+            session_id = data.get('session_id')
+            
+            if not session_id:
+                return jsonify({'error': 'Session ID is required'}), 400
+            
+            session_data = interview_service.get_session(session_id)
+            if not session_data:
+                return jsonify({'error': 'Session not found'}), 404
+            
+            asked_ids = [response.get('question_id') for response in session_data.get('responses', [])]
+            question = question_selector.next_question(session_data['user_id'], session_data['career_path'], asked_ids)
+            
+            return jsonify({
+                'session_id': session_id,
+                'question': question,
+                'questions_answered': session_data.get('questions_answered', 0),
+                'exhausted': question is None
+            }), 200
+        
+        except Exception as e:
+            logging.error(f"Next question error: {e}")
+            return jsonify({'error': 'Failed to select next question'}), 500
+
+    @interview_bp.route('/plan', methods=['POST'])
+    @token_required
+    def plan_sessions():
+        try:
+            data = request.get_json()
+            career_path = data.get('career_path')
+            user_ids = data.get('user_ids') or []
+            count = min(max(int(data.get('count', 10)), 1), 50)
+            
+            if not career_path or not isinstance(user_ids, list):
+                return jsonify({'error': 'Career path and a list of user IDs are required'}), 400
+            if len(user_ids) > 500:
+                return jsonify({'error': 'At most 500 users per request'}), 400
+            if career_path not in question_bank.career_paths():
+                return jsonify({'error': 'Invalid career path'}), 400
+            
+            plans = question_selector.plan_sessions([(user_id, career_path, count) for user_id in user_ids])
+            return jsonify({'career_path': career_path, 'plans': plans}), 200
+        
+        except Exception as e:
+            logging.error(f"Plan sessions error: {e}")
+            return jsonify({'error': 'Failed to plan sessions'}), 500
+
     @interview_bp.route('/end', methods=['POST'])
+    @token_required
     def end_interview():
         try:
             data = request.get_json()
@@ -275,17 +575,21 @@ def create_routes():
             if not session_id:
                 return jsonify({'error': 'Session ID is required'}), 400
             
+            # Responses are only read back when the field mask keeps them
+            mask = parse_fields(request.args.get('fields'))
+            include_responses = wants(mask, 'session_data') and wants(subtree(mask, 'session_data'), 'responses')
+            
             # Complete the session and award XP
-            completed_session = interview_service.complete_session(session_id, user_service)
+            completed_session, _ = interview_service.complete_session_with_xp(session_id, user_service, include_responses)
             
             if not completed_session:
                 return jsonify({'error': 'Session not found'}), 404
             
-            return jsonify({
+            return jsonify(apply_mask({
                 'message': 'Interview session completed successfully',
                 'session_data': completed_session,
                 'xp_earned': completed_session.get('xp_earned', 0)
-            }), 200
+            }, mask)), 200
             
         except Exception as e:
             logging.error(f"End interview error: {e}")
@@ -293,6 +597,7 @@ def create_routes():
 
     # User Routes
     @user_bp.route('/profile/<user_id>', methods=['GET'])
+    @token_required
     def get_user_profile(user_id):
         try:
             user_data = user_service.get_user(user_id)
@@ -300,20 +605,19 @@ def create_routes():
             if not user_data:
                 return jsonify({'error': 'User not found'}), 404
             
-            # Get user sessions if db is available
-            sessions = []
-            if db:
-                try:
-                    sessions_query = db.collection('interview_sessions').where('user_id', '==', user_id).limit(10)
-                    for doc in sessions_query.get():
-                        session_data = doc.to_dict()
-                        sessions.append(session_data)
-                except Exception as e:
-                    logging.error(f"Error fetching sessions: {e}")
-            
-            # Calculate statistics
-            total_sessions = len(sessions)
-            completed_sessions = len([s for s in sessions if s.get('status') == 'completed'])
+            # Sections left out of the field mask are not read at all
+            mask = parse_fields(request.args.get('fields'))
+            
+            # One page of session history, without responses
+            sessions, next_cursor = [], None
+            if wants(mask, 'recent_sessions') or wants(mask, 'next_cursor'):
+                limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+                sessions, next_cursor = interview_service.list_sessions(user_id, limit, request.args.get('cursor'))
+            
+            # Statistics come from the incrementally maintained aggregates document
+            aggregates = (aggregate_service.get(user_id) if wants(mask, 'statistics') else None) or {}
+            completed_sessions = aggregates.get('sessions_completed', user_data.get('completed_interviews', 0))
+            total_sessions = max(aggregates.get('sessions_started', user_data.get('total_interviews', 0)), completed_sessions)
             completion_rate = (completed_sessions / total_sessions * 100) if total_sessions > 0 else 0
             
             stats = {
@@ -321,21 +625,64 @@ def create_routes():
                 'completed_sessions': completed_sessions,
                 'completion_rate': completion_rate,
                 'career_paths': user_data.get('career_paths_practiced', {}),
-                'total_questions_answered': sum(len(s.get('responses', [])) for s in sessions)
+                'total_questions_answered': aggregates.get('responses_total', 0),
+                'responses_by_category': aggregates.get('responses_by_category', {}),
+                'responses_by_difficulty': aggregates.get('responses_by_difficulty', {}),
+                'average_feedback_rating': aggregates.get('average_feedback_rating', 0),
+                'xp_by_source': aggregates.get('xp_by_source', {})
             }
             
-            return jsonify({
+            return jsonify(apply_mask({
                 'user': user_data,
                 'statistics': stats,
-                'recent_sessions': sessions
-            }), 200
+                'recent_sessions': sessions,
+                'next_cursor': next_cursor
+            }, mask)), 200
             
         except Exception as e:
             logging.error(f"Get user profile error: {e}")
             return jsonify({'error': 'Failed to fetch user profile'}), 500
 
+    @user_bp.route('/leaderboard', methods=['GET'])
+    @token_required
+    def get_leaderboard():
+        try:
+            # Global board, or one career path's with ?career_path=
+            limit = min(max(request.args.get('limit', 100, type=int), 1), 100)
+            offset = max(request.args.get('offset', 0, type=int), 0)
+            return jsonify(leaderboard_service.top(request.args.get('career_path'), limit, offset)), 200
+        
+        except Exception as e:
+            logging.error(f"Get leaderboard error: {e}")
+            return jsonify({'error': 'Failed to fetch leaderboard'}), 500
+
+    @user_bp.route('/leaderboard/<user_id>', methods=['GET'])
+    @token_required
+    def get_leaderboard_rank(user_id):
+        try:
+            # ?radius=N adds the N users ranked directly above and below
+            radius = min(max(request.args.get('radius', 0, type=int), 0), 25)
+            result = leaderboard_service.rank(user_id, request.args.get('career_path'), radius)
+            if result is None:
+                return jsonify({'error': 'User is not on this leaderboard'}), 404
+            return jsonify(result), 200
+        
+        except Exception as e:
+            logging.error(f"Get leaderboard rank error: {e}")
+            return jsonify({'error': 'Failed to fetch leaderboard rank'}), 500
+
+    @user_bp.route('/cache-stats', methods=['GET'])
+    @token_required
+    def get_user_cache_stats():
+        return jsonify({
+            'user_cache': user_service.cache_stats(),
+            'write_queue': write_queue.stats() if write_queue else None,
+            'write_coalescer': coalescer.stats() if coalescer else None
+        }), 200
+
     # Feedback Routes
     @feedback_bp.route('/submit', methods=['POST'])
+    @token_required
     def submit_feedback():
         try:
             data = request.get_json()
@@ -353,9 +700,9 @@ def create_routes():
             # Submit feedback
             feedback_service.submit_feedback(user_id, session_id, rating, comments)
             
-            # Award bonus XP for providing feedback
+            # Award bonus XP for providing feedback, after the response is sent
             if user_id != 'guest':
-                user_service.add_xp_to_user(user_id, 25, "Feedback Provided")
+                user_service.add_xp_in_background(user_id, 25, "Feedback Provided")
             
             return jsonify({
                 'message': 'Feedback submitted successfully',
@@ -0,0 +1,163 @@
+from aggregates import coverage_key
+import logging
+import random
+import zlib
+
+class Coverage:
+    """How often one user answered each (category, difficulty) of a career path.
+    
+    Combinations are kept in groups by count, each a list with the positions
+    of its members, so the least covered ones are always the lowest group:
+    picking one and counting an answer are O(1). The seed fixes the order
+    the user walks each bucket in.
+    """
+    __slots__ = ('counts', 'groups', 'slots', 'lowest', 'seed')
+    
+    def __init__(self, counts, seed):
+        self.counts = {}
+        self.groups = {}
+        self.slots = {}
+        self.lowest = None
+        self.seed = seed
+        for combination, count in counts.items():
+            self._place(combination, count)
+    
+    def __bool__(self):
+        return self.lowest is not None
+    
+    def least_covered(self, rng):
+        """A random one of the least covered combinations (None once all are retired)"""
+        if self.lowest is None:
+            return None
+        return rng.choice(self.groups[self.lowest])
+    
+    def cover(self, combination):
+        """Count one more answer; unknown or retired combinations are ignored"""
+        count = self.counts.get(combination)
+        if count is None:
+            return
+        emptied = self._remove(combination)
+        self._place(combination, count + 1)
+        if emptied and count == self.lowest:
+            # Counts grow by one, so the group just joined is the new lowest
+            self.lowest = count + 1
+    
+    def retire(self, combination):
+        """Drop a combination with nothing left to ask in this session"""
+        count = self.counts.get(combination)
+        if count is None:
+            return
+        if self._remove(combination) and count == self.lowest:
+            # Once per bucket and session; the groups are the distinct counts
+            self.lowest = min(self.groups) if self.groups else None
+    
+    def _place(self, combination, count):
+        group = self.groups.setdefault(count, [])
+        self.slots[combination] = len(group)
+        group.append(combination)
+        self.counts[combination] = count
+        if self.lowest is None or count < self.lowest:
+            self.lowest = count
+    
+    def _remove(self, combination):
+        """Take a combination out of its group; True if that emptied the group"""
+        count = self.counts.pop(combination)
+        group = self.groups[count]
+        # Swap with the last member so removal does not shift the list
+        slot = self.slots.pop(combination)
+        last = group.pop()
+        if last != combination:
+            group[slot] = last
+            self.slots[last] = slot
+        if group:
+            return False
+        del self.groups[count]
+        return True
+
+class QuestionSelector:
+    """Picks each next question toward the categories and difficulties a user has covered least.
+    
+    Coverage comes from the per-career (category, difficulty) counters
+    AggregateService keeps ('coverage' in the user's aggregates document), so
+    no past sessions are read and the stored size does not grow with the
+    bank. A pick takes a least covered combination in O(1) and returns the
+    next question of that bucket in the user's own fixed order of it
+    (QuestionBank.nth), skipping those already asked in the session; as the
+    counter grows with every answer, a user works through a bucket before
+    seeing any of its questions again.
+    """
+    def __init__(self, question_bank, aggregates, rng=None):
+        self.question_bank = question_bank
+        self.aggregates = aggregates
+        self.rng = rng or random.Random()
+    
+    def coverage(self, uid, career_path):
+        """Coverage of one user and career path over the combinations the bank has"""
+        stored = {}
+        if uid and uid != 'guest':
+            aggregates = self.aggregates.get(uid) or {}
+            stored = aggregates.get('coverage', {}).get(career_path, {})
+            seed = zlib.crc32(f"{uid}|{career_path}".encode('utf-8'))
+        else:
+            seed = self.rng.getrandbits(32)
+        counts = {
+            (category, difficulty): stored.get(coverage_key(category, difficulty), 0)
+            for category, difficulty in self.question_bank.combinations(career_path)
+            if self.question_bank.available(career_path, category, difficulty)
+        }
+        return Coverage(counts, seed)
+    
+    def next_question(self, uid, career_path, asked_ids=(), coverage=None):
+        """Best next question not yet asked in this session, or None when the bank is exhausted"""
+        coverage = coverage if coverage is not None else self.coverage(uid, career_path)
+        asked = set(asked_ids)
+        while coverage:
+            combination = coverage.least_covered(self.rng)
+            question = self._next_in_bucket(career_path, combination, coverage, asked)
+            if question:
+                return question
+            coverage.retire(combination)
+        return None
+    
+    def plan_session(self, uid, career_path, count, asked_ids=(), coverage=None):
+        """Pick count questions up front, counting each pick as covered before the next one"""
+        coverage = coverage if coverage is not None else self.coverage(uid, career_path)
+        asked = list(asked_ids)
+        planned = []
+        for _ in range(count):
+            question = self.next_question(uid, career_path, asked, coverage)
+            if question is None:
+                break
+            planned.append(question)
+            asked.append(question['id'])
+            self.cover(coverage, question)
+        return planned
+    
+    def plan_sessions(self, requests):
+        """Batch planning: requests are (uid, career_path, count); returns {uid: [question, ...]}"""
+        plans = {}
+        for uid, career_path, count in requests:
+            try:
+                plans[uid] = self.plan_session(uid, career_path, count)
+            except Exception as e:
+                logging.error(f"Error planning session for user {uid}: {e}")
+                plans[uid] = []
+        return plans
+    
+    def cover(self, coverage, question):
+        """Count a question as covered, so the next pick balances around it"""
+        coverage.cover((question.get('category'), question.get('difficulty')))
+    
+    def _next_in_bucket(self, career_path, combination, coverage, asked):
+        """The user's next question of a bucket not asked in this session; None once the bucket is used up.
+        
+        Normally the first candidate; a full walk only happens once per bucket,
+        right before it is retired.
+        """
+        category, difficulty = combination
+        position = coverage.counts[combination]
+        for step in range(self.question_bank.size(career_path, category, difficulty)):
+            question = self.question_bank.nth(career_path, category, difficulty, coverage.seed, position + step)
+            if question['id'] not in asked and float(question.get('weight', 1)) > 0:
+                return question
+        return None
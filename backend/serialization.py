@@ -0,0 +1,144 @@
+from datetime import date, datetime
+from flask import Request, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from models import Model
+import json
+import msgpack
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt, json is the fallback
+    orjson = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+_NEGOTIATED_MIMETYPES = ['application/json', MSGPACK_MIMETYPE, 'application/x-msgpack']
+
+# Fields holding ISO-8601 strings that MessagePack sends as native timestamps:
+# every model's TIMESTAMP_FIELDS plus the 'timestamp' of responses and achievements
+TIMESTAMP_KEYS = frozenset(
+    field for model in Model.__subclasses__() for field in model.TIMESTAMP_FIELDS
+) | {'timestamp'}
+
+def _default(value):
+    """Encode what JSON has no type for: timestamps as ISO-8601, everything else as before"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    return str(value)
+
+def dumps(value, sort_keys=False, indent=False):
+    """Serialize to compact UTF-8 JSON bytes (orjson when installed)"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(value, default=_default, option=option)
+    return json.dumps(
+        value,
+        default=_default,
+        sort_keys=sort_keys,
+        indent=2 if indent else None,
+        separators=None if indent else (',', ':'),
+        ensure_ascii=False
+    ).encode('utf-8')
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _timestamp(value):
+    """msgpack Timestamp of a naive datetime, which in this app is local time (datetime.now())"""
+    # int() of the float keeps the whole seconds; the microseconds are taken exactly from the field
+    return msgpack.Timestamp(int(value.timestamp()), value.microsecond * 1000)
+
+def _with_timestamps(value):
+    """Copy of a dict/list with the ISO strings under TIMESTAMP_KEYS turned into Timestamps.
+    
+    Only containers are recursed into; scalars are checked in the loop, as a
+    call per value would cost more than the packing itself.
+    """
+    if isinstance(value, dict):
+        converted = {}
+        for key, item in value.items():
+            if isinstance(item, (dict, list, tuple)):
+                item = _with_timestamps(item)
+            elif key in TIMESTAMP_KEYS and isinstance(item, str):
+                try:
+                    item = _timestamp(datetime.fromisoformat(item))
+                except ValueError:
+                    pass
+            converted[key] = item
+        return converted
+    return [_with_timestamps(item) if isinstance(item, (dict, list, tuple)) else item for item in value]
+
+def _msgpack_default(value):
+    # Aware datetimes are packed natively; naive ones and models end up here
+    if isinstance(value, datetime):
+        return _timestamp(value)
+    if hasattr(value, 'to_dict'):
+        return _with_timestamps(value.to_dict())
+    return _default(value)
+
+def _timestamps_to_iso(obj):
+    # object_hook: called by the unpacker for every map it builds
+    for key, item in obj.items():
+        if type(item) is msgpack.Timestamp:
+            obj[key] = datetime.fromtimestamp(item.to_unix()).isoformat()
+    return obj
+
+def packb(value):
+    """Serialize to MessagePack; timestamps use the native Timestamp extension type"""
+    if isinstance(value, (dict, list, tuple)):
+        value = _with_timestamps(value)
+    return msgpack.packb(value, datetime=True, default=_msgpack_default)
+
+def unpackb(data):
+    """Parse MessagePack, returning timestamps as the naive ISO strings the JSON API uses"""
+    return msgpack.unpackb(data, object_hook=_timestamps_to_iso)
+
+def wants_msgpack():
+    """True when the current request's Accept header prefers MessagePack over JSON"""
+    if not has_request_context():
+        return False
+    return request.accept_mimetypes.best_match(_NEGOTIATED_MIMETYPES) in _NEGOTIATED_MIMETYPES[1:]
+
+class APIRequest(Request):
+    """Request whose get_json() also accepts MessagePack bodies (Content-Type: application/msgpack)"""
+    def get_json(self, force=False, silent=False, cache=True):
+        if self.mimetype not in _NEGOTIATED_MIMETYPES[1:]:
+            return super().get_json(force=force, silent=silent, cache=cache)
+        try:
+            return unpackb(self.get_data(cache=cache))
+        except Exception as e:
+            if silent:
+                return None
+            return self.on_json_loading_failed(e)
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider producing the same bytes the storage layer writes.
+    
+    jsonify() responses switch to MessagePack when the client asks for it
+    with Accept: application/msgpack; JSON stays the default.
+    """
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys)).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if wants_msgpack():
+            response = self._app.response_class(packb(obj), mimetype=MSGPACK_MIMETYPE)
+        else:
+            body = dumps(obj, sort_keys=self.sort_keys, indent=self._app.debug) + b'\n'
+            response = self._app.response_class(body, mimetype=self.mimetype)
+        response.vary.add('Accept')
+        return response
@@ -1,29 +1,107 @@
-from models import User, SimpleInterviewSession, Feedback, INTERVIEW_QUESTIONS_DB
+from models import User, SimpleInterviewSession, Feedback, level_for_xp
 from datetime import datetime
-import random
+from cachetools import TTLCache
+import copy
 import logging
-import json
 import os
+import threading
+from firebase_config import HashingReader, UPLOAD_CHUNK_SIZE, upload_stream_to_storage
+from questionbank import QuestionBank
+from storage import USERS, SESSIONS, FEEDBACK, DocumentNotFound, Increment, apply_update
+from werkzeug.utils import secure_filename
 
-# Local storage fallback when Firebase is not available
+# Local storage for files (resumes) when Firebase Storage is not available
 LOCAL_STORAGE_PATH = 'local_storage'
 
+# Batch ids kept on a session to recognize retried batch uploads
+MAX_REMEMBERED_BATCHES = 20
+
+# Session fields kept for bookkeeping only, never returned to clients
+INTERNAL_SESSION_FIELDS = ['batch_ids']
+
+# Session fields returned by history listings (everything except responses)
+SESSION_SUMMARY_FIELDS = [
+    'session_id', 'user_id', 'career_path', 'started_at', 'completed_at', 'status',
+    'questions_answered', 'total_questions', 'xp_earned', 'completion_percentage'
+]
+
 def ensure_local_storage():
-    """Ensure local storage directory exists"""
-    if not os.path.exists(LOCAL_STORAGE_PATH):
-        os.makedirs(LOCAL_STORAGE_PATH)
-        os.makedirs(os.path.join(LOCAL_STORAGE_PATH, 'users'))
-        os.makedirs(os.path.join(LOCAL_STORAGE_PATH, 'sessions'))
-        os.makedirs(os.path.join(LOCAL_STORAGE_PATH, 'feedback'))
+    """Ensure local storage directories exist"""
+    os.makedirs(os.path.join(LOCAL_STORAGE_PATH, 'resumes'), exist_ok=True)
+
+def _public_session(session_data):
+    """Drop the bookkeeping fields from a session before it is returned"""
+    for field in INTERNAL_SESSION_FIELDS:
+        session_data.pop(field, None)
+    return session_data
 
 class UserService:
-    def __init__(self, db=None, storage_bucket=None):
-        self.db = db
+    def __init__(self, storage, storage_bucket=None, cache_size=None, cache_ttl=None, aggregates=None, write_queue=None, leaderboard=None):
+        self.storage = storage
         self.storage_bucket = storage_bucket
+        self.aggregates = aggregates
+        self.write_queue = write_queue
+        self.leaderboard = leaderboard
         ensure_local_storage()
+        
+        # Read-through cache of user documents, bounded by size (LRU) and age (TTL)
+        cache_size = cache_size or int(os.environ.get('USER_CACHE_SIZE', 1024))
+        cache_ttl = cache_ttl or float(os.environ.get('USER_CACHE_TTL', 60))
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+    
+    def _cache_get(self, uid):
+        """Return a copy of the cached user document, or None on a miss"""
+        with self._cache_lock:
+            user_data = self._cache.get(uid)
+            if user_data is None:
+                self._cache_misses += 1
+                return None
+            self._cache_hits += 1
+        return copy.deepcopy(user_data)
+    
+    def _cache_put(self, uid, user_data):
+        """Store a private copy of a user document in the cache"""
+        user_data = copy.deepcopy(user_data)
+        with self._cache_lock:
+            self._cache[uid] = user_data
+    
+    def _cache_merge(self, uid, data):
+        """Apply a partial update to a cached user document, if it is cached"""
+        data = copy.deepcopy(data)
+        with self._cache_lock:
+            user_data = self._cache.get(uid)
+            if user_data is not None:
+                user_data.update(data)
+    
+    def _user_changed(self, uid, user_data):
+        """Cache a user document written by this process and feed its XP to the leaderboards"""
+        self._cache_put(uid, user_data)
+        if self.leaderboard:
+            self.leaderboard.record(uid, user_data)
+    
+    def invalidate_user(self, uid):
+        """Drop a user document from the cache"""
+        with self._cache_lock:
+            self._cache.pop(uid, None)
+    
+    def cache_stats(self):
+        """Get hit/miss counters and occupancy of the user cache"""
+        with self._cache_lock:
+            lookups = self._cache_hits + self._cache_misses
+            return {
+                'hits': self._cache_hits,
+                'misses': self._cache_misses,
+                'hit_rate': (self._cache_hits / lookups) if lookups > 0 else 0,
+                'size': len(self._cache),
+                'max_size': self._cache.maxsize,
+                'ttl_seconds': self._cache.ttl
+            }
     
     def create_user(self, uid, email, first_name="", last_name="", temporary_xp=0):
-        """Create a new user in Firestore or local storage"""
+        """Create a new user in storage"""
         try:
             user = User(uid, email, first_name, last_name)
             # Add any temporary XP earned before signup
@@ -36,16 +114,12 @@ class UserService:
                     'description': f'Welcome bonus: {temporary_xp} XP!'
                 })
             
+            # to_dict() already holds storage types (ISO timestamps), so cache it as is
             user_data = user.to_dict()
-            
-            if self.db:
-                # Use Firebase
-                self.db.collection('users').document(uid).set(user_data)
-            else:
-                # Fallback to local storage
-                with open(os.path.join(LOCAL_STORAGE_PATH, 'users', f'{uid}.json'), 'w') as f:
-                    json.dump(user_data, f, default=str)
-                    
+            self.storage.set(USERS, uid, user_data)
+            self._user_changed(uid, user_data)
+            if self.aggregates and temporary_xp > 0:
+                self.aggregates.record_xp(uid, temporary_xp, "Welcome Bonus")
             logging.info(f"User created successfully: {uid}")
             return user
         except Exception as e:
@@ -53,98 +127,149 @@ class UserService:
             raise e
     
     def get_user(self, uid):
-        """Get user by UID from Firebase or local storage"""
+        """Get user by UID from the cache or storage"""
+        user_data = self._cache_get(uid)
+        if user_data is not None:
+            return user_data
+        
+        user_data = self._load_user(uid)
+        if user_data is not None:
+            self._cache_put(uid, user_data)
+        return user_data
+    
+    def _load_user(self, uid):
+        """Load a user document from storage, bypassing the cache"""
         try:
-            if self.db:
-                # Try Firebase first
-                doc = self.db.collection('users').document(uid).get()
-                if doc.exists:
-                    return doc.to_dict()
-            
-            # Fallback to local storage
-            file_path = os.path.join(LOCAL_STORAGE_PATH, 'users', f'{uid}.json')
-            if os.path.exists(file_path):
-                with open(file_path, 'r') as f:
-                    return json.load(f)
-                    
-            return None
+            user_data = self.storage.get(USERS, uid)
+            if user_data is not None:
+                # Level is derived from XP at read time; the stored copy may lag
+                user_data['level'] = level_for_xp(user_data.get('xp_points', 0))
+            return user_data
         except Exception as e:
             logging.error(f"Error getting user {uid}: {e}")
-            # Try local storage as fallback
-            file_path = os.path.join(LOCAL_STORAGE_PATH, 'users', f'{uid}.json')
-            if os.path.exists(file_path):
-                with open(file_path, 'r') as f:
-                    return json.load(f)
             return None
     
     def update_user(self, uid, data):
-        """Update user data in Firebase or local storage"""
+        """Update user data in storage"""
         try:
             data['updated_at'] = datetime.now().isoformat()
-            
-            if self.db:
-                self.db.collection('users').document(uid).update(data)
-            else:
-                # Update local storage
-                user_data = self.get_user(uid)
-                if user_data:
-                    user_data.update(data)
-                    with open(os.path.join(LOCAL_STORAGE_PATH, 'users', f'{uid}.json'), 'w') as f:
-                        json.dump(user_data, f, default=str)
-                        
+            self.storage.update(USERS, uid, data)
+            self._cache_merge(uid, data)
             logging.info(f"User updated successfully: {uid}")
+        except DocumentNotFound:
+            logging.warning(f"Cannot update missing user {uid}")
         except Exception as e:
             logging.error(f"Error updating user {uid}: {e}")
-            # Fallback to local storage
-            user_data = self.get_user(uid)
-            if user_data:
-                user_data.update(data)
-                with open(os.path.join(LOCAL_STORAGE_PATH, 'users', f'{uid}.json'), 'w') as f:
-                    json.dump(user_data, f, default=str)
+            self.invalidate_user(uid)
     
     def add_xp_to_user(self, uid, xp_amount, source="Interview"):
-        """Add XP points to user and update level"""
+        """Add XP points to user and update level; concurrent awards are never lost"""
         try:
-            user_data = self.get_user(uid)
-            
-            if not user_data:
-                return None
-            
-            current_xp = user_data.get('xp_points', 50)
-            current_level = user_data.get('level', 1)
-            
-            # Create User object to calculate new level
-            user = User(uid, user_data.get('email'))
-            user.xp_points = current_xp
-            user.level = current_level
-            user.achievements = user_data.get('achievements', [])
-            
-            # Add XP and calculate level
-            xp_result = user.add_xp(xp_amount, source)
-            
-            # Update user in database
-            update_data = {
-                'xp_points': user.xp_points,
-                'level': user.level,
-                'achievements': user.achievements,
-                'updated_at': datetime.now().isoformat()
-            }
-            
-            if self.db:
-                user_ref = self.db.collection('users').document(uid)
-                user_ref.update(update_data)
-            else:
-                # Update local storage
-                user_data.update(update_data)
-                with open(os.path.join(LOCAL_STORAGE_PATH, 'users', f'{uid}.json'), 'w') as f:
-                    json.dump(user_data, f, default=str)
-                    
-            logging.info(f"XP added to user {uid}: {xp_amount} ({source})")
-            return xp_result
+            return self._award_xp(uid, xp_amount, source)
         except Exception as e:
             logging.error(f"Error adding XP to user {uid}: {e}")
             return None
     
+    def add_xp_in_background(self, uid, xp_amount, source="Interview"):
+        """Award bonus XP through the write-behind queue (inline when there is none)"""
+        if self.write_queue:
+            self.write_queue.submit(self._award_xp, uid, xp_amount, source)
+        else:
+            self.add_xp_to_user(uid, xp_amount, source)
+    
+    def _award_xp(self, uid, xp_amount, source):
+        """Apply an XP award; raises on storage errors so the write-behind queue logs the failure"""
+        result = self.storage.run_transaction(
+            lambda transaction: self._add_xp_in_transaction(transaction, uid, xp_amount, source)
+        )
+        
+        if not result:
+            return None
+        
+        user_data, xp_result = result
+        self._user_changed(uid, user_data)
+        
+        if self.aggregates:
+            self.aggregates.record_xp(uid, xp_amount, source)
+        logging.info(f"XP added to user {uid}: {xp_amount} ({source})")
+        return xp_result
+    
+    def _add_xp_in_transaction(self, transaction, uid, xp_amount, source):
+        """Read the user and stage the XP award; may run more than once on contention"""
+        user_data = transaction.get(USERS, uid)
+        if user_data is None:
+            return None
+        
+        update_data, xp_result = self.apply_xp(uid, user_data, xp_amount, source)
+        transaction.update(USERS, uid, update_data)
+        return apply_update(user_data, update_data), xp_result
+    
+    def apply_xp(self, uid, user_data, xp_amount, source="Interview"):
+        """Compute the user fields changed by an XP award without writing them.
+        
+        XP is written as an Increment so the stored total never loses a concurrent
+        award; level and achievements are computed from the XP read in the same
+        transaction.
+        """
+        # Create User object to calculate new level
+        user = User(uid, user_data.get('email'))
+        user.xp_points = user_data.get('xp_points', 50)
+        user.level = level_for_xp(user.xp_points)
+        user.achievements = list(user_data.get('achievements', []))
+        
+        # Add XP and calculate level
+        xp_result = user.add_xp(xp_amount, source)
+        
+        update_data = {
+            'xp_points': Increment(xp_amount),
+            'level': user.level,
+            'updated_at': datetime.now().isoformat()
+        }
+        if xp_result['level_up']:
+            update_data['achievements'] = user.achievements
+        return update_data, xp_result
+    
+    def store_resume(self, uid, stream, file_name, content_type=None, max_bytes=None):
+        """Stream a resume to Firebase Storage, or to local storage as a fallback.
+        
+        Returns the resume profile fields plus the stored size and SHA-256 checksum.
+        The uid becomes a path component, so anything but a plain name is refused.
+        """
+        if not uid or secure_filename(uid) != uid:
+            raise ValueError(f"Invalid user ID for resume storage: {uid!r}")
+        resume_url = ''
+        if self.storage_bucket:
+            resume_url, size, checksum = upload_stream_to_storage(
+                stream, file_name, uid, self.storage_bucket, content_type, max_bytes
+            )
+        else:
+            # Fallback to local storage, copying chunk by chunk into a temporary file
+            resume_dir = os.path.join(LOCAL_STORAGE_PATH, 'resumes', uid)
+            os.makedirs(resume_dir, exist_ok=True)
+            file_path = os.path.join(resume_dir, file_name)
+            reader = HashingReader(stream, max_bytes)
+            try:
+                with open(file_path + '.part', 'wb') as f:
+                    while True:
+                        chunk = reader.read(UPLOAD_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                os.replace(file_path + '.part', file_path)
+            finally:
+                if os.path.exists(file_path + '.part'):
+                    os.remove(file_path + '.part')
+            size, checksum = reader.size, reader.hexdigest()
+        
+        logging.info(f"Resume stored for user {uid}: {file_name} ({size} bytes)")
+        return {
+            'resume_uploaded': True,
+            'resume_file_name': file_name,
+            'resume_url': resume_url,
+            'resume_size': size,
+            'resume_sha256': checksum
+        }
+    
     def update_profile_data(self, uid, profile_data):
         """Update user profile data (GitHub, LinkedIn, Resume)"""
         try:
@@ -162,6 +287,10 @@ class UserService:
                 update_data['resume_uploaded'] = profile_data['resume_uploaded']
                 update_data['resume_file_name'] = profile_data.get('resume_file_name', '')
                 update_data['resume_url'] = profile_data.get('resume_url', '')
+                
+                if 'resume_sha256' in profile_data:
+                    update_data['resume_size'] = profile_data['resume_size']
+                    update_data['resume_sha256'] = profile_data['resume_sha256']
             
             self.update_user(uid, update_data)
             logging.info(f"Profile data updated for user {uid}")
@@ -171,13 +300,14 @@ class UserService:
             raise e
 
 class InterviewService:
-    def __init__(self, db=None):
-        self.db = db
-        ensure_local_storage()
+    def __init__(self, storage, aggregates=None, question_bank=None):
+        self.storage = storage
+        self.aggregates = aggregates
+        self.question_bank = question_bank or QuestionBank()
     
-    def get_questions_by_career(self, career_path):
-        """Get interview questions for a specific career path"""
-        return INTERVIEW_QUESTIONS_DB.get(career_path, [])
+    def get_questions_by_career(self, career_path, category=None, difficulty=None):
+        """Get interview questions for a specific career path, optionally filtered"""
+        return self.question_bank.questions(career_path, category, difficulty)
     
     def create_session(self, user_id, career_path):
         """Create a new interview session"""
@@ -186,15 +316,12 @@ class InterviewService:
             questions = self.get_questions_by_career(career_path)
             session.total_questions = len(questions)
             
-            # Store session in Firestore or local storage
+            # Store session header; responses are appended separately
             session_data = session.to_dict()
+            self.storage.set(SESSIONS, session.session_id, session_data)
             
-            if self.db:
-                self.db.collection('interview_sessions').document(session.session_id).set(session_data)
-            else:
-                # Fallback to local storage
-                with open(os.path.join(LOCAL_STORAGE_PATH, 'sessions', f'{session.session_id}.json'), 'w') as f:
-                    json.dump(session_data, f, default=str)
+            if self.aggregates:
+                self.aggregates.record_session_started(user_id, career_path)
                     
             logging.info(f"Interview session created: {session.session_id}")
             return session
@@ -206,161 +333,333 @@ class InterviewService:
             session.total_questions = len(questions)
             return session
     
-    def get_session(self, session_id):
-        """Get session from storage"""
+    def get_session(self, session_id, include_responses=True):
+        """Get session from storage, rebuilding responses from the append-only log"""
         try:
-            if self.db:
-                doc = self.db.collection('interview_sessions').document(session_id).get()
-                if doc.exists:
-                    return doc.to_dict()
+            session_data = self.storage.get(SESSIONS, session_id)
+            if session_data is None:
+                return None
             
-            # Fallback to local storage
-            file_path = os.path.join(LOCAL_STORAGE_PATH, 'sessions', f'{session_id}.json')
-            if os.path.exists(file_path):
-                with open(file_path, 'r') as f:
-                    return json.load(f)
-                    
-            return None
+            if include_responses:
+                # Sessions written before the response log keep an inline list
+                session_data['responses'] = session_data.get('responses', []) + self.storage.list_appended(SESSIONS, session_id, 'responses')
+            return self._with_progress(_public_session(session_data))
         except Exception as e:
             logging.error(f"Error getting session {session_id}: {e}")
             return None
     
+    def session_status(self, session_id):
+        """Stored status of a session (None if it does not exist); reads one field"""
+        session_data = self.storage.get(SESSIONS, session_id, fields=['status'])
+        return session_data.get('status') if session_data is not None else None
+    
     def update_session(self, session_id, data):
         """Update session data"""
         try:
-            if self.db:
-                self.db.collection('interview_sessions').document(session_id).update(data)
-            else:
-                # Update local storage
-                session_data = self.get_session(session_id)
-                if session_data:
-                    session_data.update(data)
-                    with open(os.path.join(LOCAL_STORAGE_PATH, 'sessions', f'{session_id}.json'), 'w') as f:
-                        json.dump(session_data, f, default=str)
+            self.storage.update(SESSIONS, session_id, data)
         except Exception as e:
             logging.error(f"Error updating session {session_id}: {e}")
     
-    def add_response(self, session_id, question_id, question_text, response_text, category="General", difficulty="intermediate"):
-        """Add a response to an interview session"""
+    def add_response(self, session_id, question_id, question_text, response_text, category=None, difficulty=None):
+        """Append a response to an interview session without rewriting earlier responses.
+        
+        A completed session is returned unchanged, without the response.
+        """
         try:
-            session_data = self.get_session(session_id)
+            session_data = self.get_session(session_id, include_responses=False)
             
             if not session_data:
                 return None
+            if session_data.get('status') == 'completed':
+                return session_data
             
-            # Add response
-            response = {
-                'question_id': question_id,
-                'question_text': question_text,
-                'response': response_text,
-                'category': category,
-                'difficulty': difficulty,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            session_data['responses'].append(response)
-            session_data['questions_answered'] = len(session_data['responses'])
-            session_data['completion_percentage'] = (session_data['questions_answered'] / session_data['total_questions']) * 100 if session_data['total_questions'] > 0 else 0
-            
-            # Update session
-            self.update_session(session_id, session_data)
-            logging.info(f"Response added to session {session_id}")
+            session_data.setdefault('session_id', session_id)
+            self.append_response(session_data, question_id, question_text, response_text, category, difficulty)
             return session_data
         except Exception as e:
             logging.error(f"Error adding response to session {session_id}: {e}")
             return None
     
+    def append_response(self, session_data, question_id, question_text, response_text, category=None, difficulty=None):
+        """Write one response of a session the caller already holds, updating its counters in place.
+        
+        Returns the stored response record; raises on storage errors.
+        """
+        return self.append_responses(session_data, [{
+            'question_id': question_id,
+            'question_text': question_text,
+            'response': response_text,
+            'category': category,
+            'difficulty': difficulty
+        }])[0]
+        
+    def append_responses(self, session_data, items):
+        """Write many responses of a session in one append, updating its counters in place.
+        
+        items are dicts with question_id and response, optionally question_text,
+        category, difficulty and an ISO timestamp (when answered offline).
+        Returns the stored response records; raises on storage errors.
+        """
+        session_id = session_data['session_id']
+        responses = self._response_records(session_data, items)
+        self.storage.append(SESSIONS, session_id, 'responses', responses, parent_update=self._progress_update(session_data, responses))
+        self._record_aggregates(session_data, responses)
+        logging.info(f"{len(responses)} response(s) added to session {session_id}")
+        return responses
+        
+    def _response_records(self, session_data, items):
+        responses = []
+        for item in items:
+            # Fill in what the client left out from the question bank
+            question_id = item['question_id']
+            question_text = item.get('question_text')
+            category = item.get('category')
+            difficulty = item.get('difficulty')
+            question = self.question_bank.get(session_data.get('career_path'), question_id)
+            if question:
+                question_text = question_text or question['question']
+                category = category or question['category']
+                difficulty = difficulty or question['difficulty']
+            
+            responses.append({
+                'question_id': question_id,
+                'question_text': question_text or '',
+                'response': item['response'],
+                'category': category or 'General',
+                'difficulty': difficulty or 'intermediate',
+                'timestamp': item.get('timestamp') or datetime.now().isoformat()
+            })
+        return responses
+        
+    def _progress_update(self, session_data, responses):
+        """Counters of the session after appending responses, applied to session_data and returned as the parent update"""
+        session_data['questions_answered'] = session_data.get('questions_answered', 0) + len(responses)
+        self._with_progress(session_data)
+        return {
+            'questions_answered': Increment(len(responses)),
+            'completion_percentage': session_data['completion_percentage']
+        }
+        
+    def _record_aggregates(self, session_data, responses):
+        if self.aggregates:
+            self.aggregates.record_responses(session_data.get('user_id'), session_data.get('career_path'), [
+                (response['category'], response['difficulty']) for response in responses
+            ])
+        
+    def _append_batch_in_transaction(self, transaction, session_id, items, batch_id):
+        """Replay check, append and batch_ids update against one read of the session.
+        
+        Returns (session_data, responses, replayed); session_data is None for
+        an unknown session and responses is empty when nothing was written.
+        """
+        session_data = transaction.get(SESSIONS, session_id)
+        if not session_data:
+            return None, [], False
+        session_data.setdefault('session_id', session_id)
+        
+        batch_ids = session_data.get('batch_ids', [])
+        if batch_id and batch_id in batch_ids:
+            return session_data, [], True
+        if not items or session_data.get('status') == 'completed':
+            return session_data, [], False
+        
+        responses = self._response_records(session_data, items)
+        parent_update = self._progress_update(session_data, responses)
+        if batch_id:
+            # Rewriting the whole list is safe here: a concurrent batch makes the transaction retry
+            session_data['batch_ids'] = parent_update['batch_ids'] = (batch_ids + [batch_id])[-MAX_REMEMBERED_BATCHES:]
+        transaction.append(SESSIONS, session_id, 'responses', responses, parent_update=parent_update)
+        return session_data, responses, False
+    
+    def submit_batch(self, session_id, items, batch_id=None, complete=False, user_service=None):
+        """Apply a batch of responses (and optionally the completion) of one session.
+        
+        Returns None for an unknown session, else a dict with the progress,
+        how many responses were accepted, whether the batch was a replay of
+        one already applied, and the completed session and XP award when
+        complete is set. batch_id is remembered on the session so a retried
+        upload, even one overlapping the original, is appended once.
+        """
+        session_data, responses, replayed = self.storage.run_transaction(
+            lambda transaction: self._append_batch_in_transaction(transaction, session_id, items, batch_id)
+        )
+        if not session_data:
+            return None
+        if responses:
+            self._record_aggregates(session_data, responses)
+            logging.info(f"{len(responses)} response(s) added to session {session_id}")
+        
+        result = {
+            'session_id': session_id,
+            'accepted': len(responses),
+            'replayed': replayed,
+            'questions_answered': session_data.get('questions_answered', 0),
+            'completion_percentage': session_data.get('completion_percentage', 0),
+            'status': session_data.get('status')
+        }
+        if complete:
+            completed_session, xp_result = self.complete_session_with_xp(session_id, user_service, include_responses=False)
+            if completed_session:
+                result.update({
+                    'status': completed_session.get('status'),
+                    'questions_answered': completed_session.get('questions_answered', 0),
+                    'completion_percentage': completed_session.get('completion_percentage', 0),
+                    'xp_earned': completed_session.get('xp_earned', 0),
+                    'xp': xp_result
+                })
+        return result
+    
+    def list_sessions(self, user_id, limit=10, cursor=None):
+        """Page through a user's sessions, newest first, without their responses.
+        
+        Returns (sessions, next_cursor); pass next_cursor back to get the following page.
+        Storage errors are logged and give an empty page (see query_sessions).
+        """
+        try:
+            return self.query_sessions(user_id, limit, cursor)
+        except Exception as e:
+            logging.error(f"Error listing sessions for user {user_id}: {e}")
+            return [], None
+    
+    def query_sessions(self, user_id, limit=10, cursor=None):
+        """list_sessions that raises storage errors, for callers that must not mistake them for no sessions"""
+        # On Firestore this needs the composite index on interview_sessions
+        # (user_id ASC, started_at DESC) defined in backend/firestore.indexes.json
+        # (firebase deploy --only firestore:indexes); without it the query
+        # fails with FAILED_PRECONDITION
+        sessions = self.storage.query(
+            SESSIONS,
+            filters=[('user_id', '==', user_id)],
+            order_by='started_at',
+            descending=True,
+            limit=limit + 1,
+            start_after=cursor,
+            fields=SESSION_SUMMARY_FIELDS
+        )
+        
+        next_cursor = None
+        if len(sessions) > limit:
+            sessions = sessions[:limit]
+            next_cursor = sessions[-1]['session_id']
+        return sessions, next_cursor
+    
+    def _with_progress(self, session_data):
+        """Derive completion percentage from the stored counters"""
+        if 'responses' in session_data and session_data['responses']:
+            session_data['questions_answered'] = max(session_data.get('questions_answered', 0), len(session_data['responses']))
+        total_questions = session_data.get('total_questions', 0)
+        session_data['completion_percentage'] = (session_data.get('questions_answered', 0) / total_questions) * 100 if total_questions > 0 else 0
+        return session_data
+    
     def complete_session(self, session_id, user_service):
-        """Complete an interview session and award XP"""
+        """Complete an interview session, award XP and update user stats in one atomic write"""
+        completed_session, _ = self.complete_session_with_xp(session_id, user_service)
+        return completed_session
+    
+    def complete_session_with_xp(self, session_id, user_service, include_responses=True):
+        """Like complete_session, also returning the XP award (None for guests and repeat completions)"""
         try:
-            session_data = self.get_session(session_id)
-            
-            if not session_data:
-                return None
-            
-            # Calculate XP
-            base_xp = 50
-            completion_percentage = session_data.get('completion_percentage', 0)
-            questions_answered = len(session_data.get('responses', []))
-            
-            completion_bonus = int(completion_percentage * 0.5)
-            response_quality_bonus = min(questions_answered * 10, 50)
-            
-            xp_earned = base_xp + completion_bonus + response_quality_bonus
-            
-            # Update session
-            update_data = {
-                'status': 'completed',
-                'completed_at': datetime.now().isoformat(),
-                'xp_earned': xp_earned
-            }
-            
-            session_data.update(update_data)
-            self.update_session(session_id, update_data)
-            
-            # Award XP to user
-            if session_data['user_id'] != 'guest':
-                user_service.add_xp_to_user(session_data['user_id'], xp_earned, "Interview Completion")
-            
-            # Update user interview stats
-            self.update_user_interview_stats(session_data['user_id'], session_data['career_path'], True, user_service)
-            
-            logging.info(f"Session completed: {session_id}, XP earned: {xp_earned}")
-            return session_data
+            result = self.storage.run_transaction(
+                lambda transaction: self._complete_in_transaction(transaction, session_id, user_service)
+            )
+            
+            if not result:
+                return None, None
+            
+            session_data, user_data, completed_now, xp_result = result
+            if user_data is not None:
+                user_service._user_changed(session_data['user_id'], user_data)
+            if completed_now and self.aggregates:
+                self.aggregates.record_session_completed(session_data['user_id'], session_data['career_path'])
+                if user_data is not None:
+                    self.aggregates.record_xp(session_data['user_id'], session_data['xp_earned'], "Interview Completion")
+            
+            # Rebuild the full view for the caller
+            completed_session = self.get_session(session_id, include_responses) or _public_session(session_data)
+            logging.info(f"Session completed: {session_id}, XP earned: {completed_session.get('xp_earned', 0)}")
+            return completed_session, xp_result
         except Exception as e:
             logging.error(f"Error completing session {session_id}: {e}")
+            return None, None
+    
+    def _complete_in_transaction(self, transaction, session_id, user_service):
+        """Read session and user, then stage both completion writes in the transaction"""
+        session_data = transaction.get(SESSIONS, session_id)
+        if session_data is None:
             return None
+        self._with_progress(session_data)
+        
+        user_data = None
+        if session_data['user_id'] != 'guest':
+            user_data = transaction.get(USERS, session_data['user_id'])
+            
+        # All reads are done; stage the writes
+        session_update, user_update, xp_result = self._completion_updates(session_data, user_data, user_service)
+        if session_update:
+            transaction.update(SESSIONS, session_id, session_update)
+        if user_update:
+            transaction.update(USERS, session_data['user_id'], user_update)
+        return session_data, user_data, bool(session_update), xp_result
     
-    def update_user_interview_stats(self, user_id, career_path, completed=False, user_service=None):
-        """Update user's interview statistics"""
-        try:
-            if user_id == 'guest' or not user_service:
-                return
-            
-            user_data = user_service.get_user(user_id)
-            
-            if not user_data:
-                return
-            
-            total_interviews = user_data.get('total_interviews', 0) + 1
-            completed_interviews = user_data.get('completed_interviews', 0)
-            if completed:
-                completed_interviews += 1
-            
-            career_paths = user_data.get('career_paths_practiced', {})
-            career_paths[career_path] = career_paths.get(career_path, 0) + 1
-            
-            update_data = {
-                'total_interviews': total_interviews,
-                'completed_interviews': completed_interviews,
-                'career_paths_practiced': career_paths,
-                'updated_at': datetime.now().isoformat()
-            }
-            
-            user_service.update_user(user_id, update_data)
-            logging.info(f"Interview stats updated for user {user_id}")
-        except Exception as e:
-            logging.error(f"Error updating interview stats for user {user_id}: {e}")
+    def _completion_updates(self, session_data, user_data, user_service):
+        """Compute session and user changes for a completion, applying them to the given dicts"""
+        if session_data.get('status') == 'completed':
+            # Already completed: never award XP twice
+            return {}, {}, None
+        
+        # Calculate XP
+        base_xp = 50
+        completion_percentage = session_data.get('completion_percentage', 0)
+        questions_answered = session_data.get('questions_answered', 0)
+        
+        completion_bonus = int(completion_percentage * 0.5)
+        response_quality_bonus = min(questions_answered * 10, 50)
+        
+        xp_earned = base_xp + completion_bonus + response_quality_bonus
+        
+        session_update = {
+            'status': 'completed',
+            'completed_at': datetime.now().isoformat(),
+            'xp_earned': xp_earned
+        }
+        session_data.update(session_update)
+        
+        if user_data is None:
+            return session_update, {}, None
+        
+        # Award XP to user
+        user_update, xp_result = user_service.apply_xp(session_data['user_id'], user_data, xp_earned, "Interview Completion")
+        
+        # Update user interview stats
+        career_path = session_data['career_path']
+        career_paths = dict(user_data.get('career_paths_practiced', {}))
+        career_paths[career_path] = career_paths.get(career_path, 0) + 1
+        # Per-career XP ranks the career leaderboards
+        xp_by_career = dict(user_data.get('xp_by_career', {}))
+        xp_by_career[career_path] = xp_by_career.get(career_path, 0) + xp_earned
+        user_update.update({
+            'total_interviews': Increment(1),
+            'completed_interviews': Increment(1),
+            'career_paths_practiced': career_paths,
+            'xp_by_career': xp_by_career
+        })
+        apply_update(user_data, user_update)
+        return session_update, user_update, xp_result
 
 class FeedbackService:
-    def __init__(self, db=None):
-        self.db = db
-        ensure_local_storage()
+    def __init__(self, storage, aggregates=None):
+        self.storage = storage
+        self.aggregates = aggregates
     
     def submit_feedback(self, user_id, session_id, rating, comments=None):
-        """Submit feedback for an interview session"""
+        """Submit feedback for an interview session; only the feedback document is written inline"""
         try:
             feedback = Feedback(user_id, session_id, rating, comments)
             feedback_data = feedback.to_dict()
-            
-            if self.db:
-                self.db.collection('feedback').add(feedback_data)
-            else:
-                # Fallback to local storage
-                feedback_id = f"{user_id}_{session_id}_{datetime.now().timestamp()}"
-                with open(os.path.join(LOCAL_STORAGE_PATH, 'feedback', f'{feedback_id}.json'), 'w') as f:
-                    json.dump(feedback_data, f, default=str)
+            self.storage.add(FEEDBACK, feedback_data)
                     
+            if self.aggregates:
+                self.aggregates.record_feedback(user_id, rating)
             logging.info(f"Feedback submitted for session {session_id}")
             return feedback
         except Exception as e:
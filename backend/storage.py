@@ -0,0 +1,720 @@
+from firebase_admin import firestore
+from google.api_core import exceptions as google_exceptions
+from collections import Counter
+import copy
+import json
+import logging
+import os
+import serialization
+import sqlite3
+import threading
+import time
+import uuid
+
+# Collection names shared by the services
+USERS = 'users'
+SESSIONS = 'interview_sessions'
+FEEDBACK = 'feedback'
+AGGREGATES = 'user_aggregates'
+LEADERBOARDS = 'leaderboards'
+
+class DocumentNotFound(KeyError):
+    """Raised by update() when the target document does not exist"""
+
+class Increment:
+    """Field value that adds to the stored number instead of replacing it"""
+    def __init__(self, amount):
+        self.amount = amount
+    
+    def __repr__(self):
+        return f"Increment({self.amount})"
+
+class Write:
+    """One mutation for apply_batch(): kind is 'set', 'update' or 'add'"""
+    def __init__(self, kind, collection, doc_id=None, data=None, merge=False):
+        self.kind = kind
+        self.collection = collection
+        self.doc_id = doc_id
+        self.data = data
+        self.merge = merge
+    
+    def __repr__(self):
+        return f"Write({self.kind}, {self.collection}/{self.doc_id})"
+
+# Firestore's limit on operations in one WriteBatch
+MAX_BATCH_WRITES = 500
+
+def _apply_value(current, value):
+    """Resolve a written value against the stored one (handles Increment)"""
+    if isinstance(value, Increment):
+        return (current if isinstance(current, (int, float)) else 0) + value.amount
+    return copy.deepcopy(value)
+
+def apply_update(document, data):
+    """Shallow update: top-level fields are replaced (or incremented)"""
+    for field, value in data.items():
+        document[field] = _apply_value(document.get(field), value)
+    return document
+
+def apply_merge(document, data):
+    """Deep merge: nested dicts are merged recursively, like Firestore set(merge=True)"""
+    for field, value in data.items():
+        if isinstance(value, dict):
+            target = document.get(field)
+            if not isinstance(target, dict):
+                target = document[field] = {}
+            apply_merge(target, value)
+        else:
+            document[field] = _apply_value(document.get(field), value)
+    return document
+
+def project(document, fields, doc_id=None, id_field=None):
+    """Keep only the requested top-level fields, adding the document id under id_field if given"""
+    if fields is not None:
+        document = {field: document[field] for field in fields if field in document}
+    if id_field:
+        document[id_field] = doc_id
+    return document
+
+class StorageBackend:
+    """Document store the services are written against.
+    
+    Documents are plain dicts addressed by (collection, doc_id). Values written
+    with update() or set(merge=True) may be Increment instances. Append-only
+    child records (e.g. session responses) live under a parent document and
+    are read back in insertion order.
+    """
+    name = 'abstract'
+    
+    def get(self, collection, doc_id, fields=None):
+        """Document dict, or None if it does not exist"""
+        raise NotImplementedError
+    
+    def set(self, collection, doc_id, data, merge=False):
+        """Create or overwrite a document; merge=True deep-merges into an existing one"""
+        raise NotImplementedError
+    
+    def update(self, collection, doc_id, data):
+        """Update top-level fields of an existing document (DocumentNotFound otherwise)"""
+        raise NotImplementedError
+    
+    def add(self, collection, data):
+        """Create a document with a generated id and return the id"""
+        raise NotImplementedError
+    
+    def query(self, collection, filters=(), order_by=None, descending=False, limit=None, start_after=None, fields=None, id_field=None):
+        """Documents matching all (field, '==', value) filters.
+        
+        start_after is the id of the last document of the previous page; an
+        unknown id yields no results. With id_field, each result carries its
+        document id under that key, so a page can be continued from it.
+        """
+        raise NotImplementedError
+    
+    def ids(self, collection):
+        """All document ids in a collection"""
+        raise NotImplementedError
+    
+    def append(self, collection, doc_id, subcollection, items, parent_update=None):
+        """Append child records, optionally updating the parent in the same atomic write"""
+        raise NotImplementedError
+    
+    def list_appended(self, collection, doc_id, subcollection):
+        """Child records in the order they were appended"""
+        raise NotImplementedError
+    
+    def run_transaction(self, fn):
+        """Run fn(transaction) atomically; the transaction offers get/set/update/append"""
+        raise NotImplementedError
+
+    def apply_batch(self, writes):
+        """Apply Write operations atomically in one round trip.
+        
+        Returns one result per write (the new id for 'add', else None). If any
+        write fails (e.g. update of a missing document) none are applied.
+        """
+        raise NotImplementedError
+
+class FirestoreBackend(StorageBackend):
+    """Cloud Firestore; append-only records become a subcollection ordered by 'seq'"""
+    name = 'firestore'
+    
+    def __init__(self, db):
+        self.db = db
+    
+    def _ref(self, collection, doc_id):
+        return self.db.collection(collection).document(doc_id)
+    
+    def _to_firestore(self, data):
+        return {
+            field: self._to_firestore(value) if isinstance(value, dict)
+            else firestore.Increment(value.amount) if isinstance(value, Increment)
+            else value
+            for field, value in data.items()
+        }
+    
+    def get(self, collection, doc_id, fields=None):
+        doc = self._ref(collection, doc_id).get(field_paths=fields)
+        return doc.to_dict() if doc.exists else None
+    
+    def set(self, collection, doc_id, data, merge=False):
+        self._ref(collection, doc_id).set(self._to_firestore(data), merge=merge)
+    
+    def update(self, collection, doc_id, data):
+        try:
+            self._ref(collection, doc_id).update(self._to_firestore(data))
+        except google_exceptions.NotFound:
+            raise DocumentNotFound(f"{collection}/{doc_id}")
+    
+    def add(self, collection, data):
+        _, doc_ref = self.db.collection(collection).add(self._to_firestore(data))
+        return doc_ref.id
+    
+    def query(self, collection, filters=(), order_by=None, descending=False, limit=None, start_after=None, fields=None, id_field=None):
+        collection_ref = self.db.collection(collection)
+        query = collection_ref
+        for field, op, value in filters:
+            query = query.where(field, op, value)
+        if order_by:
+            query = query.order_by(order_by, direction=firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING)
+        if fields is not None:
+            query = query.select(fields)
+        if start_after:
+            cursor_snapshot = collection_ref.document(start_after).get(field_paths=[order_by] if order_by else [])
+            if not cursor_snapshot.exists:
+                return []
+            query = query.start_after(cursor_snapshot)
+        if limit:
+            query = query.limit(limit)
+        return [project(doc.to_dict(), None, doc.id, id_field) for doc in query.stream()]
+    
+    def ids(self, collection):
+        return [doc.id for doc in self.db.collection(collection).select([]).stream()]
+    
+    def append(self, collection, doc_id, subcollection, items, parent_update=None):
+        parent_ref = self._ref(collection, doc_id)
+        batch = self.db.batch()
+        # Nanosecond sequence keeps insertion order across processes
+        seq = time.time_ns()
+        for offset, item in enumerate(items):
+            batch.set(parent_ref.collection(subcollection).document(), dict(item, seq=seq + offset))
+        if parent_update:
+            batch.update(parent_ref, self._to_firestore(parent_update))
+        batch.commit()
+    
+    def list_appended(self, collection, doc_id, subcollection):
+        items = []
+        for doc in self._ref(collection, doc_id).collection(subcollection).order_by('seq').stream():
+            item = doc.to_dict()
+            item.pop('seq', None)
+            items.append(item)
+        return items
+    
+    def run_transaction(self, fn):
+        return firestore.transactional(
+            lambda transaction: fn(_FirestoreTransaction(self, transaction))
+        )(self.db.transaction())
+    
+    def apply_batch(self, writes):
+        if len(writes) > MAX_BATCH_WRITES:
+            raise ValueError(f"A batch holds at most {MAX_BATCH_WRITES} writes")
+        batch = self.db.batch()
+        results = []
+        for write in writes:
+            data = self._to_firestore(write.data)
+            if write.kind == 'add':
+                doc_ref = self.db.collection(write.collection).document()
+                batch.create(doc_ref, data)
+                results.append(doc_ref.id)
+                continue
+            doc_ref = self._ref(write.collection, write.doc_id)
+            if write.kind == 'set':
+                batch.set(doc_ref, data, merge=write.merge)
+            else:
+                batch.update(doc_ref, data)
+            results.append(None)
+        try:
+            batch.commit()
+        except google_exceptions.NotFound as e:
+            raise DocumentNotFound(str(e))
+        return results
+
+class _FirestoreTransaction:
+    """Reads and staged writes inside a Firestore transaction (reads must come first)"""
+    def __init__(self, backend, transaction):
+        self._backend = backend
+        self._transaction = transaction
+    
+    def get(self, collection, doc_id):
+        doc = self._backend._ref(collection, doc_id).get(transaction=self._transaction)
+        return doc.to_dict() if doc.exists else None
+    
+    def set(self, collection, doc_id, data, merge=False):
+        self._transaction.set(self._backend._ref(collection, doc_id), self._backend._to_firestore(data), merge=merge)
+    
+    def update(self, collection, doc_id, data):
+        self._transaction.update(self._backend._ref(collection, doc_id), self._backend._to_firestore(data))
+    
+    def append(self, collection, doc_id, subcollection, items, parent_update=None):
+        parent_ref = self._backend._ref(collection, doc_id)
+        seq = time.time_ns()
+        for offset, item in enumerate(items):
+            self._transaction.set(parent_ref.collection(subcollection).document(), dict(item, seq=seq + offset))
+        if parent_update:
+            self._transaction.update(parent_ref, self._backend._to_firestore(parent_update))
+
+class SQLiteBackend(StorageBackend):
+    """Embedded SQLite store in WAL mode with one connection per thread.
+    
+    Documents are JSON in a single table; an expression index on
+    (collection, user_id, started_at) serves per-user session listings.
+    """
+    name = 'sqlite'
+    
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS documents (
+            collection TEXT NOT NULL,
+            id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (collection, id)
+        )''',
+        '''CREATE INDEX IF NOT EXISTS documents_user_started
+            ON documents (collection, json_extract(data, '$.user_id'), json_extract(data, '$.started_at'))''',
+        '''CREATE TABLE IF NOT EXISTS appended (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            collection TEXT NOT NULL,
+            doc_id TEXT NOT NULL,
+            subcollection TEXT NOT NULL,
+            data TEXT NOT NULL
+        )''',
+        '''CREATE INDEX IF NOT EXISTS appended_parent
+            ON appended (collection, doc_id, subcollection, seq)'''
+    ]
+    
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+    
+    def _connection(self):
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; multi-statement writes use explicit BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+    
+    def _write_transaction(self):
+        """Context manager holding the database write lock for a read-modify-write"""
+        return _SQLiteWriteTransaction(self._connection())
+    
+    def _encode(self, data):
+        return serialization.dumps(data).decode('utf-8')
+    
+    def _read(self, conn, collection, doc_id):
+        row = conn.execute('SELECT data FROM documents WHERE collection = ? AND id = ?', (collection, doc_id)).fetchone()
+        return serialization.loads(row[0]) if row else None
+    
+    def _write(self, conn, collection, doc_id, document):
+        conn.execute(
+            'INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)',
+            (collection, doc_id, self._encode(document))
+        )
+    
+    def get(self, collection, doc_id, fields=None):
+        document = self._read(self._connection(), collection, doc_id)
+        return project(document, fields) if document is not None else None
+    
+    def set(self, collection, doc_id, data, merge=False):
+        with self._write_transaction() as conn:
+            document = (self._read(conn, collection, doc_id) or {}) if merge else {}
+            self._write(conn, collection, doc_id, apply_merge(document, data))
+    
+    def update(self, collection, doc_id, data):
+        with self._write_transaction() as conn:
+            document = self._read(conn, collection, doc_id)
+            if document is None:
+                raise DocumentNotFound(f"{collection}/{doc_id}")
+            self._write(conn, collection, doc_id, apply_update(document, data))
+    
+    def add(self, collection, data):
+        doc_id = uuid.uuid4().hex
+        self.set(collection, doc_id, data)
+        return doc_id
+    
+    def query(self, collection, filters=(), order_by=None, descending=False, limit=None, start_after=None, fields=None, id_field=None):
+        conn = self._connection()
+        sql = 'SELECT id, data FROM documents WHERE collection = ?'
+        params = [collection]
+        for field, op, value in filters:
+            if op != '==':
+                raise ValueError(f"Unsupported query operator: {op}")
+            sql += f" AND json_extract(data, '$.{field}') = ?"
+            params.append(value)
+        
+        order_expr = f"json_extract(data, '$.{order_by}')" if order_by else 'id'
+        direction = 'DESC' if descending else 'ASC'
+        if start_after:
+            row = conn.execute(
+                f'SELECT {order_expr} FROM documents WHERE collection = ? AND id = ?', (collection, start_after)
+            ).fetchone()
+            if row is None:
+                return []
+            comparison = '<' if descending else '>'
+            sql += f' AND ({order_expr} {comparison} ? OR ({order_expr} = ? AND id {comparison} ?))'
+            params.extend([row[0], row[0], start_after])
+        sql += f' ORDER BY {order_expr} {direction}, id {direction}'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [project(serialization.loads(data), fields, doc_id, id_field) for doc_id, data in conn.execute(sql, params)]
+    
+    def ids(self, collection):
+        return [row[0] for row in self._connection().execute('SELECT id FROM documents WHERE collection = ?', (collection,))]
+    
+    def append(self, collection, doc_id, subcollection, items, parent_update=None):
+        with self._write_transaction() as conn:
+            conn.executemany(
+                'INSERT INTO appended (collection, doc_id, subcollection, data) VALUES (?, ?, ?, ?)',
+                [(collection, doc_id, subcollection, self._encode(item)) for item in items]
+            )
+            if parent_update:
+                document = self._read(conn, collection, doc_id)
+                if document is None:
+                    raise DocumentNotFound(f"{collection}/{doc_id}")
+                self._write(conn, collection, doc_id, apply_update(document, parent_update))
+    
+    def list_appended(self, collection, doc_id, subcollection):
+        rows = self._connection().execute(
+            'SELECT data FROM appended WHERE collection = ? AND doc_id = ? AND subcollection = ? ORDER BY seq',
+            (collection, doc_id, subcollection)
+        )
+        return [serialization.loads(row[0]) for row in rows]
+    
+    def run_transaction(self, fn):
+        with self._write_transaction() as conn:
+            return fn(_SQLiteTransaction(self, conn))
+    
+    def apply_batch(self, writes):
+        results = []
+        with self._write_transaction() as conn:
+            transaction = _SQLiteTransaction(self, conn)
+            for write in writes:
+                if write.kind == 'add':
+                    doc_id = uuid.uuid4().hex
+                    transaction.set(write.collection, doc_id, write.data)
+                    results.append(doc_id)
+                elif write.kind == 'set':
+                    transaction.set(write.collection, write.doc_id, write.data, merge=write.merge)
+                    results.append(None)
+                else:
+                    transaction.update(write.collection, write.doc_id, write.data)
+                    results.append(None)
+        return results
+    
+    def import_json_directory(self, root):
+        """Import documents from the legacy one-JSON-file-per-document local storage"""
+        directories = {'users': USERS, 'sessions': SESSIONS, 'feedback': FEEDBACK, 'aggregates': AGGREGATES}
+        imported = 0
+        with self._write_transaction() as conn:
+            for directory, collection in directories.items():
+                path = os.path.join(root, directory)
+                if not os.path.isdir(path):
+                    continue
+                for file_name in sorted(os.listdir(path)):
+                    file_path = os.path.join(path, file_name)
+                    if file_name.endswith('.responses.jsonl'):
+                        with open(file_path, 'r') as f:
+                            items = [line for line in (l.strip() for l in f) if line]
+                        conn.executemany(
+                            'INSERT INTO appended (collection, doc_id, subcollection, data) VALUES (?, ?, ?, ?)',
+                            [(collection, file_name[:-len('.responses.jsonl')], 'responses', item) for item in items]
+                        )
+                    elif file_name.endswith('.json'):
+                        with open(file_path, 'r') as f:
+                            self._write(conn, collection, file_name[:-len('.json')], json.load(f))
+                        imported += 1
+        logging.info(f"Imported {imported} documents from {root}")
+        return imported
+
+class _SQLiteWriteTransaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK; joins an enclosing transaction instead of nesting"""
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def __enter__(self):
+        self.nested = self.conn.in_transaction
+        if not self.nested:
+            self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+    
+    def __exit__(self, exc_type, exc, tb):
+        if not self.nested:
+            self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+class _SQLiteTransaction:
+    """Reads and writes on a connection that already holds the write lock"""
+    def __init__(self, backend, conn):
+        self._backend = backend
+        self._conn = conn
+    
+    def get(self, collection, doc_id):
+        return self._backend._read(self._conn, collection, doc_id)
+    
+    def set(self, collection, doc_id, data, merge=False):
+        document = (self._backend._read(self._conn, collection, doc_id) or {}) if merge else {}
+        self._backend._write(self._conn, collection, doc_id, apply_merge(document, data))
+    
+    def update(self, collection, doc_id, data):
+        document = self._backend._read(self._conn, collection, doc_id)
+        if document is None:
+            raise DocumentNotFound(f"{collection}/{doc_id}")
+        self._backend._write(self._conn, collection, doc_id, apply_update(document, data))
+
+    def append(self, collection, doc_id, subcollection, items, parent_update=None):
+        # Joins the enclosing BEGIN IMMEDIATE
+        self._backend.append(collection, doc_id, subcollection, items, parent_update)
+
+class MemoryBackend(StorageBackend):
+    """Thread-safe in-process store with Firestore's semantics, for load tests and benchmarks.
+    
+    Every call counts as one storage round trip (reads inside a transaction
+    count individually, its writes as a single commit). latency seconds are
+    slept per round trip, outside the lock, to approximate a remote database.
+    
+    Transactions are optimistic like Firestore's: each document carries a
+    version bumped by every write, a transaction remembers the versions it
+    read, and its commit re-checks them under the lock, running fn again
+    if another write got in between. Only transactions touching the same
+    documents contend; after MAX_TRANSACTION_ATTEMPTS lost races the last
+    attempt holds the lock.
+    """
+    name = 'memory'
+    MAX_TRANSACTION_ATTEMPTS = 5
+    
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._documents = {}
+        self._appended = {}
+        # (collection, doc_id) -> number of writes so far
+        self._versions = Counter()
+        self._lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+        self.round_trips = Counter()
+    
+    def _round_trip(self, operation):
+        with self._stats_lock:
+            self.round_trips[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+    
+    def reset_stats(self):
+        """Zero the round-trip counters and return the previous values"""
+        with self._stats_lock:
+            stats, self.round_trips = self.round_trips, Counter()
+        return stats
+    
+    def _collection(self, collection):
+        return self._documents.setdefault(collection, {})
+    
+    def _touch(self, collection, doc_id):
+        # Called with the lock held by every write
+        self._versions[(collection, doc_id)] += 1
+    
+    def get(self, collection, doc_id, fields=None):
+        self._round_trip('get')
+        with self._lock:
+            document = self._collection(collection).get(doc_id)
+            return project(copy.deepcopy(document), fields) if document is not None else None
+    
+    def set(self, collection, doc_id, data, merge=False):
+        self._round_trip('set')
+        with self._lock:
+            documents = self._collection(collection)
+            document = documents.get(doc_id, {}) if merge else {}
+            documents[doc_id] = apply_merge(document, data)
+            self._touch(collection, doc_id)
+    
+    def update(self, collection, doc_id, data):
+        self._round_trip('update')
+        with self._lock:
+            document = self._collection(collection).get(doc_id)
+            if document is None:
+                raise DocumentNotFound(f"{collection}/{doc_id}")
+            apply_update(document, data)
+            self._touch(collection, doc_id)
+    
+    def add(self, collection, data):
+        self._round_trip('add')
+        doc_id = uuid.uuid4().hex
+        with self._lock:
+            self._collection(collection)[doc_id] = apply_merge({}, data)
+            self._touch(collection, doc_id)
+        return doc_id
+    
+    def query(self, collection, filters=(), order_by=None, descending=False, limit=None, start_after=None, fields=None, id_field=None):
+        self._round_trip('query')
+        with self._lock:
+            documents = self._collection(collection)
+            matches = [
+                (doc_id, document) for doc_id, document in documents.items()
+                if all(self._matches(document, filter_) for filter_ in filters)
+                # Like Firestore, ordering by a field excludes documents without it
+                and (order_by is None or order_by in document)
+            ]
+            
+            def sort_key(item):
+                return (item[1][order_by], item[0]) if order_by else item[0]
+            
+            matches.sort(key=sort_key, reverse=descending)
+            if start_after:
+                if start_after not in documents:
+                    return []
+                cursor_key = sort_key((start_after, documents[start_after]))
+                matches = [item for item in matches if (sort_key(item) < cursor_key if descending else sort_key(item) > cursor_key)]
+            if limit:
+                matches = matches[:limit]
+            return [project(copy.deepcopy(document), fields, doc_id, id_field) for doc_id, document in matches]
+    
+    def _matches(self, document, filter_):
+        field, op, value = filter_
+        if op != '==':
+            raise ValueError(f"Unsupported query operator: {op}")
+        return document.get(field) == value
+    
+    def ids(self, collection):
+        self._round_trip('query')
+        with self._lock:
+            return list(self._collection(collection))
+    
+    def append(self, collection, doc_id, subcollection, items, parent_update=None):
+        self._round_trip('append')
+        with self._lock:
+            self._append(collection, doc_id, subcollection, copy.deepcopy(items), parent_update)
+    
+    def _append(self, collection, doc_id, subcollection, items, parent_update):
+        document = self._collection(collection).get(doc_id)
+        if parent_update and document is None:
+            raise DocumentNotFound(f"{collection}/{doc_id}")
+        self._appended.setdefault((collection, doc_id, subcollection), []).extend(items)
+        if parent_update:
+            apply_update(document, parent_update)
+            self._touch(collection, doc_id)
+    
+    def list_appended(self, collection, doc_id, subcollection):
+        self._round_trip('query')
+        with self._lock:
+            return copy.deepcopy(self._appended.get((collection, doc_id, subcollection), []))
+    
+    def apply_batch(self, writes):
+        self._round_trip('batch')
+        with self._lock:
+            return self._apply_writes(writes)
+            
+    def _apply_writes(self, writes, appends=()):
+        """Apply Writes and (collection, doc_id, subcollection, items, parent_update) appends; lock held"""
+        # Validate first so a failing batch changes nothing
+        created = set()
+        for write in writes:
+            if write.kind == 'update' and write.doc_id not in self._collection(write.collection) and (write.collection, write.doc_id) not in created:
+                raise DocumentNotFound(f"{write.collection}/{write.doc_id}")
+            if write.kind == 'set':
+                created.add((write.collection, write.doc_id))
+        for collection, doc_id, _, _, parent_update in appends:
+            if parent_update and doc_id not in self._collection(collection) and (collection, doc_id) not in created:
+                raise DocumentNotFound(f"{collection}/{doc_id}")
+        
+        results = []
+        for write in writes:
+            documents = self._collection(write.collection)
+            if write.kind == 'add':
+                doc_id = uuid.uuid4().hex
+                documents[doc_id] = apply_merge({}, write.data)
+                self._touch(write.collection, doc_id)
+                results.append(doc_id)
+                continue
+            if write.kind == 'set':
+                documents[write.doc_id] = apply_merge(documents.get(write.doc_id, {}) if write.merge else {}, write.data)
+            else:
+                apply_update(documents[write.doc_id], write.data)
+            self._touch(write.collection, write.doc_id)
+            results.append(None)
+        for append in appends:
+            self._append(*append)
+        return results
+    
+    def run_transaction(self, fn):
+        # fn, its reads and the commit's round trip run without the lock;
+        # only validating and applying the commit holds it
+        for _ in range(self.MAX_TRANSACTION_ATTEMPTS):
+            transaction = _MemoryTransaction(self)
+            result = fn(transaction)
+            if not transaction.staged():
+                return result
+            self._round_trip('commit')
+            with self._lock:
+                if any(self._versions[key] != version for key, version in transaction.reads.items()):
+                    continue
+                self._apply_writes(transaction.writes, transaction.appends)
+            return result
+        
+        # Still losing after every attempt: run once more holding the lock, so
+        # a hot document slows a load test down instead of failing it
+        with self._lock:
+            transaction = _MemoryTransaction(self)
+            result = fn(transaction)
+            self._apply_writes(transaction.writes, transaction.appends)
+        if transaction.staged():
+            self._round_trip('commit')
+        return result
+
+class _MemoryTransaction:
+    """Reads record the version they saw; writes are staged and applied on commit"""
+    def __init__(self, backend):
+        self._backend = backend
+        self.reads = {}
+        self.writes = []
+        self.appends = []
+    
+    def get(self, collection, doc_id):
+        self._backend._round_trip('get')
+        with self._backend._lock:
+            self.reads[(collection, doc_id)] = self._backend._versions[(collection, doc_id)]
+            document = self._backend._collection(collection).get(doc_id)
+            return copy.deepcopy(document) if document is not None else None
+    
+    def set(self, collection, doc_id, data, merge=False):
+        self.writes.append(Write('set', collection, doc_id, copy.deepcopy(data), merge))
+    
+    def update(self, collection, doc_id, data):
+        self.writes.append(Write('update', collection, doc_id, copy.deepcopy(data)))
+
+    def append(self, collection, doc_id, subcollection, items, parent_update=None):
+        self.appends.append((collection, doc_id, subcollection, copy.deepcopy(items), copy.deepcopy(parent_update)))
+    
+    def staged(self):
+        return bool(self.writes or self.appends)
+
+def create_storage_backend(config, db=None):
+    """Pick the storage backend from STORAGE_BACKEND ('auto', 'firestore', 'sqlite' or 'memory')"""
+    backend = config.get('STORAGE_BACKEND') or 'auto'
+    if backend == 'auto':
+        backend = 'firestore' if db else 'sqlite'
+    
+    if backend == 'firestore':
+        if not db:
+            raise ValueError("STORAGE_BACKEND=firestore requires Firebase to be initialized")
+        return FirestoreBackend(db)
+    if backend == 'sqlite':
+        return SQLiteBackend(config.get('SQLITE_PATH') or os.path.join('local_storage', 'skillbuddy.db'))
+    if backend == 'memory':
+        return MemoryBackend(latency=float(config.get('STORAGE_LATENCY_MS') or 0) / 1000)
+    raise ValueError(f"Unknown storage backend: {backend}")
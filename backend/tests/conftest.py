@@ -0,0 +1,15 @@
+"""Shared fixtures: the app on in-memory storage, so no Firebase project is needed."""
+import pytest
+
+from app import create_app
+from storage import MemoryBackend
+
+
+@pytest.fixture
+def app():
+    return create_app(storage=MemoryBackend())
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,45 @@
+"""The question catalogue is served pre-serialized, with ETags clients can revalidate against."""
+from catalogue import QuestionCatalogue
+
+CAREER_PATH = 'SoftwareDev'
+QUESTIONS_URL = f'/api/interview/questions/{CAREER_PATH}'
+
+
+def test_catalogue_has_an_etag_and_revalidates_to_304(client):
+    response = client.get(QUESTIONS_URL)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    body = response.get_json()
+    assert body['total'] == len(body['questions']) > 0
+    assert response.cache_control.max_age > 0
+    
+    revalidated = client.get(QUESTIONS_URL, headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert client.get(QUESTIONS_URL, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_unknown_career_path_is_rejected(client):
+    assert client.get('/api/interview/questions/Astronaut').status_code == 400
+
+
+def test_start_skips_questions_the_client_already_has(client):
+    version = client.get(QUESTIONS_URL).get_json()['catalogue_version']
+    
+    fresh = client.post('/api/interview/start', json={'career_path': CAREER_PATH}).get_json()
+    cached = client.post('/api/interview/start', json={'career_path': CAREER_PATH, 'catalogue_version': version}).get_json()
+    
+    assert fresh['questions_included'] and fresh['questions']
+    assert not cached['questions_included'] and 'questions' not in cached
+    assert cached['catalogue_version'] == version
+
+
+def test_changed_questions_change_version_and_etag():
+    question = {'id': 1, 'question': 'Why?', 'category': 'General', 'difficulty': 'beginner'}
+    catalogue = QuestionCatalogue({'Test': [question]})
+    version, etag = catalogue.version, catalogue.get('Test').etag
+    
+    catalogue.load({'Test': [dict(question, question='Why not?')]})
+    
+    assert catalogue.version != version
+    assert catalogue.get('Test').etag != etag
@@ -0,0 +1,53 @@
+"""Large responses are compressed for clients that accept it; ETagged ones keep a weak tag."""
+import gzip
+
+import pytest
+
+import compression
+from compression import ResponseCompressor
+
+QUESTIONS_URL = '/api/interview/questions/SoftwareDev'
+
+
+def test_choose_encoding_follows_accept_encoding():
+    compressor = ResponseCompressor()
+    assert compressor.choose_encoding('gzip') == 'gzip'
+    assert compressor.choose_encoding('gzip;q=0') is None
+    assert compressor.choose_encoding('identity') is None
+    assert compressor.choose_encoding(None) is None
+    assert compressor.choose_encoding('br;q=0.5, gzip') == 'gzip'
+    if compression.brotli:
+        assert compressor.choose_encoding('gzip, br') == 'br'
+        assert compressor.choose_encoding('*') == 'br'
+
+
+def test_gzip_body_gets_a_weak_etag_that_still_revalidates(client):
+    plain = client.get(QUESTIONS_URL)
+    compressed = client.get(QUESTIONS_URL, headers={'Accept-Encoding': 'gzip'})
+    
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert len(compressed.data) < len(plain.data)
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    
+    tag, weak = compressed.get_etag()
+    assert weak and not plain.get_etag()[1]
+    assert tag == plain.get_etag()[0]
+    
+    revalidated = client.get(QUESTIONS_URL, headers={'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="Brotli is not installed")
+def test_brotli_is_preferred_when_accepted(client):
+    response = client.get(QUESTIONS_URL, headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert compression.brotli.decompress(response.data) == client.get(QUESTIONS_URL).data
+
+
+def test_small_responses_are_left_alone(client):
+    response = client.get('/api/user/leaderboard/nobody', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 404
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json()
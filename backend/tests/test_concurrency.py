@@ -0,0 +1,82 @@
+"""Writes that race must not lose updates.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import threading
+
+import pytest
+
+from coalescer import CoalescingBackend
+from services import InterviewService, UserService
+from storage import SESSIONS, Increment, MemoryBackend, SQLiteBackend
+
+CAREER_PATH = 'SoftwareDev'
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend(latency=0.002)
+    return SQLiteBackend(str(tmp_path / 'race.db'))
+
+
+def run_concurrently(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_xp_awards_are_all_counted(storage):
+    user_service = UserService(storage)
+    interview_service = InterviewService(storage)
+    user_service.create_user('u1', 'u1@example.com')
+    start_xp = user_service.get_user('u1')['xp_points']
+    session_ids = [interview_service.create_session('u1', CAREER_PATH).session_id for _ in range(10)]
+    
+    completed = []
+    run_concurrently(
+        [lambda: user_service.add_xp_to_user('u1', 10, 'Test') for _ in range(40)]
+        + [lambda session_id=session_id: completed.append(interview_service.complete_session(session_id, user_service)) for session_id in session_ids]
+    )
+    
+    assert all(completed) and len(completed) == 10
+    user_service.invalidate_user('u1')
+    user = user_service.get_user('u1')
+    assert user['xp_points'] == start_xp + 40 * 10 + sum(session['xp_earned'] for session in completed)
+    assert user['completed_interviews'] == 10
+
+
+def test_coalesced_increments_are_all_applied():
+    backend = MemoryBackend(latency=0.002)
+    storage = CoalescingBackend(backend)
+    storage.set('counters', 'c1', {'n': 0})
+    
+    run_concurrently([lambda: storage.update('counters', 'c1', {'n': Increment(1)}) for _ in range(200)])
+    
+    assert backend.get('counters', 'c1')['n'] == 200
+    stats = storage.coalescer.stats()
+    assert stats['writes'] == 201
+    # Concurrent writes shared commits
+    assert stats['batches'] < stats['writes']
+
+
+def test_overlapping_retries_of_a_batch_are_appended_once(storage):
+    interview_service = InterviewService(storage)
+    session_id = interview_service.create_session('u1', CAREER_PATH).session_id
+    responses = [{'question_id': question_id, 'response': 'An answer'} for question_id in range(1, 4)]
+    
+    run_concurrently(
+        [lambda: interview_service.submit_batch(session_id, responses, batch_id='A') for _ in range(4)]
+        + [lambda batch_id=batch_id: interview_service.submit_batch(session_id, responses, batch_id=batch_id) for batch_id in 'BC']
+    )
+    
+    assert len(storage.list_appended(SESSIONS, session_id, 'responses')) == 3 * 3
+    session_data = storage.get(SESSIONS, session_id)
+    assert session_data['questions_answered'] == 9
+    assert sorted(session_data['batch_ids']) == ['A', 'B', 'C']
+    # Batch ids are bookkeeping, not part of the session clients see
+    assert 'batch_ids' not in interview_service.get_session(session_id)
@@ -0,0 +1,41 @@
+"""fields= masks trim responses to the values a client renders."""
+from fieldmask import apply_mask, parse_fields, subtree, wants
+
+
+def test_parse_fields_builds_a_tree():
+    assert parse_fields(None) is None
+    assert parse_fields('') is None
+    assert parse_fields('user_id, user_data.xp_points,user_data.level') == {'user_id': {}, 'user_data': {'xp_points': {}, 'level': {}}}
+    # A shorter path already selects the whole value
+    assert parse_fields('user_data,user_data.level') == {'user_data': {}}
+    assert parse_fields('a..b,,') == {'a': {'b': {}}}
+
+
+def test_apply_mask_keeps_selected_fields_of_dicts_and_list_items():
+    value = {
+        'user_id': 'u1',
+        'user_data': {'xp_points': 50, 'level': 1, 'email': 'u1@example.com'},
+        'sessions': [{'session_id': 's1', 'status': 'completed'}, {'session_id': 's2', 'status': 'active'}]
+    }
+    
+    assert apply_mask(value, None) is value
+    assert apply_mask(value, parse_fields('user_data.level,sessions.session_id,missing')) == {
+        'user_data': {'level': 1},
+        'sessions': [{'session_id': 's1'}, {'session_id': 's2'}]
+    }
+    tree = parse_fields('session_data.status')
+    assert wants(tree, 'session_data') and not wants(tree, 'xp_earned') and wants(None, 'anything')
+    assert subtree(tree, 'session_data') == {'status': {}}
+    assert subtree(parse_fields('session_data'), 'session_data') is None
+
+
+def test_endpoints_apply_the_mask(client):
+    client.post('/api/auth/register', json={'email': 'mask@example.com', 'password': 'secret123'})
+    login = client.post('/api/auth/login?fields=user_id,user_data.xp_points', json={'email': 'mask@example.com', 'password': 'secret123'})
+    assert login.get_json() == {'user_id': 'mask_example_com', 'user_data': {'xp_points': 50}}
+    
+    session_id = client.post('/api/interview/start', json={'user_id': 'mask_example_com', 'career_path': 'SoftwareDev'}).get_json()['session_id']
+    client.post('/api/interview/response', json={'session_id': session_id, 'question_id': 1, 'response': 'An answer'})
+    ended = client.post('/api/interview/end?fields=xp_earned,session_data.status', json={'session_id': session_id}).get_json()
+    assert set(ended) == {'xp_earned', 'session_data'}
+    assert ended['session_data'] == {'status': 'completed'}
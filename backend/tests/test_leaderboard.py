@@ -0,0 +1,93 @@
+"""Ranks come from in-memory sorted boards; sharded snapshots share them between workers."""
+import leaderboard
+from leaderboard import SHARD_INDEX, LeaderboardService, RankIndex, shard_id
+from storage import LEADERBOARDS, USERS, MemoryBackend
+
+
+def test_rank_index_orders_by_score_and_shares_ties():
+    index = RankIndex()
+    for uid, score in (('a', 10), ('b', 20), ('c', 20), ('d', 5)):
+        index.set(uid, score)
+    
+    assert [index.rank(uid) for uid in 'abcd'] == [3, 1, 1, 4]
+    assert index.page(0, 4) == [(1, 'b', 20), (1, 'c', 20), (3, 'a', 10), (4, 'd', 5)]
+    assert not index.set('a', 10)
+    index.set('d', 30)
+    assert index.rank('d') == 1 and index.rank('a') == 4
+    assert index.rank('nobody') is None
+
+
+def test_global_and_career_boards_with_neighbors():
+    service = LeaderboardService(MemoryBackend())
+    for position in range(10):
+        service.record(f'u{position}', {
+            'first_name': 'User',
+            'last_name': f'{position}',
+            'xp_points': position * 100,
+            'xp_by_career': {'SoftwareDev': position * 10} if position % 2 else {}
+        })
+    
+    top = service.top(limit=3)
+    assert [entry['user_id'] for entry in top['entries']] == ['u9', 'u8', 'u7']
+    assert top['total'] == 10 and top['entries'][0]['name'] == 'User 9'
+    assert service.top('SoftwareDev')['total'] == 5
+    
+    rank = service.rank('u5', radius=1)
+    assert rank['rank'] == 5 and rank['percentile'] == 50.0
+    assert [neighbor['user_id'] for neighbor in rank['neighbors']] == ['u6', 'u5', 'u4']
+    assert service.rank('u5', 'SoftwareDev')['rank'] == 3
+    assert service.rank('u4', 'SoftwareDev') is None
+
+
+def test_sync_rereads_only_the_shards_that_changed():
+    storage = MemoryBackend()
+    writer = LeaderboardService(storage, shards=4)
+    reader = LeaderboardService(storage, shards=4)
+    for position in range(40):
+        writer.record(f'u{position}', {'xp_points': position})
+    writer.sync()
+    
+    reader.sync()
+    assert reader.top()['total'] == 40
+    assert len(storage.get(LEADERBOARDS, SHARD_INDEX)['shards']) == 4
+    
+    writer.record('u0', {'xp_points': 1000})
+    writer.sync()
+    storage.reset_stats()
+    reader.sync()
+    
+    # The index plus the one shard holding u0
+    assert storage.reset_stats()['get'] == 2
+    assert reader.rank('u0')['rank'] == 1
+    
+    reader.sync()
+    assert storage.reset_stats()['get'] == 1
+    assert storage.get(LEADERBOARDS, shard_id('global', 'u0', 4))['scores']['u0'] == 1000
+
+
+def test_cold_start_scans_users_by_document_id(monkeypatch):
+    monkeypatch.setattr(leaderboard, 'SCAN_PAGE_SIZE', 3)
+    storage = MemoryBackend()
+    for position in range(8):
+        user_data = {'first_name': 'User', 'xp_points': position * 10}
+        if position % 2:
+            user_data['uid'] = f'u{position}'
+        storage.set(USERS, f'u{position}', user_data)
+    
+    service = LeaderboardService(storage).load()
+    
+    assert service.top()['total'] == 8
+    assert service.rank('u7')['rank'] == 1 and service.rank('u0')['rank'] == 8
+    # The scan writes snapshots, so the next worker starts from them
+    assert LeaderboardService(storage).load().top()['total'] == 8
+
+
+def test_leaderboard_endpoints(client):
+    for position in range(3):
+        client.post('/api/auth/register', json={'email': f'rank{position}@example.com', 'password': 'secret123', 'temporaryXP': position * 100})
+    
+    board = client.get('/api/user/leaderboard?limit=2').get_json()
+    assert board['total'] == 3 and len(board['entries']) == 2
+    leader = board['entries'][0]['user_id']
+    assert client.get(f'/api/user/leaderboard/{leader}').get_json()['rank'] == 1
+    assert client.get('/api/user/leaderboard/nobody').status_code == 404
@@ -0,0 +1,54 @@
+"""Request latency, storage call counts and sampled profiles, rendered for Prometheus on /metrics."""
+import os
+
+from metrics import Metrics, RequestProfiler
+
+
+def metric_lines(client, name):
+    return [line for line in client.get('/metrics').get_data(as_text=True).splitlines() if line.startswith(f'skillbuddy_{name}')]
+
+
+def test_histograms_render_cumulative_buckets():
+    metrics = Metrics()
+    for value in (0.0005, 0.003, 0.003, 20.0):
+        metrics.observe('request_duration_seconds', ('interview', 'interview.start', 'POST', '201'), value)
+    metrics.inc('storage_calls_total', ('background', 'memory', 'get', 'users'), 2)
+    
+    lines = metrics.render().splitlines()
+    labels = 'blueprint="interview",endpoint="interview.start",method="POST",status="201"'
+    assert f'skillbuddy_request_duration_seconds_bucket{{{labels},le="0.001"}} 1' in lines
+    assert f'skillbuddy_request_duration_seconds_bucket{{{labels},le="0.005"}} 3' in lines
+    assert f'skillbuddy_request_duration_seconds_bucket{{{labels},le="10.0"}} 3' in lines
+    assert f'skillbuddy_request_duration_seconds_bucket{{{labels},le="+Inf"}} 4' in lines
+    assert f'skillbuddy_request_duration_seconds_count{{{labels}}} 4' in lines
+    assert 'skillbuddy_storage_calls_total{endpoint="background",backend="memory",operation="get",collection="users"} 2' in lines
+    assert '# TYPE skillbuddy_request_duration_seconds histogram' in lines
+
+
+def test_requests_and_their_storage_calls_are_counted(client):
+    client.post('/api/auth/register', json={'email': 'metrics@example.com', 'password': 'secret123'})
+    client.get('/api/interview/questions/SoftwareDev')
+    client.get('/api/interview/questions/SoftwareDev')
+    
+    durations = metric_lines(client, 'request_duration_seconds_count')
+    assert 'skillbuddy_request_duration_seconds_count{blueprint="interview",endpoint="interview.get_questions",method="GET",status="200"} 2' in durations
+    assert any('endpoint="auth.register"' in line for line in durations)
+    # Registering reads and writes the user; the catalogue is served without storage calls
+    assert any('endpoint="auth.register"' in line for line in metric_lines(client, 'storage_calls_total'))
+    assert 'skillbuddy_request_storage_calls_bucket{endpoint="interview.get_questions",le="0"} 2' in metric_lines(client, 'request_storage_calls_bucket')
+
+
+def test_slow_sampled_requests_are_profiled(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), sample_rate=1.0, threshold=0.0)
+    
+    running = profiler.start()
+    assert running is not None
+    sum(range(1000))
+    path = profiler.finish(running, 'interview.start', 0.25)
+    
+    assert path and os.path.dirname(path) == str(tmp_path) and os.path.getsize(path) > 0
+    # Fast requests are not written; with sampling off nothing is profiled
+    strict = RequestProfiler(str(tmp_path), sample_rate=1.0, threshold=1.0)
+    assert strict.finish(strict.start(), 'interview.start', 0.01) is None
+    assert RequestProfiler(str(tmp_path), sample_rate=0.0).start() is None
+    assert len(os.listdir(tmp_path)) == 1
@@ -0,0 +1,71 @@
+"""MessagePack request and response bodies, negotiated on Content-Type and Accept."""
+import msgpack
+
+import serialization
+
+MSGPACK = 'application/msgpack'
+ACCEPT_MSGPACK = {'Accept': MSGPACK}
+QUESTIONS_URL = '/api/interview/questions/SoftwareDev'
+
+
+def post_msgpack(client, path, body):
+    return client.post(path, data=msgpack.packb(body, datetime=True), content_type=MSGPACK, headers=ACCEPT_MSGPACK)
+
+
+def test_timestamps_round_trip_as_native_timestamps():
+    payload = {
+        'session_id': 's1',
+        'started_at': '2026-01-02T03:04:05.123456',
+        'responses': [{'question_id': 1, 'timestamp': '2026-01-02T03:05:00'}],
+        'note': '2026-01-02T03:04:05',
+        'completed_at': 'not a date'
+    }
+    body = serialization.packb(payload)
+    
+    raw = msgpack.unpackb(body)
+    assert isinstance(raw['started_at'], msgpack.Timestamp)
+    assert isinstance(raw['responses'][0]['timestamp'], msgpack.Timestamp)
+    # Only the timestamp fields are converted
+    assert raw['note'] == payload['note'] and raw['completed_at'] == 'not a date'
+    assert serialization.unpackb(body) == payload
+    assert serialization.loads(serialization.dumps(payload)) == payload
+
+
+def test_msgpack_requests_and_responses_are_negotiated(client):
+    registered = post_msgpack(client, '/api/auth/register', {'email': 'pack@example.com', 'password': 'secret123'})
+    assert registered.status_code == 201
+    assert registered.mimetype == MSGPACK and 'Accept' in registered.headers['Vary']
+    user_id = serialization.unpackb(registered.data)['user_id']
+    
+    packed = post_msgpack(client, '/api/interview/start', {'user_id': user_id, 'career_path': 'SoftwareDev'})
+    as_json = client.post('/api/interview/start', json={'user_id': user_id, 'career_path': 'SoftwareDev'})
+    assert packed.mimetype == MSGPACK and as_json.mimetype == 'application/json'
+    assert serialization.unpackb(packed.data)['questions'] == as_json.get_json()['questions']
+    # JSON is preferred unless the client ranks MessagePack higher
+    assert client.get(QUESTIONS_URL, headers={'Accept': f'application/json, {MSGPACK};q=0.5'}).mimetype == 'application/json'
+
+
+def test_response_timestamps_survive_the_round_trip(client):
+    user_id = serialization.unpackb(post_msgpack(client, '/api/auth/register', {'email': 'time@example.com', 'password': 'secret123'}).data)['user_id']
+    session_id = serialization.unpackb(post_msgpack(client, '/api/interview/start', {'user_id': user_id, 'career_path': 'SoftwareDev'}).data)['session_id']
+    answered_at = msgpack.Timestamp.from_unix(1700000000)
+    
+    batch = post_msgpack(client, '/api/interview/responses:batch', {
+        'session_id': session_id,
+        'responses': [{'question_id': 2, 'response': 'An answer', 'timestamp': answered_at}]
+    })
+    assert batch.status_code == 200
+    
+    ended = msgpack.unpackb(post_msgpack(client, '/api/interview/end', {'session_id': session_id}).data)
+    assert ended['session_data']['responses'][0]['timestamp'] == answered_at
+    assert isinstance(ended['session_data']['started_at'], msgpack.Timestamp)
+
+
+def test_catalogue_has_a_separate_msgpack_etag(client):
+    as_json = client.get(QUESTIONS_URL)
+    packed = client.get(QUESTIONS_URL, headers=ACCEPT_MSGPACK)
+    
+    assert packed.mimetype == MSGPACK
+    assert serialization.unpackb(packed.data) == as_json.get_json()
+    assert packed.headers['ETag'] != as_json.headers['ETag']
+    assert client.get(QUESTIONS_URL, headers=dict(ACCEPT_MSGPACK, **{'If-None-Match': packed.headers['ETag']})).status_code == 304
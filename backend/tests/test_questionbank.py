@@ -0,0 +1,66 @@
+"""The question bank answers filters from its indexes and reloads when its source changes."""
+import json
+import random
+
+from questionbank import FileQuestionSource, QuestionBank
+
+
+def make_questions():
+    return [
+        {'id': 1, 'question': 'Q1', 'category': 'Algorithms', 'difficulty': 'beginner'},
+        {'id': 2, 'question': 'Q2', 'category': 'Algorithms', 'difficulty': 'advanced'},
+        {'id': 3, 'question': 'Q3', 'category': 'Systems', 'difficulty': 'beginner'},
+        {'id': 4, 'question': 'Q4', 'category': 'Systems', 'difficulty': 'beginner', 'weight': 0},
+        {'id': 5, 'question': 'Q5'}
+    ]
+
+
+def make_bank(tmp_path, questions=None, reload_interval=5.0):
+    path = tmp_path / 'questions.json'
+    path.write_text(json.dumps({'Test': questions if questions is not None else make_questions()}))
+    return QuestionBank(FileQuestionSource(str(path)), reload_interval=reload_interval), path
+
+
+def ids(questions):
+    return sorted(question['id'] for question in questions)
+
+
+def test_filters_by_category_and_difficulty(tmp_path):
+    bank, _ = make_bank(tmp_path)
+    
+    assert ids(bank.questions('Test')) == [1, 2, 3, 4, 5]
+    assert ids(bank.questions('Test', category='Algorithms')) == [1, 2]
+    assert ids(bank.questions('Test', difficulty='beginner')) == [1, 3, 4]
+    assert ids(bank.questions('Test', 'Systems', 'beginner')) == [3, 4]
+    assert bank.questions('Test', 'Networking') == []
+    assert bank.questions('Unknown') == []
+    # Missing fields get the defaults the indexes rely on
+    assert bank.get('Test', 5)['category'] == 'General'
+    assert bank.get('Test', 5)['difficulty'] == 'intermediate'
+    assert bank.categories('Test') == ['Algorithms', 'General', 'Systems']
+
+
+def test_zero_weight_questions_are_never_sampled(tmp_path):
+    bank, _ = make_bank(tmp_path)
+    rng = random.Random(7)
+    
+    assert bank.available('Test', 'Systems', 'beginner') == 1
+    assert bank.size('Test', 'Systems', 'beginner') == 2
+    for _ in range(50):
+        sample = bank.sample('Test', 3, rng=rng)
+        assert len(sample) == 3 and len(set(ids(sample))) == 3
+        assert 4 not in ids(sample)
+    assert ids(bank.sample('Test', 10, exclude=[1, 2], rng=rng)) == [3, 5]
+
+
+def test_reloads_when_the_source_changes(tmp_path):
+    bank, path = make_bank(tmp_path, reload_interval=0)
+    reloaded = []
+    bank.add_listener(reloaded.append)
+    
+    assert not bank.maybe_reload()
+    path.write_text(json.dumps({'Test': make_questions() + [{'id': 6, 'question': 'A new question', 'category': 'Systems'}]}))
+    
+    assert bank.maybe_reload()
+    assert ids(bank.questions('Test', category='Systems')) == [3, 4, 6]
+    assert len(reloaded) == 1 and len(reloaded[0]['Test']) == 6
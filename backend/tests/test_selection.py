@@ -0,0 +1,99 @@
+"""Questions are picked toward the least covered (category, difficulty), in a per-user order of each bucket."""
+import random
+
+from aggregates import AggregateService, coverage_key
+from questionbank import QuestionBank
+from selection import QuestionSelector
+from storage import MemoryBackend
+
+
+class StaticSource:
+    name = 'static'
+    
+    def __init__(self, questions_db):
+        self.questions_db = questions_db
+    
+    def version(self):
+        return 1
+    
+    def load(self):
+        return self.questions_db
+
+
+class StoredAggregates:
+    """Stands in for AggregateService.get with fixed coverage counters"""
+    def __init__(self, coverage):
+        self.coverage = coverage
+    
+    def get(self, uid):
+        return {'coverage': {'Test': self.coverage}}
+
+
+def make_bank(combinations):
+    """Bank of one career path with count questions per (category, difficulty)"""
+    questions, next_id = [], 1
+    for (category, difficulty), count in combinations.items():
+        for _ in range(count):
+            questions.append({'id': next_id, 'question': f"Q{next_id}", 'category': category, 'difficulty': difficulty})
+            next_id += 1
+    return QuestionBank(StaticSource({'Test': questions}))
+
+
+def test_nth_is_a_permutation_of_the_bucket_for_every_seed():
+    for size in (1, 2, 7, 12, 64, 101):
+        bank = make_bank({('A', 'beginner'): size})
+        orders = set()
+        for seed in range(0, 5000, 97):
+            order = tuple(bank.nth('Test', 'A', 'beginner', seed, n)['id'] for n in range(size))
+            assert sorted(order) == list(range(1, size + 1))
+            # The order repeats after a full walk
+            assert bank.nth('Test', 'A', 'beginner', seed, size)['id'] == order[0]
+            orders.add(order)
+        if size > 2:
+            assert len(orders) > 1
+    assert bank.nth('Test', 'Unknown', 'beginner', 1, 0) is None
+
+
+def test_picks_the_least_covered_combination_first():
+    bank = make_bank({('A', 'beginner'): 3, ('B', 'beginner'): 3})
+    selector = QuestionSelector(bank, StoredAggregates({'A|beginner': 5, 'B|beginner': 0}), random.Random(1))
+    
+    planned = selector.plan_session('u1', 'Test', 6)
+    
+    # B is covered least until its three questions are used up, then A follows
+    assert [question['category'] for question in planned] == ['B'] * 3 + ['A'] * 3
+    assert len({question['id'] for question in planned}) == 6
+    assert selector.next_question('u1', 'Test', [question['id'] for question in planned]) is None
+
+
+def test_coverage_is_bounded_by_the_combinations_of_the_bank():
+    bank = make_bank({('A', 'beginner'): 2, ('A', 'advanced'): 2, ('B', 'beginner'): 2})
+    storage = MemoryBackend()
+    aggregates = AggregateService(storage)
+    rng = random.Random(3)
+    for _ in range(200):
+        aggregates.record_responses('u1', 'Test', [rng.choice(bank.combinations('Test')) for _ in range(5)])
+    
+    stored = aggregates.get('u1')['coverage']['Test']
+    assert set(stored) == {coverage_key(category, difficulty) for category, difficulty in bank.combinations('Test')}
+    assert sum(stored.values()) == 1000
+    
+    # Counters of combinations the bank no longer has are ignored
+    aggregates.record_responses('u1', 'Test', [('Retired', 'beginner')])
+    coverage = QuestionSelector(bank, aggregates).coverage('u1', 'Test')
+    assert set(coverage.counts) == set(bank.combinations('Test'))
+
+
+def test_next_question_endpoint_never_repeats_within_a_session(client):
+    session_id = client.post('/api/interview/start', json={'career_path': 'SoftwareDev'}).get_json()['session_id']
+    asked = []
+    while True:
+        body = client.post('/api/interview/next-question', json={'session_id': session_id}).get_json()
+        if body['exhausted']:
+            break
+        question = body['question']
+        asked.append(question['id'])
+        client.post('/api/interview/response', json={'session_id': session_id, 'question_id': question['id'], 'response': 'An answer'})
+    
+    assert len(asked) == len(set(asked)) == 10
+    assert client.post('/api/interview/next-question', json={'session_id': 'missing'}).status_code == 404
@@ -0,0 +1,142 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+# Every queue created in this process, so shutdown hooks can drain them all
+_queues = []
+_queues_lock = threading.Lock()
+
+class WriteBehindQueue:
+    """Background writer for non-critical writes (stats, bonus XP).
+    
+    Tasks are callables run one after another by a daemon thread, which
+    takes up to batch_size queued tasks per wake-up; each task still makes its
+    own storage calls. A task that raises is logged and dropped, unless it was
+    submitted with retry=True: only idempotent tasks may be, since a write
+    that raised may still have committed and replaying an Increment would
+    count it twice. Those are retried with exponential backoff. When the
+    queue is full, submit() runs the task in the caller instead of discarding
+    it. Pending tasks are flushed at interpreter exit.
+    """
+    def __init__(self, max_size=1000, batch_size=50, max_retries=3, retry_delay=0.1, name='write-behind'):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_size)
+        self._closed = False
+        self._failed = 0
+        self._completed = 0
+        self._stats_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+        with _queues_lock:
+            _queues.append(self)
+    
+    def submit(self, fn, *args, retry=False, **kwargs):
+        """Queue fn(*args, **kwargs) to run in the background; retry only if fn is idempotent"""
+        task = (fn, args, kwargs, retry)
+        if self._closed:
+            self._execute(task)
+            return
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            # Backpressure: do the write inline rather than lose it
+            logging.warning(f"{self.name} queue full; running {getattr(fn, '__name__', fn)} inline")
+            self._execute(task)
+    
+    def flush(self, timeout=None):
+        """Block until every queued task has run (or timeout seconds pass); returns True if drained"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+    
+    def close(self, timeout=None):
+        """Stop accepting background work and drain what is queued"""
+        if self._closed:
+            return True
+        drained = self.flush(timeout)
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout)
+        
+        # Anything submitted while closing runs here
+        while True:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None:
+                self._execute(task)
+            self._queue.task_done()
+        return drained
+    
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'pending': self._queue.qsize(),
+                'max_size': self.max_size,
+                'completed': self._completed,
+                'failed': self._failed
+            }
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Take whatever else is already waiting, up to batch_size, in one wake-up
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            for task in batch:
+                try:
+                    if task is None:
+                        return
+                    self._execute(task)
+                finally:
+                    self._queue.task_done()
+    
+    def _execute(self, task):
+        fn, args, kwargs, retry = task
+        attempts = self.max_retries + 1 if retry else 1
+        for attempt in range(attempts):
+            try:
+                fn(*args, **kwargs)
+                with self._stats_lock:
+                    self._completed += 1
+                return
+            except Exception as e:
+                if attempt == attempts - 1:
+                    logging.error(f"{self.name}: giving up on {getattr(fn, '__name__', fn)} after {attempt + 1} attempt(s): {e}")
+                    with self._stats_lock:
+                        self._failed += 1
+                    return
+                logging.warning(f"{self.name}: {getattr(fn, '__name__', fn)} failed ({e}); retrying")
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+def flush_all(timeout=None):
+    """Wait for every write-behind queue in this process to drain"""
+    with _queues_lock:
+        queues = list(_queues)
+    return all(write_queue.flush(timeout) for write_queue in queues)
+
+def shutdown(timeout=None):
+    """Drain and close every write-behind queue (interpreter exit, worker exit)"""
+    with _queues_lock:
+        queues = list(_queues)
+    for write_queue in queues:
+        if not write_queue.close(timeout):
+            logging.error(f"{write_queue.name}: shutdown timed out with {write_queue.stats()['pending']} pending writes")
+
+atexit.register(shutdown)
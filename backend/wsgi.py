@@ -0,0 +1,18 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app (and with it Firebase and its gRPC channels) is created when a
+worker imports this module, which gunicorn does after forking as long as
+preload_app stays off.
+
+The config defaults to 'production' here rather than to FLASK_ENV, which the
+checked-in .env sets to development; set APP_ENV to choose another.
+"""
+from app import create_app
+import os
+
+app = create_app(os.environ.get('APP_ENV', 'production'))
+
+if app is None:
+    raise RuntimeError("Failed to create application")
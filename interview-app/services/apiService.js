@@ -159,8 +159,31 @@ class ApiService {
     });
   }
 
-  async endInterview(sessionId) {
-    return this.request('/interview/end', {
+  // Upload answers captured offline (or batched) in one request; pass complete = true
+  // to also end the session. Reuse the same batchId when retrying a failed upload.
+  async submitResponses(sessionId, responses, complete = false, batchId = null) {
+    return this.request('/interview/responses:batch', {
+      method: 'POST',
+      body: JSON.stringify({
+        session_id: sessionId,
+        responses: responses.map((item) => ({
+          question_id: item.questionId,
+          question_text: item.questionText,
+          response: item.response,
+          category: item.category,
+          difficulty: item.difficulty,
+          timestamp: item.timestamp
+        })),
+        complete: complete,
+        batch_id: batchId
+      }),
+    });
+  }
+
+  // Only the summary is rendered after an interview, so skip the response texts by default
+  async endInterview(sessionId, fields = 'message,xp_earned,session_data.session_id,session_data.status,session_data.questions_answered,session_data.completion_percentage,session_data.xp_earned') {
+    const query = fields ? `?fields=${encodeURIComponent(fields)}` : '';
+    return this.request(`/interview/end${query}`, {
       method: 'POST',
       body: JSON.stringify({ session_id: sessionId }),
     });